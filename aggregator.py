@@ -1,11 +1,24 @@
 """
 Agregador inteligente para combinar datos de múltiples fuentes meteorológicas
 """
-from typing import List, Dict, Any, Optional
+import os
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple
 from datetime import datetime, timedelta
+from array import array
 import statistics
-from models import WeatherData, HourlyWeather, DailyWeather
-from fetcher import weather_fetcher
+from models import WeatherData, HourlySeries, DailySeries, CityInfo, BatchWeatherResult
+from series import ForecastSeries
+from fetcher import weather_fetcher, async_weather_fetcher
+from cache import weather_cache, normalize_city
+from singleflight import SingleFlight, AsyncSingleFlight, BackgroundRefresh, AsyncBackgroundRefresh
+from numpy_engine import NumpyAggregationEngine, NUMPY_AVAILABLE
+from metrics import metrics
+
+
+EPOCH = datetime(1970, 1, 1)
 
 
 class WeatherAggregator:
@@ -17,40 +30,350 @@ class WeatherAggregator:
             'Tomorrow.io': 0.15,
             'Visual Crossing': 0.15
         }
+        # Fan-out concurrente de proveedores
+        self.concurrent = os.getenv('AGGREGATOR_CONCURRENT', 'true').lower() == 'true'
+        self.max_workers = int(os.getenv('AGGREGATOR_MAX_WORKERS', '10'))
+        self.deadline = float(os.getenv('AGGREGATOR_DEADLINE', '15'))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='weather-fetch'
+        )
+        # Coalescencia de agregaciones concurrentes de la misma ciudad
+        self._single_flight = SingleFlight()
+        self._refresh = BackgroundRefresh()
+        # TTL máximo (s) del agregado cuando faltó alguna fuente
+        self.partial_ttl = int(os.getenv('AGGREGATED_PARTIAL_TTL', '120'))
+        # Motor de agregación: 'python' o 'numpy' (mismo resultado; numpy solo
+        # gana con horizontes largos, ver numpy_engine.py)
+        self.engine = os.getenv('AGGREGATOR_ENGINE', 'python').lower()
+        if self.engine == 'numpy' and not NUMPY_AVAILABLE:
+            print("❌ NumPy no disponible, usando el motor de agregación en Python")
+            self.engine = 'python'
+        self._numpy_engine = NumpyAggregationEngine() if self.engine == 'numpy' else None
+        # Ubicaciones consultadas a la vez en las consultas por lotes
+        self.batch_concurrency = int(os.getenv('AGGREGATOR_BATCH_CONCURRENCY', '4'))
+        # Quórum: responder sin esperar a las fuentes más lentas (0 = desactivado)
+        self.quorum_sources = int(os.getenv('AGGREGATOR_QUORUM_SOURCES', '0'))
+        self.quorum_weight = float(os.getenv('AGGREGATOR_QUORUM_WEIGHT', '0'))
+        self.quorum_deadline = float(os.getenv('AGGREGATOR_QUORUM_DEADLINE_MS', '0')) / 1000
     
-    def get_aggregated_weather(self, city: str) -> Optional[WeatherData]:
-        """Obtiene y agrega datos de todas las fuentes disponibles"""
-        sources_data = []
+    def _get_fetchers(self) -> Dict[str, Callable[[str, Optional[CityInfo]], Optional[WeatherData]]]:
+        """Fetchers de todas las fuentes por proveedor, en orden de prioridad"""
+        return {
+            'openweathermap': weather_fetcher.fetch_openweathermap,
+            'metno': weather_fetcher.fetch_metno,
+            'weatherapi': weather_fetcher.fetch_weatherapi,
+            'tomorrow': weather_fetcher.fetch_tomorrow,
+            'visualcrossing': weather_fetcher.fetch_visualcrossing
+        }
+    
+    def _log_source(self, data: WeatherData):
+        print(f"✅ Datos obtenidos de {data.hourly[0].source if data.hourly else 'fuente desconocida'}")
+    
+    def _fetch_sequential(self, city: str, city_info: Optional[CityInfo]) -> Dict[str, WeatherData]:
+        """Consulta las fuentes una tras otra"""
+        sources_data = {}
         
-        # Obtener datos de todas las fuentes
-        fetchers = [
-            weather_fetcher.fetch_openweathermap,
-            weather_fetcher.fetch_metno,
-            weather_fetcher.fetch_weatherapi,
-            weather_fetcher.fetch_tomorrow,
-            weather_fetcher.fetch_visualcrossing
-        ]
-        
-        for fetcher in fetchers:
+        for provider, fetcher in self._get_fetchers().items():
             try:
-                data = fetcher(city)
+                data = fetcher(city, city_info)
                 if data:
-                    sources_data.append(data)
-                    print(f"✅ Datos obtenidos de {data.hourly[0].source if data.hourly else 'fuente desconocida'}")
+                    sources_data[provider] = data
+                    self._log_source(data)
             except Exception as e:
                 print(f"❌ Error obteniendo datos: {e}")
         
+        return sources_data
+    
+    def _provider_weight(self, provider: str) -> float:
+        return self.source_weights.get(weather_fetcher.providers[provider].label, 0.1)
+    
+    def _quorum_reached(self, answered: Dict[str, Optional[WeatherData]], elapsed: float) -> bool:
+        """
+        Si ya se puede responder sin esperar al resto de fuentes.
+        
+        `answered` contiene las fuentes que terminaron (None si fallaron).
+        Hace falta al menos una con datos y además: que hayan terminado
+        las `quorum_sources` fuentes de más peso, que las que tienen datos
+        sumen `quorum_weight` del peso total, o que pasara el plazo blando
+        `quorum_deadline`.
+        """
+        if not any(answered.values()):
+            return False
+        
+        enabled = self.enabled_providers()
+        if self.quorum_sources:
+            top = sorted(enabled, key=self._provider_weight, reverse=True)[:self.quorum_sources]
+            if all(provider in answered for provider in top):
+                return True
+        
+        if self.quorum_weight:
+            total = sum(self._provider_weight(provider) for provider in enabled)
+            weight = sum(self._provider_weight(provider) for provider, data in answered.items() if data)
+            if total and weight >= self.quorum_weight * total:
+                return True
+        
+        return bool(self.quorum_deadline) and elapsed >= self.quorum_deadline
+    
+    def _wait_timeout(self, answered: Dict[str, Optional[WeatherData]], elapsed: float) -> float:
+        """Cuánto esperar a la siguiente fuente: hasta el plazo blando (si hay datos) o el global"""
+        timeout = self.deadline - elapsed
+        if self.quorum_deadline and any(answered.values()):
+            timeout = min(timeout, self.quorum_deadline - elapsed)
+        return max(0.0, timeout)
+    
+    def _collect_answer(self, answered: Dict[str, Optional[WeatherData]], provider: str, future):
+        try:
+            answered[provider] = future.result()
+        except Exception as e:
+            answered[provider] = None
+            print(f"❌ Error obteniendo datos: {e}")
+    
+    def _sources_in_order(self, providers: List[str], answered: Dict[str, Optional[WeatherData]]) -> Dict[str, WeatherData]:
+        """Fuentes con datos, en el orden de prioridad de los fetchers"""
+        sources_data = {}
+        for provider in providers:
+            data = answered.get(provider)
+            if data:
+                sources_data[provider] = data
+                self._log_source(data)
+        return sources_data
+    
+    def recombine_cached(self, city: str):
+        """Recalcula el agregado con las fuentes que ya están en caché, sin consultar a los proveedores"""
+        sources_data = {}
+        for provider in self._get_fetchers():
+            data, _ = weather_cache.get_weather_entry(city, provider)
+            if data:
+                sources_data[provider] = data
+        
+        weather_data = self._combine_sources(list(sources_data.values()))
+        if weather_data:
+            self._cache_aggregate(city, sources_data, weather_data)
+    
+    def _fetch_concurrent(self, city: str, city_info: Optional[CityInfo]) -> Dict[str, WeatherData]:
+        """
+        Consulta todas las fuentes en paralelo con un plazo global.
+        
+        Devuelve las fuentes que respondieron dentro de `self.deadline`
+        segundos (o hasta alcanzar el quórum), manteniendo el orden de
+        prioridad de los fetchers.
+        """
+        futures = {
+            provider: self._executor.submit(fetcher, city, city_info)
+            for provider, fetcher in self._get_fetchers().items()
+        }
+        providers = {future: provider for provider, future in futures.items()}
+        
+        start = time.monotonic()
+        answered: Dict[str, Optional[WeatherData]] = {}
+        pending = set(futures.values())
+        while pending:
+            elapsed = time.monotonic() - start
+            if elapsed >= self.deadline or self._quorum_reached(answered, elapsed):
+                break
+            
+            done, pending = wait(pending, timeout=self._wait_timeout(answered, elapsed), return_when=FIRST_COMPLETED)
+            for future in done:
+                self._collect_answer(answered, providers[future], future)
+        
+        if pending:
+            late = [providers[future] for future in pending]
+            if time.monotonic() - start >= self.deadline:
+                for future in pending:
+                    # La petición sigue en curso; su resultado se descarta
+                    future.cancel()
+                for provider in late:
+                    print(f"⏱️ Sin respuesta de {provider} tras {self.deadline:.0f}s")
+            else:
+                # Quórum alcanzado: las fuentes lentas terminan en segundo
+                # plano, se guardan en caché y se recalcula el agregado
+                print(f"⚡ Quórum alcanzado sin esperar a {', '.join(late)}")
+                self._refresh.submit(('late', normalize_city(city)), self._complete_late, city, pending, start)
+        
+        return self._sources_in_order(list(futures), answered)
+    
+    def _complete_late(self, city: str, pending, start: float):
+        """Espera a las fuentes que llegaron tarde y recalcula el agregado con ellas"""
+        done, _ = wait(pending, timeout=max(0.0, self.deadline - (time.monotonic() - start)))
+        if any(not future.cancelled() and not future.exception() and future.result() for future in done):
+            self.recombine_cached(city)
+    
+    def enabled_providers(self) -> List[str]:
+        """Proveedores configurados (con clave de API cuando la necesitan)"""
+        return sorted(name for name, spec in weather_fetcher.providers.items() if spec.enabled)
+    
+    def aggregated_data_type(self) -> str:
+        """Tipo de dato en caché del resultado agregado: depende de las fuentes configuradas"""
+        return f"aggregated:{'+'.join(self.enabled_providers())}"
+    
+    def _get_cached_aggregate(self, city: str) -> Tuple[Optional[WeatherData], bool]:
+        """Busca el resultado agregado en caché; devuelve (datos, viejo)"""
+        return weather_cache.get_weather_entry(city, self.aggregated_data_type())
+    
+    def _cache_aggregate(self, city: str, sources_data: Dict[str, WeatherData], weather_data: WeatherData):
+        """
+        Guarda el resultado agregado en caché.
+        
+        Su TTL es el de la entrada de proveedor que antes expira, para no
+        servir un agregado más viejo que sus fuentes. Si faltó alguna
+        fuente configurada se usa un TTL corto, para incorporarla pronto.
+        """
+        ttls = [weather_cache.get_ttl(city, provider) for provider in sources_data]
+        if not ttls or None in ttls:
+            return
+        
+        ttl = min(ttls)
+        if len(sources_data) < len(self.enabled_providers()):
+            ttl = min(ttl, self.partial_ttl)
+        
+        if ttl >= 1:
+            weather_cache.set_weather(city, self.aggregated_data_type(), weather_data, ttl_seconds=int(ttl))
+    
+    def _label_for(self, city: str, weather_data: Optional[WeatherData]) -> Optional[WeatherData]:
+        """
+        Ajusta ciudad y país al nombre consultado.
+        
+        Los nombres cercanos comparten la celda del caché, así que el
+        resultado puede venir de otro nombre de la misma celda.
+        """
+        alias = weather_cache.get_alias(city)
+        if not weather_data or not alias or not alias.get('city'):
+            return weather_data
+        if weather_data.city == alias['city'] and weather_data.country == alias['country']:
+            return weather_data
+        return weather_data.copy(update={'city': alias['city'], 'country': alias['country']})
+    
+    def get_aggregated_weather(self, city: str) -> Optional[WeatherData]:
+        """Obtiene y agrega datos de todas las fuentes disponibles"""
+        weather_data = self._single_flight.do(
+            ('aggregated', normalize_city(city)),
+            self._get_aggregated_weather, city
+        )
+        return self._label_for(city, weather_data)
+    
+    def refresh_aggregated_weather(self, city: str) -> Optional[WeatherData]:
+        """Recalcula el agregado aunque siga en caché (usa las fuentes cacheadas vigentes)"""
+        return self._single_flight.do(
+            ('aggregated', normalize_city(city)),
+            self._aggregate_fresh, city
+        )
+    
+    def _unique_cities(self, cities: List[str]) -> List[str]:
+        """Nombres de ciudad sin repetir (la primera grafía de cada uno)"""
+        unique = {}
+        for city in cities:
+            unique.setdefault(normalize_city(city), city)
+        return list(unique.values())
+    
+    def _group_by_location(self, cities: List[str]) -> Dict[str, List[str]]:
+        """
+        Agrupa los nombres ya geocodificados que comparten celda del caché.
+        
+        Returns:
+            {nombre representante: nombres de la misma ubicación}
+        """
+        groups: Dict[Any, List[str]] = {}
+        for city in cities:
+            alias = weather_cache.get_alias(city)
+            key = alias['cell'] if alias else ('name', normalize_city(city))
+            groups.setdefault(key, []).append(city)
+        return {names[0]: names for names in groups.values()}
+    
+    def _batch_result(self, cities: List[str], groups: Dict[str, List[str]],
+                      outcomes: Dict[str, Any]) -> BatchWeatherResult:
+        """Reparte el resultado de cada ubicación entre los nombres pedidos"""
+        by_city = {}
+        for representative, names in groups.items():
+            for name in names:
+                by_city[normalize_city(name)] = outcomes[representative]
+        
+        result = BatchWeatherResult()
+        for city in cities:
+            outcome = by_city[normalize_city(city)]
+            if isinstance(outcome, BaseException):
+                result.errors[city] = str(outcome) or type(outcome).__name__
+            elif outcome is None:
+                result.errors[city] = "Sin datos meteorológicos"
+            else:
+                result.results[city] = self._label_for(city, outcome)
+        return result
+    
+    def get_aggregated_weather_batch(self, cities: List[str]) -> BatchWeatherResult:
+        """
+        Obtiene el tiempo agregado de varias ciudades a la vez.
+        
+        Los nombres repetidos y los que corresponden a la misma ubicación
+        se consultan una sola vez. Se procesan hasta `batch_concurrency`
+        ubicaciones en paralelo, y las peticiones a proveedores comparten
+        el pool global de `max_workers` hilos.
+        
+        Returns:
+            BatchWeatherResult con los datos por ciudad y, por separado,
+            el motivo de las que fallaron.
+        """
+        names = self._unique_cities(cities)
+        
+        with ThreadPoolExecutor(max_workers=max(1, self.batch_concurrency),
+                                thread_name_prefix='weather-batch') as pool:
+            # Geocodificar todo primero para poder agrupar por ubicación
+            list(pool.map(weather_fetcher.get_city_info, names))
+            groups = self._group_by_location(names)
+            
+            futures = {
+                representative: pool.submit(self.get_aggregated_weather, representative)
+                for representative in groups
+            }
+            outcomes = {
+                representative: future.exception() or future.result()
+                for representative, future in futures.items()
+            }
+        
+        return self._batch_result(cities, groups, outcomes)
+    
+    def _get_aggregated_weather(self, city: str) -> Optional[WeatherData]:
+        # Un acierto en el caché del agregado evita reconstruir las fuentes;
+        # si es viejo se sirve igual y se recalcula en segundo plano
+        cached, stale = self._get_cached_aggregate(city)
+        if cached:
+            if stale:
+                self._refresh.submit(('aggregated', normalize_city(city)), self._aggregate_fresh, city)
+            return cached
+        
+        return self._aggregate_fresh(city)
+    
+    def _aggregate_fresh(self, city: str) -> Optional[WeatherData]:
+        """Consulta las fuentes, agrega y guarda el resultado en caché"""
+        # Geocodificar una sola vez y compartir el resultado con todas las fuentes
+        city_info = weather_fetcher.get_city_info(city)
+        
+        # Obtener datos de todas las fuentes
+        if self.concurrent:
+            sources_data = self._fetch_concurrent(city, city_info)
+        else:
+            sources_data = self._fetch_sequential(city, city_info)
+        
+        weather_data = self._combine_sources(list(sources_data.values()))
+        if weather_data:
+            self._cache_aggregate(city, sources_data, weather_data)
+        return weather_data
+    
+    def _combine_sources(self, sources_data: List[WeatherData]) -> Optional[WeatherData]:
+        """Combina los datos de las fuentes en un único WeatherData"""
         if not sources_data:
             return None
         
         # Usar la primera fuente como base para información de ciudad
         base_data = sources_data[0]
         
-        # Agregar datos horarios
-        aggregated_hourly = self._aggregate_hourly_data(sources_data)
-        
-        # Agregar datos diarios
-        aggregated_daily = self._aggregate_daily_data(sources_data)
+        # Tiempo de CPU: sin contar el tiempo cedido a otros hilos
+        engine = 'numpy' if self._numpy_engine else 'python'
+        with metrics.timer('weather_aggregation_cpu_seconds', cpu=True, engine=engine):
+            # Agregar datos horarios
+            aggregated_hourly = self._aggregate_hourly_data(sources_data)
+            
+            # Agregar datos diarios
+            aggregated_daily = self._aggregate_daily_data(sources_data)
         
         return WeatherData(
             city=base_data.city,
@@ -60,128 +383,240 @@ class WeatherAggregator:
             daily=aggregated_daily
         )
     
-    def _aggregate_hourly_data(self, sources_data: List[WeatherData]) -> List[HourlyWeather]:
-        """Agrega datos horarios de múltiples fuentes"""
-        # Agrupar por hora
-        hourly_groups = {}
-        
-        for source in sources_data:
-            for hour_data in source.hourly:
-                # Redondear a la hora más cercana y normalizar timezone
-                dt = hour_data.datetime
-                if dt.tzinfo is not None:
-                    # Convertir a UTC y luego remover timezone info para comparación
-                    dt = dt.utctimetuple()
-                    dt = datetime(*dt[:6])
-                
-                hour_key = dt.replace(minute=0, second=0, microsecond=0)
-                
-                if hour_key not in hourly_groups:
-                    hourly_groups[hour_key] = []
-                
-                hourly_groups[hour_key].append(hour_data)
-        
-        # Agregar datos para cada hora
-        aggregated_hourly = []
-        for hour_key in sorted(hourly_groups.keys())[:24]:  # Solo 24 horas
-            hour_group = hourly_groups[hour_key]
-            
-            # Calcular promedios ponderados
-            temp_values = []
-            precip_values = []
-            wind_values = []
-            weights = []
-            
-            for hour_data in hour_group:
-                weight = self.source_weights.get(hour_data.source, 0.1)
-                temp_values.append(hour_data.temperature * weight)
-                precip_values.append(hour_data.precipitation * weight)
-                wind_values.append(hour_data.wind_speed * weight)
-                weights.append(weight)
-            
-            total_weight = sum(weights)
+    def _gather(self, series_list: List[ForecastSeries], utc: bool) -> Tuple[List[int], List[float], List[array]]:
+        """
+        Concatena las series de todas las fuentes, en el orden de agregación.
+        
+        Returns:
+            (instante de cada fila en segundos, peso de su fuente, columnas)
+        """
+        seconds: List[int] = []
+        weights: List[float] = []
+        columns = [array('d') for _ in type(series_list[0]).fields] if series_list else []
+        
+        for series in series_list:
+            # Las horas se comparan en UTC; los días, por fecha de reloj local
+            seconds.extend(series.utc_seconds() if utc else series.seconds)
+            source_weights = [self.source_weights.get(source, 0.1) for source in series.sources]
+            weights.extend(source_weights[source_id] for source_id in series.source_ids)
+            for column, values in zip(columns, series.columns):
+                column.extend(values)
+        
+        return seconds, weights, columns
+    
+    @staticmethod
+    def _weighted_means(seconds: List[int], weights: List[float], columns: List[array],
+                        period: int, limit: int) -> List[Tuple[int, int, List[float]]]:
+        """
+        Agrupa las filas por periodo y calcula la media ponderada de cada
+        columna (la media simple si el peso total no es positivo).
+        
+        Returns:
+            Lista de (número de periodo desde epoch, número de filas, medias)
+        """
+        groups: Dict[int, List[int]] = {}
+        for row, instant in enumerate(seconds):
+            groups.setdefault(instant // period, []).append(row)
+        
+        result = []
+        for key in sorted(groups)[:limit]:
+            rows = groups[key]
+            total_weight = sum([weights[row] for row in rows])
             if total_weight > 0:
-                avg_temp = sum(temp_values) / total_weight
-                avg_precip = sum(precip_values) / total_weight
-                avg_wind = sum(wind_values) / total_weight
+                means = [
+                    sum([column[row] * weights[row] for row in rows]) / total_weight
+                    for column in columns
+                ]
             else:
-                avg_temp = statistics.mean([h.temperature for h in hour_group])
-                avg_precip = statistics.mean([h.precipitation for h in hour_group])
-                avg_wind = statistics.mean([h.wind_speed for h in hour_group])
-            
-            aggregated_hourly.append(HourlyWeather(
-                datetime=hour_key,
+                means = [statistics.mean([column[row] for row in rows]) for column in columns]
+            result.append((key, len(rows), means))
+        
+        return result
+    
+    def _aggregate_series(self, series_list: List[ForecastSeries], utc: bool, period: int, limit: int):
+        """Medias ponderadas por periodo con el motor configurado"""
+        seconds, weights, columns = self._gather(series_list, utc)
+        if self._numpy_engine:
+            return self._numpy_engine.weighted_means(seconds, weights, columns, period, limit)
+        return self._weighted_means(seconds, weights, columns, period, limit)
+    
+    def _aggregate_hourly_data(self, sources_data: List[WeatherData]) -> HourlySeries:
+        """Agrega datos horarios de múltiples fuentes (24 horas)"""
+        groups = self._aggregate_series([source.hourly for source in sources_data], True, 3600, 24)
+        
+        aggregated_hourly = HourlySeries()
+        for hour, count, (avg_temp, avg_precip, avg_wind) in groups:
+            aggregated_hourly.add(
+                datetime=EPOCH + timedelta(hours=hour),
                 temperature=round(avg_temp, 1),
                 precipitation=round(avg_precip, 2),
                 wind_speed=round(avg_wind, 1),
-                source=f"Agregado ({len(hour_group)} fuentes)"
-            ))
-        
+                source=f"Agregado ({count} fuentes)"
+            )
         return aggregated_hourly
     
-    def _aggregate_daily_data(self, sources_data: List[WeatherData]) -> List[DailyWeather]:
-        """Agrega datos diarios de múltiples fuentes"""
-        # Agrupar por día
-        daily_groups = {}
-        
-        for source in sources_data:
-            for day_data in source.daily:
-                # Normalizar fecha para comparación
-                dt = day_data.date
-                if hasattr(dt, 'date'):
-                    day_key = dt.date()
-                else:
-                    day_key = dt
-                
-                if day_key not in daily_groups:
-                    daily_groups[day_key] = []
-                
-                daily_groups[day_key].append(day_data)
-        
-        # Agregar datos para cada día
-        aggregated_daily = []
-        for day_key in sorted(daily_groups.keys())[:7]:  # Solo 7 días
-            day_group = daily_groups[day_key]
-            
-            # Calcular promedios ponderados
-            temp_min_values = []
-            temp_max_values = []
-            precip_values = []
-            wind_values = []
-            weights = []
-            
-            for day_data in day_group:
-                weight = self.source_weights.get(day_data.source, 0.1)
-                temp_min_values.append(day_data.temp_min * weight)
-                temp_max_values.append(day_data.temp_max * weight)
-                precip_values.append(day_data.precipitation * weight)
-                wind_values.append(day_data.wind_speed * weight)
-                weights.append(weight)
-            
-            total_weight = sum(weights)
-            if total_weight > 0:
-                avg_temp_min = sum(temp_min_values) / total_weight
-                avg_temp_max = sum(temp_max_values) / total_weight
-                avg_precip = sum(precip_values) / total_weight
-                avg_wind = sum(wind_values) / total_weight
-            else:
-                avg_temp_min = statistics.mean([d.temp_min for d in day_group])
-                avg_temp_max = statistics.mean([d.temp_max for d in day_group])
-                avg_precip = statistics.mean([d.precipitation for d in day_group])
-                avg_wind = statistics.mean([d.wind_speed for d in day_group])
-            
-            aggregated_daily.append(DailyWeather(
-                date=datetime.combine(day_key, datetime.min.time()),
+    def _aggregate_daily_data(self, sources_data: List[WeatherData]) -> DailySeries:
+        """Agrega datos diarios de múltiples fuentes (7 días)"""
+        groups = self._aggregate_series([source.daily for source in sources_data], False, 86400, 7)
+        
+        aggregated_daily = DailySeries()
+        for day, count, (avg_temp_min, avg_temp_max, avg_precip, avg_wind) in groups:
+            aggregated_daily.add(
+                date=EPOCH + timedelta(days=day),
                 temp_min=round(avg_temp_min, 1),
                 temp_max=round(avg_temp_max, 1),
                 precipitation=round(avg_precip, 2),
                 wind_speed=round(avg_wind, 1),
-                source=f"Agregado ({len(day_group)} fuentes)"
-            ))
-        
+                source=f"Agregado ({count} fuentes)"
+            )
         return aggregated_daily
 
 
+class AsyncWeatherAggregator(WeatherAggregator):
+    """
+    Variante asíncrona del agregador para usar desde los handlers del bot.
+    
+    Consulta las fuentes con AsyncWeatherFetcher, de modo que una ciudad
+    lenta no bloquea el event loop ni al resto de chats.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self._single_flight = AsyncSingleFlight()
+        self._refresh = AsyncBackgroundRefresh()
+    
+    def _get_fetchers(self) -> Dict[str, Callable[[str, Optional[CityInfo]], Awaitable[Optional[WeatherData]]]]:
+        """Fetchers asíncronos de todas las fuentes por proveedor, en orden de prioridad"""
+        return {
+            'openweathermap': async_weather_fetcher.fetch_openweathermap,
+            'metno': async_weather_fetcher.fetch_metno,
+            'weatherapi': async_weather_fetcher.fetch_weatherapi,
+            'tomorrow': async_weather_fetcher.fetch_tomorrow,
+            'visualcrossing': async_weather_fetcher.fetch_visualcrossing
+        }
+    
+    async def _fetch_sequential(self, city: str, city_info: Optional[CityInfo]) -> Dict[str, WeatherData]:
+        """Consulta las fuentes una tras otra"""
+        sources_data = {}
+        
+        for provider, fetcher in self._get_fetchers().items():
+            try:
+                data = await fetcher(city, city_info)
+                if data:
+                    sources_data[provider] = data
+                    self._log_source(data)
+            except Exception as e:
+                print(f"❌ Error obteniendo datos: {e}")
+        
+        return sources_data
+    
+    async def _fetch_concurrent(self, city: str, city_info: Optional[CityInfo]) -> Dict[str, WeatherData]:
+        """Consulta todas las fuentes en paralelo con un plazo global (o hasta el quórum)"""
+        tasks = {
+            provider: asyncio.create_task(fetcher(city, city_info))
+            for provider, fetcher in self._get_fetchers().items()
+        }
+        providers = {task: provider for provider, task in tasks.items()}
+        
+        start = time.monotonic()
+        answered: Dict[str, Optional[WeatherData]] = {}
+        pending = set(tasks.values())
+        while pending:
+            elapsed = time.monotonic() - start
+            if elapsed >= self.deadline or self._quorum_reached(answered, elapsed):
+                break
+            
+            done, pending = await asyncio.wait(
+                pending, timeout=self._wait_timeout(answered, elapsed), return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                self._collect_answer(answered, providers[task], task)
+        
+        if pending:
+            late = [providers[task] for task in pending]
+            if time.monotonic() - start >= self.deadline:
+                for task in pending:
+                    task.cancel()
+                for provider in late:
+                    print(f"⏱️ Sin respuesta de {provider} tras {self.deadline:.0f}s")
+            else:
+                print(f"⚡ Quórum alcanzado sin esperar a {', '.join(late)}")
+                self._refresh.submit(('late', normalize_city(city)), self._complete_late, city, pending, start)
+        
+        return self._sources_in_order(list(tasks), answered)
+    
+    async def _complete_late(self, city: str, pending, start: float):
+        """Espera a las fuentes que llegaron tarde y recalcula el agregado con ellas"""
+        done, pending = await asyncio.wait(pending, timeout=max(0.0, self.deadline - (time.monotonic() - start)))
+        for task in pending:
+            task.cancel()
+        if any(not task.cancelled() and not task.exception() and task.result() for task in done):
+            await weather_cache.call_async(self.recombine_cached, city)
+    
+    async def get_aggregated_weather(self, city: str) -> Optional[WeatherData]:
+        """Obtiene y agrega datos de todas las fuentes disponibles"""
+        weather_data = await self._single_flight.do(
+            ('aggregated', normalize_city(city)),
+            self._get_aggregated_weather, city
+        )
+        return await weather_cache.call_async(self._label_for, city, weather_data)
+    
+    async def refresh_aggregated_weather(self, city: str) -> Optional[WeatherData]:
+        """Recalcula el agregado aunque siga en caché (usa las fuentes cacheadas vigentes)"""
+        return await self._single_flight.do(
+            ('aggregated', normalize_city(city)),
+            self._aggregate_fresh, city
+        )
+    
+    async def get_aggregated_weather_batch(self, cities: List[str]) -> BatchWeatherResult:
+        """
+        Obtiene el tiempo agregado de varias ciudades a la vez.
+        
+        Mismo comportamiento que la versión síncrona: como mucho
+        `batch_concurrency` ubicaciones en curso, cada una con sus
+        proveedores en paralelo.
+        """
+        names = self._unique_cities(cities)
+        limit = asyncio.Semaphore(max(1, self.batch_concurrency))
+        
+        async def geocode(city: str):
+            async with limit:
+                return await async_weather_fetcher.get_city_info(city)
+        
+        async def aggregate(city: str):
+            async with limit:
+                return await self.get_aggregated_weather(city)
+        
+        await asyncio.gather(*(geocode(city) for city in names))
+        groups = await weather_cache.call_async(self._group_by_location, names)
+        
+        results = await asyncio.gather(*(aggregate(city) for city in groups), return_exceptions=True)
+        return await weather_cache.call_async(self._batch_result, cities, groups, dict(zip(groups, results)))
+    
+    async def _get_aggregated_weather(self, city: str) -> Optional[WeatherData]:
+        cached, stale = await weather_cache.call_async(self._get_cached_aggregate, city)
+        if cached:
+            if stale:
+                self._refresh.submit(('aggregated', normalize_city(city)), self._aggregate_fresh, city)
+            return cached
+        
+        return await self._aggregate_fresh(city)
+    
+    async def _aggregate_fresh(self, city: str) -> Optional[WeatherData]:
+        """Consulta las fuentes, agrega y guarda el resultado en caché"""
+        city_info = await async_weather_fetcher.get_city_info(city)
+        
+        if self.concurrent:
+            sources_data = await self._fetch_concurrent(city, city_info)
+        else:
+            sources_data = await self._fetch_sequential(city, city_info)
+        
+        weather_data = self._combine_sources(list(sources_data.values()))
+        if weather_data:
+            await weather_cache.call_async(self._cache_aggregate, city, sources_data, weather_data)
+        return weather_data
+
+
 def predict_weather_ml(data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Stub para predicción meteorológica con Machine Learning
@@ -206,5 +641,6 @@ def predict_weather_ml(data: Dict[str, Any]) -> Dict[str, Any]:
     return data
 
 
-# Instancia global del agregador
-weather_aggregator = WeatherAggregator()
\ No newline at end of file
+# Instancias globales del agregador
+weather_aggregator = WeatherAggregator()
+async_weather_aggregator = AsyncWeatherAggregator()
\ No newline at end of file
@@ -0,0 +1,66 @@
+"""
+Graba respuestas reales de los proveedores para los benchmarks
+
+Consulta una vez cada proveedor con las claves de `.env` y guarda el
+cuerpo de cada respuesta tal cual en `benchmarks/fixtures` (o en
+`--output`). Es el único paso que necesita red; las respuestas incluidas
+en el repositorio son sintéticas, con la forma de las respuestas reales.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.record --city "Montevideo"
+"""
+import os
+import sys
+import json
+import argparse
+
+from dotenv import load_dotenv
+
+from benchmarks.stub_server import FIXTURES_DIR
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Graba respuestas reales de los proveedores")
+    parser.add_argument('--city', default='Montevideo', help="ciudad consultada")
+    parser.add_argument('--output', default=FIXTURES_DIR, help="directorio de destino")
+    args = parser.parse_args(argv)
+    
+    load_dotenv()
+    from fetcher import BaseWeatherFetcher
+    from http_session import http_sessions
+    
+    fetcher = BaseWeatherFetcher()
+    session = http_sessions.get_session()
+    
+    def record(name: str, request) -> bytes:
+        url, params, headers = request
+        response = session.get(url, params=params, headers=headers, timeout=30)
+        response.raise_for_status()
+        with open(os.path.join(args.output, f"{name}.json"), 'wb') as f:
+            f.write(response.content)
+        print(f"✅ {name}.json ({len(response.content) / 1024:.1f} KB)")
+        return response.content
+    
+    if not fetcher.owm_key:
+        print("❌ OWM_KEY es necesaria para geocodificar la ciudad")
+        return 1
+    
+    location = json.loads(record('openweathermap_geocoding', fetcher._geocoding_request(args.city)))[0]
+    tz_data = json.loads(record('openweathermap_timezone', fetcher._timezone_request(location)))
+    city_info = fetcher._parse_city_info(location, tz_data)
+    
+    failed = 0
+    for provider, spec in fetcher.providers.items():
+        if not spec.enabled:
+            print(f"⏭️ {spec.label}: sin clave de API, se conserva la respuesta anterior")
+            continue
+        try:
+            record(provider, spec.build_request(args.city, city_info))
+        except Exception as e:
+            print(f"❌ {spec.label}: {e}")
+            failed += 1
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
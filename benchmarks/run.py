@@ -0,0 +1,528 @@
+"""
+Benchmarks sin red del bot
+
+Reproduce las respuestas grabadas de los cinco proveedores con un
+servidor local (`stub_server.py`, en un proceso aparte) y mide:
+
+- latencia de `get_aggregated_weather` con el caché frío y caliente
+- rendimiento con N ciudades consultadas a la vez
+- coste de un acierto, un fallo y una escritura en el caché
+- CPU del parseo de cada proveedor, de la agregación y del formateo
+- agregación horaria con horizontes largos (`--horizons`) con cada motor
+- memoria por ciudad en caché
+
+El resultado es un JSON (`--output`) con la versión del código y la
+configuración, para comparar entre versiones; `--baseline` compara con
+un resultado anterior y termina con error si algo empeora más de
+`--max-regression`.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.run --output resultados.json
+    python -m benchmarks.run --cities 200 --concurrency 50 --latency-ms 120 --error-rate 0.05
+    python -m benchmarks.run --baseline resultados.json --max-regression 0.2
+"""
+import os
+import re
+import sys
+import gc
+import json
+import time
+import asyncio
+import logging
+import platform
+import argparse
+import statistics
+import subprocess
+import tracemalloc
+import contextlib
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.stub_server import add_arguments, FIXTURES_DIR
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Formato del JSON de resultados; cambia si cambia su estructura
+SCHEMA_VERSION = 1
+
+# Métricas comparables con --baseline: sufijo -> True si mayor es mejor
+COMPARED_SUFFIXES = {
+    'p50_ms': False,
+    'p50_us': False,
+    'kb_per_city': False,
+    'bytes_per_city': False,
+    'cities_per_s': True,
+}
+
+
+def summarize(samples: List[float], unit: str = 'ms') -> Dict[str, Any]:
+    """Resumen de una lista de duraciones en segundos"""
+    scale = 1000 if unit == 'ms' else 1_000_000
+    if not samples:
+        return {'n': 0}
+    ordered = sorted(samples)
+    
+    def percentile(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+    
+    return {
+        'n': len(ordered),
+        f'mean_{unit}': round(statistics.fmean(ordered) * scale, 3),
+        f'p50_{unit}': round(percentile(0.5) * scale, 3),
+        f'p95_{unit}': round(percentile(0.95) * scale, 3),
+        f'p99_{unit}': round(percentile(0.99) * scale, 3),
+        f'min_{unit}': round(ordered[0] * scale, 3),
+        f'max_{unit}': round(ordered[-1] * scale, 3),
+    }
+
+
+def measure(function: Callable[[], Any], repeat: int, clock: Callable[[], float] = time.perf_counter) -> List[float]:
+    """Duración de cada una de `repeat` ejecuciones"""
+    samples = []
+    for _ in range(repeat):
+        start = clock()
+        function()
+        samples.append(clock() - start)
+    return samples
+
+
+# --- Entorno ---
+
+def configure_environment(args):
+    """
+    Configuración reproducible antes de importar los módulos del bot:
+    caché en memoria, sin Redis, cuotas, diccionario geográfico ni
+    métricas por HTTP.
+    """
+    for key in ('OWM_KEY', 'WEATHERAPI_KEY', 'TOMORROW_KEY', 'VISUALCROSSING_KEY'):
+        os.environ[key] = 'benchmark'
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'benchmark')
+    os.environ.update({
+        'REDIS_URL': '',
+        'GEOCODE_CACHE_BACKEND': 'memory',
+        'SUBSCRIPTIONS_BACKEND': 'memory',
+        'GAZETTEER_PATH': '',
+        'QUOTA_ENABLED': 'false',
+        'PREWARM_ENABLED': 'false',
+        'METRICS_PORT': '0',
+        'AGGREGATOR_ENGINE': args.engine,
+        'JSON_STREAMING': 'true' if args.streaming else 'false',
+        'CACHE_SERIALIZER': args.serializer,
+        'CACHE_MAX_ENTRIES': str(max(1000, (args.cities + args.iterations + args.memory_cities) * 10)),
+    })
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class StubProcess:
+    """`stub_server.py` en un proceso aparte, para no competir por el GIL"""
+    
+    def __init__(self, args):
+        command = [
+            sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stub_server.py'),
+            '--port', '0', '--latency-ms', str(args.latency_ms), '--jitter-ms', str(args.jitter_ms),
+            '--error-rate', str(args.error_rate), '--error-status', str(args.error_status),
+            '--fixtures', args.fixtures, '--seed', str(args.seed),
+        ]
+        for value in args.provider_latency or []:
+            command += ['--provider-latency', value]
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+        line = self.process.stdout.readline()
+        match = re.search(r'http://\S+', line)
+        if not match:
+            self.process.kill()
+            raise RuntimeError(f"El servidor simulado no arrancó: {line!r}")
+        self.url = match.group(0)
+    
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with urllib.request.urlopen(f"{self.url}/__stats") as response:
+            return json.loads(response.read())
+    
+    def stop(self):
+        self.process.terminate()
+        self.process.wait(timeout=5)
+
+
+def redirect_http(stub_url: str):
+    """
+    Envía todas las peticiones de los clientes httpx del bot al servidor
+    simulado. La cabecera Host conserva el proveedor original.
+    """
+    import httpx
+    from http_session import http_sessions
+    
+    target = httpx.URL(stub_url)
+    
+    class RedirectTransport(httpx.AsyncBaseTransport):
+        def __init__(self, inner: httpx.AsyncBaseTransport):
+            self.inner = inner
+        
+        async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+            request.url = request.url.copy_with(scheme=target.scheme, host=target.host, port=target.port)
+            return await self.inner.handle_async_request(request)
+        
+        async def aclose(self):
+            await self.inner.aclose()
+    
+    def create_async_client(timeout: float) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=http_sessions.pool_connections * http_sessions.pool_maxsize,
+            max_keepalive_connections=http_sessions.pool_maxsize,
+            keepalive_expiry=http_sessions.keepalive_expiry
+        )
+        transport = RedirectTransport(httpx.AsyncHTTPTransport(limits=limits, retries=http_sessions.max_retries))
+        return httpx.AsyncClient(timeout=timeout, limits=limits, transport=transport)
+    
+    http_sessions.create_async_client = create_async_client
+
+
+def reset_caches():
+    """Vacía los cachés en memoria (datos, alias y geocodificación)"""
+    from cache import weather_cache, geocoding_cache
+    
+    weather_cache.memory_cache.clear()
+    weather_cache.aliases.clear()
+    geocoding_cache.entries.clear()
+
+
+def load_fixture(fixtures_dir: str, name: str) -> Any:
+    with open(os.path.join(fixtures_dir, f"{name}.json"), 'rb') as f:
+        return json.loads(f.read())
+
+
+# --- Escenarios asíncronos (con el servidor simulado) ---
+
+async def bench_end_to_end(args, stub: StubProcess) -> Dict[str, Any]:
+    from aggregator import async_weather_aggregator
+    
+    results: Dict[str, Any] = {}
+    
+    # Caché frío: una ciudad distinta cada vez, con los cachés vacíos
+    cold, before = [], stub.stats()['requests']
+    for i in range(args.iterations):
+        reset_caches()
+        start = time.perf_counter()
+        await async_weather_aggregator.get_aggregated_weather(f"Cold City {i:04d}")
+        cold.append(time.perf_counter() - start)
+    after = stub.stats()['requests']
+    results['e2e_cold'] = summarize(cold)
+    results['e2e_cold']['upstream_requests_per_call'] = round(
+        (sum(after.values()) - sum(before.values())) / max(1, args.iterations), 2
+    )
+    
+    # Caché caliente: la misma ciudad, servida por el agregado en caché
+    await async_weather_aggregator.get_aggregated_weather("Warm City")
+    warm = []
+    for _ in range(args.iterations * 10):
+        start = time.perf_counter()
+        await async_weather_aggregator.get_aggregated_weather("Warm City")
+        warm.append(time.perf_counter() - start)
+    results['e2e_warm'] = summarize(warm)
+    return results
+
+
+async def bench_throughput(args, stub: StubProcess) -> Dict[str, Any]:
+    from aggregator import async_weather_aggregator
+    
+    reset_caches()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+    failed = 0
+    
+    async def one(city: str):
+        nonlocal failed
+        async with semaphore:
+            start = time.perf_counter()
+            weather_data = await async_weather_aggregator.get_aggregated_weather(city)
+            latencies.append(time.perf_counter() - start)
+            if weather_data is None:
+                failed += 1
+    
+    before = stub.stats()
+    start = time.perf_counter()
+    await asyncio.gather(*(one(f"Throughput City {i:05d}") for i in range(args.cities)))
+    wall = time.perf_counter() - start
+    after = stub.stats()
+    
+    return {
+        'cities': args.cities,
+        'concurrency': args.concurrency,
+        'wall_s': round(wall, 3),
+        'cities_per_s': round(args.cities / wall, 2),
+        'failed': failed,
+        'latency': summarize(latencies),
+        'upstream_requests': {
+            provider: count - before['requests'].get(provider, 0) for provider, count in after['requests'].items()
+        },
+        'upstream_errors': {
+            provider: count - before['errors'].get(provider, 0) for provider, count in after['errors'].items()
+        },
+    }
+
+
+async def bench_memory(args) -> Dict[str, Any]:
+    """
+    Memoria retenida por ciudad tras agregarla: entradas de proveedores,
+    agregado, alias y geocodificación. Se mide después de los demás
+    escenarios, con los pools de conexiones y las métricas ya creados.
+    """
+    from aggregator import async_weather_aggregator
+    from cache import weather_cache
+    
+    reset_caches()
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for i in range(args.memory_cities):
+        await async_weather_aggregator.get_aggregated_weather(f"Memory City {i:04d}")
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    entries = list(weather_cache.memory_cache._entries.values())
+    serialized = sum(len(data) for _, _, data, _ in entries if isinstance(data, (bytes, str)))
+    return {
+        'cities': args.memory_cities,
+        'kb_per_city': round((after - before) / args.memory_cities / 1024, 2),
+        'cache_entries_per_city': round(len(entries) / args.memory_cities, 2),
+        'serialized_bytes_per_city': round(serialized / args.memory_cities, 1),
+    }
+
+
+async def run_async(args, stub: StubProcess) -> Dict[str, Any]:
+    from fetcher import async_weather_fetcher
+    
+    results = {}
+    try:
+        results.update(await bench_end_to_end(args, stub))
+        results['throughput'] = await bench_throughput(args, stub)
+        results['memory'] = await bench_memory(args)
+    finally:
+        await async_weather_fetcher.aclose()
+    return results
+
+
+# --- Escenarios de CPU (sin red) ---
+
+def parsed_sources(fixtures_dir: str):
+    from fetcher import BaseWeatherFetcher
+    from models import CityInfo
+    
+    fetcher = BaseWeatherFetcher()
+    city_info = CityInfo(name='Montevideo', country='UY', latitude=-34.9058, longitude=-56.1913, timezone='UTC-3')
+    raw = {provider: load_fixture(fixtures_dir, provider) for provider in fetcher.providers}
+    parsers = {provider: spec.parse for provider, spec in fetcher.providers.items()}
+    return city_info, raw, parsers
+
+
+def horizon_series(series, hours: int):
+    """Serie horaria de `hours` horas que repite las filas grabadas de la fuente"""
+    from models import HourlySeries
+    
+    result = HourlySeries()
+    points = list(series)
+    start = points[0].datetime
+    for hour in range(hours):
+        point = points[hour % len(points)]
+        result.add(start + timedelta(hours=hour), point.temperature, point.precipitation,
+                   point.wind_speed, point.source)
+    return result
+
+
+def bench_cpu(args) -> Dict[str, Any]:
+    from aggregator import async_weather_aggregator
+    from cache import weather_cache
+    from numpy_engine import NumpyAggregationEngine, NUMPY_AVAILABLE
+    
+    city_info, raw, parsers = parsed_sources(args.fixtures)
+    repeat = args.repeat
+    results: Dict[str, Any] = {}
+    
+    results['parse'] = {
+        provider: summarize(measure(lambda: parse(raw[provider], city_info), repeat, time.thread_time), 'us')
+        for provider, parse in parsers.items()
+    }
+    results['decode'] = {
+        provider: summarize(measure(lambda: json.loads(body), repeat, time.thread_time), 'us')
+        for provider, body in ((p, json.dumps(data).encode('utf-8')) for p, data in raw.items())
+    }
+    
+    sources = [parse(raw[provider], city_info) for provider, parse in parsers.items()]
+    engines = {'python': None}
+    if NUMPY_AVAILABLE:
+        engines['numpy'] = NumpyAggregationEngine()
+    configured = async_weather_aggregator._numpy_engine
+    results['aggregation'] = {}
+    try:
+        for name, engine in engines.items():
+            async_weather_aggregator._numpy_engine = engine
+            results['aggregation'][name] = summarize(
+                measure(lambda: async_weather_aggregator._combine_sources(sources), repeat, time.thread_time), 'us'
+            )
+    finally:
+        async_weather_aggregator._numpy_engine = configured
+    
+    # Horizontes largos: series horarias sintéticas de las mismas fuentes
+    results['aggregation_horizon'] = {}
+    try:
+        for hours in args.horizons:
+            series_list = [horizon_series(source.hourly, hours) for source in sources]
+            results['aggregation_horizon'][f'{hours}h'] = {}
+            for name, engine in engines.items():
+                async_weather_aggregator._numpy_engine = engine
+                results['aggregation_horizon'][f'{hours}h'][name] = summarize(measure(
+                    lambda: async_weather_aggregator._aggregate_series(series_list, True, 3600, hours),
+                    repeat, time.thread_time
+                ), 'us')
+    finally:
+        async_weather_aggregator._numpy_engine = configured
+    
+    aggregated = async_weather_aggregator._combine_sources(sources)
+    
+    # Formateo sin el caché de mensajes renderizados
+    with contextlib.redirect_stdout(sys.stderr):
+        from bot import UniversalWeatherBot
+        bot = UniversalWeatherBot()
+    results['formatting'] = {
+        'hourly': summarize(measure(lambda: bot._format_hourly_weather(aggregated), repeat, time.thread_time), 'us'),
+        'daily': summarize(measure(lambda: bot._format_daily_weather(aggregated), repeat, time.thread_time), 'us'),
+    }
+    
+    # Caché: lectura con acierto (incluye deserializar), fallo y escritura
+    reset_caches()
+    weather_cache.set_weather("Cache City", 'aggregated', aggregated)
+    results['cache'] = {
+        'hit': summarize(measure(lambda: weather_cache.get_weather_entry("Cache City", 'aggregated'), repeat), 'us'),
+        'miss': summarize(measure(lambda: weather_cache.get_weather_entry("Missing City", 'aggregated'), repeat), 'us'),
+        'set': summarize(measure(lambda: weather_cache.set_weather("Cache City", 'aggregated', aggregated), repeat), 'us'),
+        'entry_bytes': len(weather_cache.serializer.dumps(aggregated)),
+    }
+    reset_caches()
+    return results
+
+
+# --- Comparación con una ejecución anterior ---
+
+def flatten(data: Dict[str, Any], prefix: str = '') -> Dict[str, float]:
+    result = {}
+    for key, value in data.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            result.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            result[path] = value
+    return result
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], max_regression: float) -> List[str]:
+    """Imprime la variación de cada métrica comparable y devuelve las que empeoran demasiado"""
+    old, new = flatten(baseline['results']), flatten(current['results'])
+    regressions = []
+    for path in sorted(set(old) & set(new)):
+        suffix = next((s for s in COMPARED_SUFFIXES if path.endswith(s)), None)
+        if suffix is None or not old[path]:
+            continue
+        change = (new[path] - old[path]) / old[path]
+        worse = -change if COMPARED_SUFFIXES[suffix] else change
+        flag = '❌' if worse > max_regression else '  '
+        print(f"{flag} {path:55} {old[path]:>12} -> {new[path]:>12} ({change:+.1%})", file=sys.stderr)
+        if worse > max_regression:
+            regressions.append(path)
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks sin red del bot meteorológico")
+    parser.add_argument('--output', '-o', help="fichero JSON de resultados (por defecto, la salida estándar)")
+    parser.add_argument('--iterations', type=int, default=20, help="consultas de extremo a extremo medidas")
+    parser.add_argument('--cities', type=int, default=100, help="ciudades de la prueba de rendimiento")
+    parser.add_argument('--concurrency', type=int, default=20, help="ciudades consultadas a la vez")
+    parser.add_argument('--memory-cities', type=int, default=50, help="ciudades de la medida de memoria")
+    parser.add_argument('--repeat', type=int, default=200, help="repeticiones de las medidas de CPU")
+    parser.add_argument('--engine', choices=('python', 'numpy'), default='python', help="motor de agregación")
+    parser.add_argument('--horizons', type=int, nargs='+', default=[24, 48, 168],
+                        help="horas de las medidas de agregación por horizonte")
+    parser.add_argument('--serializer', choices=('binary', 'json'), default='binary', help="serializador del caché")
+    parser.add_argument('--streaming', action='store_true', help="decodificación incremental del JSON (ijson)")
+    parser.add_argument('--skip-network', action='store_true', help="solo las medidas de CPU y caché")
+    parser.add_argument('--baseline', help="resultado anterior con el que comparar")
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help="empeoramiento relativo máximo admitido con --baseline")
+    parser.add_argument('--verbose', action='store_true', help="mostrar los mensajes del bot")
+    add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    configure_environment(args)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    
+    report: Dict[str, Any] = {
+        'schema': SCHEMA_VERSION,
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': {
+            key: value for key, value in vars(args).items()
+            if key not in ('output', 'baseline', 'verbose')
+        },
+        'results': {},
+    }
+    report['config']['fixtures'] = os.path.relpath(args.fixtures, ROOT) if args.fixtures == FIXTURES_DIR else args.fixtures
+    
+    # Los mensajes del bot ("✅ Datos obtenidos de ...") no deben mezclarse con el JSON
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    with quiet:
+        from json_stream import IJSON_AVAILABLE
+        from numpy_engine import NUMPY_AVAILABLE
+        report['meta']['numpy'] = NUMPY_AVAILABLE
+        report['meta']['ijson'] = IJSON_AVAILABLE
+        
+        report['results'].update(bench_cpu(args))
+        if not args.verbose:
+            # bot.py configura el logging en INFO al importarse
+            logging.getLogger('httpx').setLevel(logging.WARNING)
+        if not args.skip_network:
+            stub = StubProcess(args)
+            try:
+                redirect_http(stub.url)
+                report['results'].update(asyncio.run(run_async(args, stub)))
+            finally:
+                stub.stop()
+    
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"📊 Resultados guardados en {args.output}", file=sys.stderr)
+    else:
+        print(output)
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.max_regression)
+        if regressions:
+            print(f"❌ {len(regressions)} métricas empeoran más de un {args.max_regression:.0%}", file=sys.stderr)
+            return 1
+        print("✅ Sin regresiones respecto a la referencia", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""
+Servidor HTTP local que imita a los proveedores meteorológicos
+
+Responde con las respuestas grabadas de `benchmarks/fixtures` según la
+cabecera Host y la ruta de la petición, con latencia y errores
+inyectados. La geocodificación devuelve coordenadas distintas (y
+estables) para cada nombre de ciudad, así cada ciudad ocupa sus propias
+entradas de caché.
+
+Uso:
+    python benchmarks/stub_server.py --port 8999 --latency-ms 80 --error-rate 0.05
+
+`GET /__stats` devuelve las peticiones atendidas por proveedor.
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# (host, prefijo de la ruta, proveedor, fichero grabado o None si la respuesta se genera)
+ROUTES = [
+    ('api.openweathermap.org', '/geo/1.0/direct', 'geocoding', None),
+    ('api.openweathermap.org', '/geo/1.0/reverse', 'geocoding', 'openweathermap_geocoding.json'),
+    ('api.openweathermap.org', '/data/2.5/weather', 'geocoding', 'openweathermap_timezone.json'),
+    ('api.openweathermap.org', '/data/3.0/onecall', 'openweathermap', 'openweathermap.json'),
+    ('api.met.no', '/weatherapi/locationforecast', 'metno', 'metno.json'),
+    ('api.weatherapi.com', '/v1/forecast.json', 'weatherapi', 'weatherapi.json'),
+    ('api.tomorrow.io', '/v4/timelines', 'tomorrow', 'tomorrow.json'),
+    ('weather.visualcrossing.com', '/VisualCrossingWebServices/rest/services/timeline/', 'visualcrossing',
+     'visualcrossing.json'),
+    ('nominatim.openstreetmap.org', '/reverse', 'nominatim', None),
+]
+
+
+def city_coordinates(name: str) -> Tuple[float, float]:
+    """Coordenadas estables para un nombre de ciudad (repartidas por el globo)"""
+    digest = hashlib.sha1(name.strip().lower().encode('utf-8')).digest()
+    lat = int.from_bytes(digest[:4], 'big') / 2 ** 32 * 140 - 70
+    lon = int.from_bytes(digest[4:8], 'big') / 2 ** 32 * 360 - 180
+    return round(lat, 4), round(lon, 4)
+
+
+class StubConfig:
+    """Latencia y errores inyectados, en general o por proveedor"""
+    
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0,
+                 error_status: int = 503, provider_latency_ms: Optional[Dict[str, float]] = None,
+                 seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.provider_latency_ms = provider_latency_ms or {}
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    def delay(self, provider: str) -> float:
+        latency = self.provider_latency_ms.get(provider, self.latency_ms)
+        with self._lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, latency + jitter) / 1000
+    
+    def fails(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self.random.random() < self.error_rate
+
+
+class StubServer:
+    """Servidor de respuestas grabadas en un hilo en segundo plano"""
+    
+    def __init__(self, config: StubConfig, host: str = '127.0.0.1', port: int = 0,
+                 fixtures_dir: str = FIXTURES_DIR):
+        self.config = config
+        self.fixtures: Dict[str, bytes] = {}
+        for _, _, _, filename in ROUTES:
+            if filename and filename not in self.fixtures:
+                with open(os.path.join(fixtures_dir, filename), 'rb') as f:
+                    self.fixtures[filename] = f.read()
+        with open(os.path.join(fixtures_dir, 'openweathermap_geocoding.json'), 'rb') as f:
+            self.geocoding = json.loads(f.read())
+        
+        self.requests: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def _count(self, counters: Dict[str, int], provider: str):
+        with self._lock:
+            counters[provider] = counters.get(provider, 0) + 1
+    
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {'requests': dict(self.requests), 'errors': dict(self.errors)}
+    
+    def _geocode(self, query: str) -> bytes:
+        name = query.split(',')[0].strip() or 'Montevideo'
+        lat, lon = city_coordinates(query)
+        location = dict(self.geocoding[0], name=name, lat=lat, lon=lon, local_names={'es': name})
+        return json.dumps([location]).encode('utf-8')
+    
+    def respond(self, host: str, target: str) -> Tuple[int, str, bytes]:
+        """(estado, proveedor, cuerpo) para una petición"""
+        parts = urlsplit(target)
+        host = host.split(':')[0]
+        for route_host, prefix, provider, filename in ROUTES:
+            if host != route_host or not parts.path.startswith(prefix):
+                continue
+            
+            time.sleep(self.config.delay(provider))
+            self._count(self.requests, provider)
+            if self.config.fails():
+                self._count(self.errors, provider)
+                return self.config.error_status, provider, b'{"message": "injected error"}'
+            
+            if filename:
+                return 200, provider, self.fixtures[filename]
+            if provider == 'geocoding':
+                return 200, provider, self._geocode(parse_qs(parts.query).get('q', [''])[0])
+            return 200, provider, json.dumps({'address': {'city': 'Montevideo', 'country': 'Uruguay'}}).encode('utf-8')
+        
+        return 404, 'unknown', b'{"message": "no fixture"}'
+    
+    def _handler_class(self):
+        server = self
+        
+        class StubHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def do_GET(self):
+                if self.path == '/__stats':
+                    status, body = 200, json.dumps(server.stats()).encode('utf-8')
+                else:
+                    status, _, body = server.respond(self.headers.get('Host', ''), self.path)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return StubHandler
+    
+    def start(self) -> 'StubServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-server', daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def parse_provider_latency(values) -> Dict[str, float]:
+    """['metno=250', ...] -> {'metno': 250.0}"""
+    result = {}
+    for value in values or []:
+        provider, _, latency = value.partition('=')
+        result[provider.strip()] = float(latency)
+    return result
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    group = parser.add_argument_group('servidor simulado')
+    group.add_argument('--latency-ms', type=float, default=50, help="latencia de cada respuesta (ms)")
+    group.add_argument('--jitter-ms', type=float, default=10, help="variación aleatoria de la latencia (± ms)")
+    group.add_argument('--provider-latency', action='append', metavar='PROVEEDOR=MS',
+                       help="latencia de un proveedor concreto (repetible), p. ej. metno=250")
+    group.add_argument('--error-rate', type=float, default=0.0, help="fracción de respuestas con error")
+    group.add_argument('--error-status', type=int, default=503, help="código HTTP de los errores inyectados")
+    group.add_argument('--fixtures', default=FIXTURES_DIR, help="directorio con las respuestas grabadas")
+    group.add_argument('--seed', type=int, default=1, help="semilla de la latencia y los errores")
+
+
+def config_from_args(args) -> StubConfig:
+    return StubConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        provider_latency_ms=parse_provider_latency(args.provider_latency),
+        seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local con respuestas grabadas de los proveedores")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8999)
+    add_arguments(parser)
+    args = parser.parse_args()
+    
+    server = StubServer(config_from_args(args), args.host, args.port, args.fixtures).start()
+    print(f"🧪 Servidor simulado en {server.url} (Ctrl+C para detener)", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,16 +2,26 @@
 Bot de Telegram para pronósticos meteorológicos universales
 """
 import os
+import io
 import logging
 from datetime import datetime, time
 from telegram import Update, KeyboardButton, ReplyKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, ContextTypes, filters
 from telegram.constants import ParseMode
 from dotenv import load_dotenv
-from aggregator import weather_aggregator
-from cache import weather_cache
-import asyncio
-import requests
+from aggregator import async_weather_aggregator
+from fetcher import async_weather_fetcher
+from cache import weather_cache, geocoding_cache, LRUMemoryCache
+from http_session import http_sessions
+from prewarm import cache_prewarmer
+from models import Subscription
+from subscriptions import subscription_store, BroadcastScheduler, parse_send_time
+from delivery import outbound_limiter
+from quota import quota_manager
+from reverse_geocoding import reverse_geocoder
+from resilience import provider_health, CircuitBreaker
+from gazetteer import gazetteer
+from metrics import metrics
 
 # Cargar variables de entorno
 load_dotenv()
@@ -25,6 +35,17 @@ logger = logging.getLogger(__name__)
 
 
 class UniversalWeatherBot:
+    # Variantes de mensaje: encabezado y formato del pronóstico
+    MESSAGE_VARIANTS = {
+        'hoy': ("", 'hourly'),
+        'semana': ("", 'daily'),
+        'matutino': ("🌅 **Buenos días! Pronóstico para hoy**\n\n", 'hourly'),
+        'vespertino': ("🌆 **Pronóstico para mañana**\n\n", 'daily'),
+        'ubicacion': ("📍 **Pronóstico para tu ubicación**\n\n", 'hourly'),
+        'programado_hoy': ("⏰ **Pronóstico programado**\n\n", 'hourly'),
+        'programado_semana': ("⏰ **Pronóstico programado**\n\n", 'daily'),
+    }
+    
     def __init__(self):
         self.token = os.getenv('TELEGRAM_BOT_TOKEN')
         if not self.token:
@@ -32,21 +53,122 @@ class UniversalWeatherBot:
         
         self.group_chat_id = os.getenv('GROUP_CHAT_ID')
         self.default_city = os.getenv('DEFAULT_CITY', 'Montevideo')
+        self.default_timezone = os.getenv('DEFAULT_TIMEZONE', 'America/Montevideo')
+        
+        # Mensajes ya renderizados, por variante y versión de los datos
+        self.render_cache = LRUMemoryCache(
+            max_entries=int(os.getenv('RENDER_CACHE_MAX_ENTRIES', '500')),
+            on_evict=lambda key, label: metrics.inc('weather_cache_evictions_total', data_type='render')
+        )
+        self.render_ttl = int(os.getenv('RENDER_CACHE_TTL', '3600'))
         
-        self.application = Application.builder().token(self.token).build()
+        # Usuarios que pueden consultar /stats
+        self.admin_user_ids = {
+            int(user_id) for user_id in os.getenv('ADMIN_USER_IDS', '').replace(' ', '').split(',') if user_id
+        }
+        
+        self.application = (
+            Application.builder()
+            .token(self.token)
+            .post_init(self._post_init)
+            .post_shutdown(self._post_shutdown)
+            .rate_limiter(outbound_limiter)
+            .build()
+        )
+        self.scheduler = BroadcastScheduler(self.application, subscription_store, self._format_subscription)
+        self._setup_group_schedule()
         self._setup_handlers()
+        metrics.register_collector(self._collect_metrics)
+    
+    def _setup_group_schedule(self):
+        """Programa los envíos matutino y vespertino al grupo configurado"""
+        if not self.group_chat_id:
+            return
+        
+        # Con los mismos mensajes que /matutino y /vespertino
+        for env_name, kind, variant in (('MORNING_TIME', 'hoy', 'matutino'), ('EVENING_TIME', 'semana', 'vespertino')):
+            send_time = parse_send_time(os.getenv(env_name, ''))
+            if send_time:
+                self.scheduler.static.append(Subscription(
+                    chat_id=int(self.group_chat_id),
+                    city=self.default_city,
+                    send_time=send_time,
+                    timezone=self.default_timezone,
+                    kind=kind,
+                    variant=variant
+                ))
+    
+    async def _post_init(self, application: Application):
+        """Inicia las tareas en segundo plano del event loop"""
+        cache_prewarmer.start()
+        self.scheduler.sync_jobs()
+        metrics.start_server()
+    
+    async def _post_shutdown(self, application: Application):
+        """Libera los recursos asíncronos al detener el bot"""
+        await cache_prewarmer.stop()
+        await async_weather_fetcher.aclose()
+        await reverse_geocoder.aclose()
+        http_sessions.close()
+        weather_cache.stop_sweeper()
+        geocoding_cache.close()
+        metrics.stop_server()
+    
+    def _timed(self, command: str, callback):
+        """Envuelve un handler para medir su duración total"""
+        async def handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            with metrics.timer('bot_command_seconds', command=command):
+                await callback(update, context)
+        return handler
+    
+    def _collect_metrics(self):
+        """Estado actual de los demás componentes, para las métricas de Prometheus"""
+        limiter = outbound_limiter.stats()
+        yield ('telegram_queue_depth', 'gauge', "Peticiones esperando en la cola de salida",
+               [({}, limiter['queue_depth'])])
+        yield ('telegram_requests_total', 'counter', "Peticiones a Telegram por resultado",
+               [({'result': 'sent'}, limiter['sent']), ({'result': 'retried'}, limiter['retries']),
+                ({'result': 'failed'}, limiter['failed'])])
+        
+        health = provider_health.stats()
+        yield ('weather_provider_circuit_open', 'gauge', "1 si el circuit breaker del proveedor está abierto",
+               [({'provider': provider}, int(state['state'] == CircuitBreaker.OPEN))
+                for provider, state in health.items()])
+        yield ('weather_provider_timeout_seconds', 'gauge', "Timeout adaptativo de cada proveedor",
+               [({'provider': provider}, state['timeout']) for provider, state in health.items()])
+        
+        quota_samples = []
+        for provider, status in quota_manager.status().items():
+            for window, usage in status['windows'].items():
+                quota_samples.append(({'provider': provider, 'window': window}, usage['remaining']))
+        yield ('weather_quota_remaining', 'gauge', "Llamadas restantes en la ventana de cuota", quota_samples)
+        
+        entries = [({'cache': 'render'}, len(self.render_cache)),
+                   ({'cache': 'reverse_geocoding'}, reverse_geocoder.stats()['entries'])]
+        if not weather_cache.use_redis:
+            entries.append(({'cache': 'weather'}, weather_cache.stats()['entries']))
+        if geocoding_cache.backend != 'redis':
+            entries.append(({'cache': 'geocoding'}, len(geocoding_cache.entries)))
+        yield ('weather_cache_entries', 'gauge', "Entradas en los cachés en memoria", entries)
+        yield ('weather_gazetteer_cities', 'gauge', "Ciudades del diccionario geográfico local",
+               [({}, gazetteer.stats()['cities'])])
     
     def _setup_handlers(self):
         """Configura los manejadores de comandos"""
-        self.application.add_handler(CommandHandler("start", self.start_command))
-        self.application.add_handler(CommandHandler("help", self.help_command))
-        self.application.add_handler(CommandHandler("tiempo", self.weather_command))
-        self.application.add_handler(CommandHandler("chatid", self.get_chat_id))
-        self.application.add_handler(CommandHandler("actualizar", self.manual_update_command))
-        self.application.add_handler(CommandHandler("matutino", self.morning_update_command))
-        self.application.add_handler(CommandHandler("vespertino", self.evening_update_command))
-        self.application.add_handler(CommandHandler("ubicacion", self.location_weather_command))
-        self.application.add_handler(MessageHandler(filters.LOCATION, self.handle_location))
+        self.application.add_handler(CommandHandler("start", self._timed("start", self.start_command)))
+        self.application.add_handler(CommandHandler("help", self._timed("help", self.help_command)))
+        self.application.add_handler(CommandHandler("tiempo", self._timed("tiempo", self.weather_command)))
+        self.application.add_handler(CommandHandler("chatid", self._timed("chatid", self.get_chat_id)))
+        self.application.add_handler(CommandHandler("actualizar", self._timed("actualizar", self.manual_update_command)))
+        self.application.add_handler(CommandHandler("matutino", self._timed("matutino", self.morning_update_command)))
+        self.application.add_handler(CommandHandler("vespertino", self._timed("vespertino", self.evening_update_command)))
+        self.application.add_handler(CommandHandler("ubicacion", self._timed("ubicacion", self.location_weather_command)))
+        self.application.add_handler(CommandHandler("suscribir", self._timed("suscribir", self.subscribe_command)))
+        self.application.add_handler(CommandHandler("desuscribir", self._timed("desuscribir", self.unsubscribe_command)))
+        self.application.add_handler(CommandHandler("suscripciones", self._timed("suscripciones", self.subscriptions_command)))
+        self.application.add_handler(CommandHandler("cuotas", self._timed("cuotas", self.quotas_command)))
+        self.application.add_handler(CommandHandler("stats", self.stats_command))
+        self.application.add_handler(MessageHandler(filters.LOCATION, self._timed("ubicacion_compartida", self.handle_location)))
     
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Comando /start"""
@@ -88,6 +210,14 @@ Obtén pronósticos meteorológicos precisos para cualquier ciudad del mundo.
 • `/matutino` - Envía pronóstico matutino al grupo
 • `/vespertino` - Envía pronóstico semanal al grupo
 • `/chatid` - Obtiene ID del chat para configuración
+• `/cuotas` - Uso y cuota restante de las APIs
+• `/stats` - Métricas de rendimiento (administradores)
+
+**Envíos programados:**
+• `/suscribir hoy <HH:MM> <ciudad>` - Pronóstico horario cada día a esa hora
+• `/suscribir semana <HH:MM> <ciudad>` - Pronóstico semanal cada día a esa hora
+• `/suscripciones` - Lista los envíos programados del chat
+• `/desuscribir [HH:MM]` - Cancela uno o todos los envíos
 
 **Información mostrada:**
 📊 **Pronóstico horario:**
@@ -168,9 +298,11 @@ Agrega este ID al archivo .env como `GROUP_CHAT_ID={chat_id}`
             parse_mode=ParseMode.MARKDOWN
         )
         
+        cache_prewarmer.record(city)
+        
         try:
             # Obtener datos agregados
-            weather_data = weather_aggregator.get_aggregated_weather(city)
+            weather_data = await async_weather_aggregator.get_aggregated_weather(city)
             
             if not weather_data:
                 await loading_msg.edit_text(
@@ -181,11 +313,8 @@ Agrega este ID al archivo .env como `GROUP_CHAT_ID={chat_id}`
                 )
                 return
             
-            # Generar respuesta según el tipo de comando
-            if command_type == 'hoy':
-                response = self._format_hourly_weather(weather_data)
-            else:  # semana
-                response = self._format_daily_weather(weather_data)
+            # Generar respuesta según el tipo de comando (hoy o semana)
+            response = self._render_weather(command_type, weather_data)
             
             await loading_msg.edit_text(response, parse_mode=ParseMode.MARKDOWN)
             
@@ -252,18 +381,40 @@ Agrega este ID al archivo .env como `GROUP_CHAT_ID={chat_id}`
         else:
             return "⚪"  # Muy frío
     
+    def _render_weather(self, variant: str, weather_data) -> str:
+        """
+        Devuelve el mensaje de una variante, renderizándolo solo la primera
+        vez para cada versión de los datos agregados.
+        """
+        header, kind = self.MESSAGE_VARIANTS[variant]
+        # last_updated cambia con cada agregación; la fecha entra porque el
+        # formato horario muestra el día actual
+        key = (
+            f"{variant}:{weather_data.city}:{weather_data.country}:{weather_data.timezone}:"
+            f"{weather_data.last_updated.isoformat()}:{datetime.now().date().isoformat()}"
+        )
+        message = self.render_cache.get(key)
+        metrics.inc('weather_cache_requests_total', data_type='render', result='miss' if message is None else 'hit')
+        if message is None:
+            formatter = self._format_hourly_weather if kind == 'hourly' else self._format_daily_weather
+            with metrics.timer('weather_render_seconds', variant=variant):
+                message = header + formatter(weather_data)
+            self.render_cache.set(key, message, self.render_ttl)
+        return message
+    
     def _format_hourly_weather(self, weather_data) -> str:
         """Formatea el pronóstico horario con diseño moderno"""
         if not weather_data.hourly:
             return "❌ No hay datos horarios disponibles"
         
         # Header con información de la ciudad
-        header = f"🌍 **{weather_data.city}, {weather_data.country}**\n"
-        header += f"📅 {datetime.now().strftime('%A, %d de %B %Y')}\n"
-        header += f"🕐 {weather_data.timezone}\n\n"
-        
-        # Pronóstico por horas con diseño moderno (sin tablas markdown)
-        forecast_text = "⏰ **Pronóstico por horas:**\n\n"
+        parts = [
+            f"🌍 **{weather_data.city}, {weather_data.country}**\n",
+            f"📅 {datetime.now().strftime('%A, %d de %B %Y')}\n",
+            f"🕐 {weather_data.timezone}\n\n",
+            # Pronóstico por horas con diseño moderno (sin tablas markdown)
+            "⏰ **Pronóstico por horas:**\n\n",
+        ]
         
         # Agrupar por bloques de 6 horas para mejor legibilidad
         time_blocks = [
@@ -276,8 +427,8 @@ Agrega este ID al archivo .env como `GROUP_CHAT_ID={chat_id}`
         for block_name, hours in time_blocks:
             if not hours:
                 continue
-                
-            forecast_text += f"{block_name}\n"
+            
+            parts.append(f"{block_name}\n")
             
             for hour_data in hours:
                 hour_str = hour_data.datetime.strftime("%H:%M")
@@ -289,21 +440,19 @@ Agrega este ID al archivo .env como `GROUP_CHAT_ID={chat_id}`
                 weather_emoji = self._get_weather_emoji(temp, precip, hour_data.wind_speed)
                 temp_emoji = self._get_temp_color_emoji(temp)
                 
-                # Probabilidad de lluvia
-                rain_prob = self._get_rain_probability(precip)
-                
                 # Formatear línea de pronóstico
-                line = f"{hour_str} {weather_emoji} {temp_emoji} **{temp:.1f}°C**"
+                parts.append(f"{hour_str} {weather_emoji} {temp_emoji} **{temp:.1f}°C**")
                 
                 if precip > 0:
-                    line += f" 🌧️ {precip:.1f}mm ({rain_prob}%)"
+                    # Probabilidad de lluvia
+                    rain_prob = self._get_rain_probability(precip)
+                    parts.append(f" 🌧️ {precip:.1f}mm ({rain_prob}%)")
                 else:
-                    line += f" ☀️ Sin lluvia"
+                    parts.append(" ☀️ Sin lluvia")
                 
-                line += f" 💨 {wind_kmh:.0f}km/h\n"
-                forecast_text += line
+                parts.append(f" 💨 {wind_kmh:.0f}km/h\n")
             
-            forecast_text += "\n"
+            parts.append("\n")
         
         # Resumen visual del día
         temps = [h.temperature for h in weather_data.hourly[:24]]
@@ -320,14 +469,14 @@ Agrega este ID al archivo .env como `GROUP_CHAT_ID={chat_id}`
         weather_emoji = self._get_weather_emoji(max_temp, max_precip, max(winds)/3.6)
         temp_emoji = self._get_temp_color_emoji(max_temp)
         
-        summary = f"{weather_emoji} **Resumen del día:**\n\n"
-        summary += f"{temp_emoji} **Temperatura:** {min_temp:.1f}°C - {max_temp:.1f}°C\n"
+        parts.append(f"{weather_emoji} **Resumen del día:**\n\n")
+        parts.append(f"{temp_emoji} **Temperatura:** {min_temp:.1f}°C - {max_temp:.1f}°C\n")
         
         if total_precip > 0:
             rain_prob = self._get_rain_probability(max_precip)
-            summary += f"🌧️ **Precipitación:** {total_precip:.1f}mm total ({rain_prob}% prob.)\n"
+            parts.append(f"🌧️ **Precipitación:** {total_precip:.1f}mm total ({rain_prob}% prob.)\n")
         else:
-            summary += f"☀️ **Sin lluvia** esperada hoy\n"
+            parts.append("☀️ **Sin lluvia** esperada hoy\n")
         
         # Clasificación del viento (ahora en km/h)
         if avg_wind < 7:
@@ -341,25 +490,27 @@ Agrega este ID al archivo .env como `GROUP_CHAT_ID={chat_id}`
         else:
             wind_desc = "Viento muy fuerte"
         
-        summary += f"💨 **Viento:** {avg_wind:.0f}km/h ({wind_desc})\n\n"
+        parts.append(f"💨 **Viento:** {avg_wind:.0f}km/h ({wind_desc})\n\n")
         
         # Recomendaciones
-        recommendations = "💡 **Recomendaciones:**\n"
+        recommendations = []
         if max_temp > 25:
-            recommendations += "• ☀️ Usa protector solar y mantente hidratado\n"
+            recommendations.append("• ☀️ Usa protector solar y mantente hidratado\n")
         if total_precip > 2:
-            recommendations += "• ☔ Lleva paraguas o impermeable\n"
+            recommendations.append("• ☔ Lleva paraguas o impermeable\n")
         if avg_wind > 29:  # Más de 29 km/h
-            recommendations += "• 💨 Cuidado con objetos que puedan volar\n"
+            recommendations.append("• 💨 Cuidado con objetos que puedan volar\n")
         if min_temp < 10:
-            recommendations += "• 🧥 Abrígate bien, especialmente en la mañana\n"
+            recommendations.append("• 🧥 Abrígate bien, especialmente en la mañana\n")
         
-        if recommendations == "💡 **Recomendaciones:**\n":
-            recommendations += "• 😊 ¡Día perfecto para actividades al aire libre!\n"
+        if not recommendations:
+            recommendations.append("• 😊 ¡Día perfecto para actividades al aire libre!\n")
         
-        recommendations += f"\n🔄 **Actualizado:** {weather_data.last_updated.strftime('%H:%M')}"
+        parts.append("💡 **Recomendaciones:**\n")
+        parts.extend(recommendations)
+        parts.append(f"\n🔄 **Actualizado:** {weather_data.last_updated.strftime('%H:%M')}")
         
-        return header + forecast_text + summary + recommendations
+        return ''.join(parts)
     
     def _get_day_emoji(self, day_name):
         """Obtiene emoji para cada día de la semana"""
@@ -375,12 +526,13 @@ Agrega este ID al archivo .env como `GROUP_CHAT_ID={chat_id}`
             return "❌ No hay datos diarios disponibles"
         
         # Header con información de la ciudad
-        header = f"🗓️ **{weather_data.city}, {weather_data.country}**\n"
-        header += f"📅 Pronóstico de 7 días\n"
-        header += f"🕐 {weather_data.timezone}\n\n"
-        
-        # Pronóstico semanal con diseño moderno (sin tablas markdown)
-        forecast_text = "📅 **Pronóstico semanal:**\n\n"
+        parts = [
+            f"🗓️ **{weather_data.city}, {weather_data.country}**\n",
+            "📅 Pronóstico de 7 días\n",
+            f"🕐 {weather_data.timezone}\n\n",
+            # Pronóstico semanal con diseño moderno (sin tablas markdown)
+            "📅 **Pronóstico semanal:**\n\n",
+        ]
         
         for day_data in weather_data.daily[:7]:
             date_str = day_data.date.strftime("%d/%m")
@@ -398,20 +550,18 @@ Agrega este ID al archivo .env como `GROUP_CHAT_ID={chat_id}`
             weather_emoji = self._get_weather_emoji(temp_max, precip, day_data.wind_speed)
             temp_emoji = self._get_temp_color_emoji(temp_max)
             
-            # Probabilidad de lluvia
-            rain_prob = self._get_rain_probability(precip)
-            
             # Formatear línea del día
-            day_line = f"{day_emoji} **{day_name_full} {date_str}**\n"
-            day_line += f"{weather_emoji} {temp_emoji} **{temp_min:.1f}°C - {temp_max:.1f}°C**"
+            parts.append(f"{day_emoji} **{day_name_full} {date_str}**\n")
+            parts.append(f"{weather_emoji} {temp_emoji} **{temp_min:.1f}°C - {temp_max:.1f}°C**")
             
             if precip > 0:
-                day_line += f" 🌧️ {precip:.1f}mm ({rain_prob}%)"
+                # Probabilidad de lluvia
+                rain_prob = self._get_rain_probability(precip)
+                parts.append(f" 🌧️ {precip:.1f}mm ({rain_prob}%)")
             else:
-                day_line += f" ☀️ Sin lluvia"
+                parts.append(" ☀️ Sin lluvia")
             
-            day_line += f" 💨 {wind_kmh:.0f}km/h\n\n"
-            forecast_text += day_line
+            parts.append(f" 💨 {wind_kmh:.0f}km/h\n\n")
         
         # Análisis semanal detallado
         min_temps = [d.temp_min for d in weather_data.daily[:7]]
@@ -438,22 +588,22 @@ Agrega este ID al archivo .env como `GROUP_CHAT_ID={chat_id}`
         week_weather_emoji = self._get_weather_emoji(max_week_temp, max_daily_precip, max(winds))
         temp_emoji = self._get_temp_color_emoji(max_week_temp)
         
-        summary = f"{week_weather_emoji} **Resumen de la semana:**\n\n"
-        summary += f"{temp_emoji} **Temperaturas:** {min_week_temp:.1f}°C - {max_week_temp:.1f}°C\n"
-        summary += f"🔥 **Día más caluroso:** {hottest_day} ({max_week_temp:.1f}°C)\n"
-        summary += f"🧊 **Día más frío:** {coldest_day} ({min_week_temp:.1f}°C)\n\n"
+        parts.append(f"{week_weather_emoji} **Resumen de la semana:**\n\n")
+        parts.append(f"{temp_emoji} **Temperaturas:** {min_week_temp:.1f}°C - {max_week_temp:.1f}°C\n")
+        parts.append(f"🔥 **Día más caluroso:** {hottest_day} ({max_week_temp:.1f}°C)\n")
+        parts.append(f"🧊 **Día más frío:** {coldest_day} ({min_week_temp:.1f}°C)\n\n")
         
         if total_precip > 0:
             rain_days = sum(1 for p in precips if p > 0.5)
-            summary += f"🌧️ **Precipitación:** {total_precip:.1f}mm total\n"
-            summary += f"☔ **Días con lluvia:** {rain_days} de 7\n"
+            parts.append(f"🌧️ **Precipitación:** {total_precip:.1f}mm total\n")
+            parts.append(f"☔ **Días con lluvia:** {rain_days} de 7\n")
             if max_daily_precip > 2:
-                summary += f"🌊 **Día más lluvioso:** {rainiest_day} ({max_daily_precip:.1f}mm)\n"
+                parts.append(f"🌊 **Día más lluvioso:** {rainiest_day} ({max_daily_precip:.1f}mm)\n")
         else:
-            summary += f"☀️ **Semana seca:** Sin lluvia esperada\n"
+            parts.append("☀️ **Semana seca:** Sin lluvia esperada\n")
         
         avg_wind_kmh = avg_wind * 3.6  # Convertir a km/h
-        summary += f"\n💨 **Viento promedio:** {avg_wind_kmh:.0f}km/h\n"
+        parts.append(f"\n💨 **Viento promedio:** {avg_wind_kmh:.0f}km/h\n")
         
         # Clasificación del viento semanal (en km/h)
         if avg_wind_kmh < 11:
@@ -465,19 +615,19 @@ Agrega este ID al archivo .env como `GROUP_CHAT_ID={chat_id}`
         else:
             wind_desc = "Vientos muy fuertes"
         
-        summary += f"🌪️ **Condición:** {wind_desc}\n\n"
+        parts.append(f"🌪️ **Condición:** {wind_desc}\n\n")
         
         # Recomendaciones semanales
-        recommendations = "📋 **Recomendaciones para la semana:**\n"
+        parts.append("📋 **Recomendaciones para la semana:**\n")
         
         if max_week_temp > 28:
-            recommendations += "• 🌞 Semana calurosa - mantente hidratado\n"
+            parts.append("• 🌞 Semana calurosa - mantente hidratado\n")
         if min_week_temp < 5:
-            recommendations += "• 🧥 Prepara ropa de abrigo para los días fríos\n"
+            parts.append("• 🧥 Prepara ropa de abrigo para los días fríos\n")
         if total_precip > 10:
-            recommendations += "• ☔ Semana lluviosa - ten paraguas a mano\n"
+            parts.append("• ☔ Semana lluviosa - ten paraguas a mano\n")
         if avg_wind > 8:
-            recommendations += "• 💨 Vientos fuertes esperados - precaución al aire libre\n"
+            parts.append("• 💨 Vientos fuertes esperados - precaución al aire libre\n")
         
         # Mejor día de la semana
         best_day_score = []
@@ -510,14 +660,14 @@ Agrega este ID al archivo .env como `GROUP_CHAT_ID={chat_id}`
         best_day = max(best_day_score, key=lambda x: x[0])
         best_day_name = best_day[2].date.strftime("%A")
         
-        recommendations += f"• 🌟 **Mejor día:** {best_day_name} - ideal para actividades\n"
+        parts.append(f"• 🌟 **Mejor día:** {best_day_name} - ideal para actividades\n")
         
         if not any([max_week_temp > 28, min_week_temp < 5, total_precip > 10, avg_wind > 8]):
-            recommendations += "• 😊 ¡Excelente semana para planes al aire libre!\n"
+            parts.append("• 😊 ¡Excelente semana para planes al aire libre!\n")
         
-        recommendations += f"\n🔄 **Actualizado:** {weather_data.last_updated.strftime('%d/%m/%Y %H:%M')}"
+        parts.append(f"\n🔄 **Actualizado:** {weather_data.last_updated.strftime('%d/%m/%Y %H:%M')}")
         
-        return header + forecast_text + summary + recommendations
+        return ''.join(parts)
     
     async def send_morning_weather(self):
         """Envía el pronóstico matutino al grupo"""
@@ -525,11 +675,12 @@ Agrega este ID al archivo .env como `GROUP_CHAT_ID={chat_id}`
             logger.warning("GROUP_CHAT_ID no configurado, no se pueden enviar actualizaciones automáticas")
             return
         
+        cache_prewarmer.record(self.default_city)
+        
         try:
-            weather_data = weather_aggregator.get_aggregated_weather(self.default_city)
+            weather_data = await async_weather_aggregator.get_aggregated_weather(self.default_city)
             if weather_data:
-                message = f"🌅 **Buenos días! Pronóstico para hoy**\n\n"
-                message += self._format_hourly_weather(weather_data)
+                message = self._render_weather('matutino', weather_data)
                 
                 await self.application.bot.send_message(
                     chat_id=self.group_chat_id,
@@ -549,11 +700,12 @@ Agrega este ID al archivo .env como `GROUP_CHAT_ID={chat_id}`
             logger.warning("GROUP_CHAT_ID no configurado, no se pueden enviar actualizaciones automáticas")
             return
         
+        cache_prewarmer.record(self.default_city)
+        
         try:
-            weather_data = weather_aggregator.get_aggregated_weather(self.default_city)
+            weather_data = await async_weather_aggregator.get_aggregated_weather(self.default_city)
             if weather_data:
-                message = f"🌆 **Pronóstico para mañana**\n\n"
-                message += self._format_daily_weather(weather_data)
+                message = self._render_weather('vespertino', weather_data)
                 
                 await self.application.bot.send_message(
                     chat_id=self.group_chat_id,
@@ -574,12 +726,13 @@ Agrega este ID al archivo .env como `GROUP_CHAT_ID={chat_id}`
             return
         
         city = city or self.default_city
+        cache_prewarmer.record(city)
         
         try:
-            weather_data = weather_aggregator.get_aggregated_weather(city)
+            weather_data = await async_weather_aggregator.get_aggregated_weather(city)
             if weather_data:
                 message = f"🔄 **Actualización del tiempo - {city}**\n\n"
-                message += self._format_hourly_weather(weather_data)
+                message += self._render_weather('hoy', weather_data)
                 
                 await self.application.bot.send_message(
                     chat_id=self.group_chat_id,
@@ -664,6 +817,204 @@ Agrega este ID al archivo .env como `GROUP_CHAT_ID={chat_id}`
                 parse_mode=ParseMode.MARKDOWN
             )
     
+    def _format_subscription(self, subscription: Subscription, weather_data) -> str:
+        """Mensaje de un envío programado"""
+        return self._render_weather(subscription.variant or f"programado_{subscription.kind}", weather_data)
+    
+    async def subscribe_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Comando /suscribir - Programa un envío diario del pronóstico a este chat"""
+        args = context.args or []
+        send_time = parse_send_time(args[1]) if len(args) >= 3 else None
+        
+        if len(args) < 3 or args[0].lower() not in ['hoy', 'semana'] or not send_time:
+            await update.message.reply_text(
+                "❌ **Uso incorrecto**\n\n"
+                "**Formato correcto:**\n"
+                "• `/suscribir hoy <HH:MM> <ciudad>`\n"
+                "• `/suscribir semana <HH:MM> <ciudad>`\n\n"
+                "**Ejemplo:** `/suscribir hoy 07:30 Montevideo`",
+                parse_mode=ParseMode.MARKDOWN
+            )
+            return
+        
+        kind = args[0].lower()
+        city = ' '.join(args[2:])
+        
+        # La hora de envío es local a la ciudad (si se puede geocodificar)
+        city_info = await async_weather_fetcher.get_city_info(city)
+        timezone_name = city_info.timezone if city_info else self.default_timezone
+        
+        subscription_store.add(Subscription(
+            chat_id=update.effective_chat.id,
+            city=city,
+            send_time=send_time,
+            timezone=timezone_name,
+            kind=kind
+        ))
+        self.scheduler.sync_jobs()
+        
+        await update.message.reply_text(
+            "✅ **Suscripción guardada**\n\n"
+            f"📍 **Ciudad:** {city}\n"
+            f"⏰ **Hora:** {send_time} ({timezone_name})\n"
+            f"📊 **Pronóstico:** {'semanal' if kind == 'semana' else 'horario'}\n\n"
+            "Usa `/desuscribir` para cancelarla.",
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    async def unsubscribe_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Comando /desuscribir - Cancela los envíos programados del chat"""
+        send_time = parse_send_time(context.args[0]) if context.args else None
+        if context.args and not send_time:
+            await update.message.reply_text(
+                "❌ **Hora no válida**\n\n"
+                "Usa `/desuscribir` para cancelar todo o `/desuscribir <HH:MM>`.",
+                parse_mode=ParseMode.MARKDOWN
+            )
+            return
+        
+        removed = subscription_store.remove(update.effective_chat.id, send_time)
+        self.scheduler.sync_jobs()
+        
+        if removed:
+            await update.message.reply_text(
+                f"✅ **{removed} envío(s) programado(s) cancelado(s)**",
+                parse_mode=ParseMode.MARKDOWN
+            )
+        else:
+            await update.message.reply_text(
+                "ℹ️ No hay envíos programados que cancelar en este chat.",
+                parse_mode=ParseMode.MARKDOWN
+            )
+    
+    async def subscriptions_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Comando /suscripciones - Lista los envíos programados del chat"""
+        subscriptions = subscription_store.for_chat(update.effective_chat.id)
+        
+        if not subscriptions:
+            await update.message.reply_text(
+                "ℹ️ **Sin envíos programados**\n\n"
+                "Usa `/suscribir hoy <HH:MM> <ciudad>` para recibir el pronóstico cada día.",
+                parse_mode=ParseMode.MARKDOWN
+            )
+            return
+        
+        message = "📬 **Envíos programados**\n\n"
+        for subscription in subscriptions:
+            kind = 'semanal' if subscription.kind == 'semana' else 'horario'
+            message += f"• {subscription.send_time} ({subscription.timezone}) - {subscription.city} ({kind})\n"
+        
+        await update.message.reply_text(message, parse_mode=ParseMode.MARKDOWN)
+    
+    async def quotas_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Comando /cuotas - Muestra el uso y la cuota restante de cada API"""
+        window_names = {'minute': 'minuto', 'hour': 'hora', 'day': 'día'}
+        
+        message = "🚦 **Cuotas de las APIs**\n\n"
+        shown = 0
+        for provider, status in quota_manager.status().items():
+            spec = async_weather_fetcher.providers[provider]
+            if not spec.enabled or not status['windows']:
+                continue
+            
+            shown += 1
+            message += f"**{spec.label}**\n"
+            for window, usage in status['windows'].items():
+                resets_in = usage['resets_in']
+                if resets_in < 60:
+                    resets = f"{resets_in}s"
+                elif resets_in < 3600:
+                    resets = f"{resets_in // 60} min"
+                else:
+                    resets = f"{resets_in // 3600} h {resets_in % 3600 // 60} min"
+                message += (
+                    f"• {window_names[window]}: {usage['used']}/{usage['limit']} "
+                    f"(quedan {usage['remaining']}, reinicia en {resets})\n"
+                )
+            if status['blocked_for']:
+                message += f"• ⛔ Pausado {status['blocked_for']}s por límite del proveedor\n"
+            if status['skipped']:
+                message += f"• Consultas omitidas: {status['skipped']}\n"
+            message += "\n"
+        
+        if not quota_manager.enabled:
+            message += "ℹ️ El control de cuotas está desactivado (`QUOTA_ENABLED=false`)"
+        elif not shown:
+            message += (
+                "ℹ️ No hay límites configurados: usa `QUOTA_<PROVEEDOR>_PER_<VENTANA>` "
+                "o `QUOTA_FREE_TIER_DEFAULTS=true`"
+            )
+        
+        await update.message.reply_text(message, parse_mode=ParseMode.MARKDOWN)
+    
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Comando /stats - Métricas de rendimiento (solo administradores)"""
+        user = update.effective_user
+        if not user or user.id not in self.admin_user_ids:
+            await update.message.reply_text(
+                "⛔ Este comando está reservado a los administradores (`ADMIN_USER_IDS`)",
+                parse_mode=ParseMode.MARKDOWN
+            )
+            return
+        
+        # /stats prometheus: todas las métricas en formato de texto, como fichero
+        if context.args and context.args[0].lower() == 'prometheus':
+            document = io.BytesIO(metrics.render().encode('utf-8'))
+            document.name = 'metrics.txt'
+            await update.message.reply_document(document)
+            return
+        
+        histograms = metrics.histograms()
+        counters = metrics.counters()
+        
+        def latencies(name: str) -> str:
+            lines = ""
+            for labels, histogram in sorted(histograms.get(name, {}).items()):
+                title = '/'.join(value for _, value in labels) or 'total'
+                lines += (
+                    f"• `{title}`: p50 {histogram.quantile(0.5) * 1000:.1f} ms · "
+                    f"p95 {histogram.quantile(0.95) * 1000:.1f} ms (n={histogram.count})\n"
+                )
+            return lines or "• Sin datos\n"
+        
+        message = "📈 **Métricas de rendimiento**\n\n"
+        message += "**Proveedores**\n" + latencies('weather_provider_fetch_seconds')
+        errors = counters.get('weather_provider_errors_total', {})
+        if errors:
+            message += "• Errores: " + ", ".join(
+                f"`{dict(labels)['provider']}` {int(count)} ({dict(labels).get('kind', '-')})"
+                for labels, count in sorted(errors.items())
+            ) + "\n"
+        message += "\n**Geocodificación**\n" + latencies('weather_geocoding_seconds')
+        
+        message += "\n**Caché**\n"
+        reads = {}
+        for labels, count in counters.get('weather_cache_requests_total', {}).items():
+            labels = dict(labels)
+            reads.setdefault(labels['data_type'], {})[labels['result']] = int(count)
+        evictions = {dict(labels)['data_type']: int(count)
+                     for labels, count in counters.get('weather_cache_evictions_total', {}).items()}
+        for data_type in sorted(set(reads) | set(evictions)):
+            results = reads.get(data_type, {})
+            total = sum(results.values())
+            served = results.get('hit', 0) + results.get('stale', 0)
+            rate = f"{served / total:.0%}" if total else "-"
+            message += (
+                f"• `{data_type}`: {rate} aciertos ({results.get('hit', 0)} frescos, "
+                f"{results.get('stale', 0)} viejos, {results.get('miss', 0)} fallos), "
+                f"{evictions.get(data_type, 0)} expulsadas\n"
+            )
+        if not reads and not evictions:
+            message += "• Sin datos\n"
+        
+        message += "\n**Agregación (CPU)**\n" + latencies('weather_aggregation_cpu_seconds')
+        message += "\n**Formateo**\n" + latencies('weather_render_seconds')
+        message += "\n**Telegram**\n" + latencies('telegram_send_seconds')
+        message += "\n**Comandos**\n" + latencies('bot_command_seconds')
+        message += "\nℹ️ `/stats prometheus` envía todas las métricas en formato Prometheus"
+        
+        await update.message.reply_text(message, parse_mode=ParseMode.MARKDOWN)
+    
     async def location_weather_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Comando /ubicacion - Solicita ubicación del usuario"""
         # Crear botón para solicitar ubicación
@@ -726,7 +1077,8 @@ Agrega este ID al archivo .env como `GROUP_CHAT_ID={chat_id}`
             )
             
             # Obtener datos meteorológicos
-            weather_data = weather_aggregator.get_aggregated_weather(city_name)
+            cache_prewarmer.record(city_name)
+            weather_data = await async_weather_aggregator.get_aggregated_weather(city_name)
             
             if not weather_data:
                 await loading_msg.edit_text(
@@ -738,8 +1090,7 @@ Agrega este ID al archivo .env como `GROUP_CHAT_ID={chat_id}`
                 return
             
             # Generar respuesta con pronóstico horario por defecto
-            response = f"📍 **Pronóstico para tu ubicación**\n\n"
-            response += self._format_hourly_weather(weather_data)
+            response = self._render_weather('ubicacion', weather_data)
             
             await loading_msg.edit_text(response, parse_mode=ParseMode.MARKDOWN)
             
@@ -762,56 +1113,15 @@ Agrega este ID al archivo .env como `GROUP_CHAT_ID={chat_id}`
             )
     
     async def _get_city_from_coordinates(self, latitude: float, longitude: float) -> str:
-        """Obtiene el nombre de la ciudad usando geocodificación inversa"""
-        try:
-            # Intentar con OpenWeatherMap primero (si está configurado)
-            owm_key = os.getenv('OWM_KEY')
-            if owm_key and owm_key != 'your_openweathermap_api_key_here':
-                url = f"http://api.openweathermap.org/geo/1.0/reverse?lat={latitude}&lon={longitude}&limit=1&appid={owm_key}"
-                response = requests.get(url, timeout=10)
-                if response.status_code == 200:
-                    data = response.json()
-                    if data:
-                        city = data[0].get('name', '')
-                        country = data[0].get('country', '')
-                        if city:
-                            return f"{city}, {country}" if country else city
-            
-            # Alternativa: usar un servicio gratuito de geocodificación
-            # Nominatim (OpenStreetMap) - gratuito pero con límites de uso
-            url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={latitude}&lon={longitude}&zoom=10&addressdetails=1"
-            headers = {'User-Agent': 'UniversalWeatherBot/1.0'}
-            
-            response = requests.get(url, headers=headers, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                address = data.get('address', {})
-                
-                # Intentar obtener la ciudad de diferentes campos
-                city = (address.get('city') or 
-                       address.get('town') or 
-                       address.get('village') or 
-                       address.get('municipality') or
-                       address.get('county'))
-                
-                country = address.get('country')
-                
-                if city:
-                    return f"{city}, {country}" if country else city
-                elif country:
-                    return country
-            
-            return None
-            
-        except Exception as e:
-            logger.error(f"Error en geocodificación inversa: {e}")
-            return None
+        """Obtiene el nombre de la ciudad usando geocodificación inversa (con caché por zona)"""
+        return await reverse_geocoder.lookup(latitude, longitude)
     
     def run(self):
         """Ejecuta el bot"""
         print("🤖 Iniciando Universal Weather Bot...")
         print("🔄 Limpiando caché expirado...")
         weather_cache.clear_expired()
+        weather_cache.start_sweeper()
         print("✅ Bot iniciado correctamente")
         
         self.application.run_polling(allowed_updates=Update.ALL_TYPES)
@@ -4,8 +4,18 @@ Soporta caché en memoria y Redis
 """
 import json
 import os
-from typing import Optional, Dict, Any
+import math
+import asyncio
+import time
+import struct
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple, Callable
 from datetime import datetime, timedelta
+from models import WeatherData
+from serialization import get_serializer
+from metrics import metrics
 
 try:
     import redis
@@ -14,10 +24,199 @@ except ImportError:
     REDIS_AVAILABLE = False
 
 
+def normalize_city(city: str) -> str:
+    """Normaliza el nombre de ciudad: minúsculas y espacios simples"""
+    return ' '.join(unicodedata.normalize('NFKC', city).casefold().split())
+
+
+async def run_blocking(function: Callable[..., Any], *args: Any) -> Any:
+    """Ejecuta una función bloqueante (p. ej. redis-py) en un hilo sin detener el event loop"""
+    return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+
+def grid_cell(latitude: float, longitude: float, degrees: float) -> str:
+    """
+    Celda de la rejilla que contiene unas coordenadas.
+    
+    Las coordenadas se ajustan al múltiplo de `degrees` más cercano, de
+    modo que lugares a menos de media celda comparten la misma celda.
+    """
+    longitude = ((longitude + 180) % 360) - 180
+    row = math.floor(latitude / degrees + 0.5)
+    col = math.floor(longitude / degrees + 0.5)
+    return f"{degrees:g}:{row}:{col}"
+
+
+class LRUMemoryCache:
+    """
+    Caché en memoria acotado con expulsión LRU
+    
+    Limita el número de entradas (`max_entries`) y, opcionalmente, el
+    tamaño aproximado en bytes (`max_bytes`, medido como JSON). Las
+    entradas expiradas se eliminan al accederlas y en barridos
+    periódicos (`clear_expired`). `on_evict` recibe la clave de cada
+    entrada expulsada y la etiqueta (`label`) con la que se guardó.
+    """
+    
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 0,
+                 on_evict: Optional[Callable[[str, Optional[str]], None]] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        # clave -> (expira_en, tamaño, datos, etiqueta)
+        self._entries: 'OrderedDict[str, Tuple[float, int, Any, Optional[str]]]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, count=False) is not None
+    
+    def _estimate_size(self, data: Any) -> int:
+        if isinstance(data, (bytes, bytearray)):
+            return len(data)
+        if not self.max_bytes:
+            return 0
+        return len(json.dumps(data, default=str))
+    
+    def _remove(self, key: str) -> Optional[str]:
+        _, size, _, label = self._entries.pop(key)
+        self._bytes -= size
+        return label
+    
+    def get(self, key: str, count: bool = True) -> Optional[Any]:
+        """Obtiene una entrada vigente y la marca como usada recientemente"""
+        return self.get_with_ttl(key, count)[0]
+    
+    def get_with_ttl(self, key: str, count: bool = True) -> Tuple[Optional[Any], float]:
+        """Como `get`, pero devuelve también los segundos de vida restantes"""
+        with self._lock:
+            now = time.time()
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            
+            if entry is None:
+                if count:
+                    self.misses += 1
+                return None, 0.0
+            
+            self._entries.move_to_end(key)
+            if count:
+                self.hits += 1
+            return entry[2], entry[0] - now
+    
+    def ttl(self, key: str) -> Optional[float]:
+        """Segundos de vida restantes de una entrada"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            remaining = entry[0] - time.time()
+            return remaining if remaining > 0 else None
+    
+    def set(self, key: str, data: Any, ttl_seconds: float, label: Optional[str] = None):
+        """
+        Guarda una entrada, expulsando las menos usadas si se supera el
+        límite. `label` (p. ej. el tipo de dato) se pasa a `on_evict`.
+        """
+        size = self._estimate_size(data)
+        
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            
+            self._entries[key] = (time.time() + ttl_seconds, size, data, label)
+            self._bytes += size
+            
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes and self._bytes > self.max_bytes)
+            ):
+                oldest = next(iter(self._entries))
+                label = self._remove(oldest)
+                self.evictions += 1
+                if self.on_evict:
+                    self.on_evict(oldest, label)
+    
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def clear_expired(self) -> int:
+        """Elimina las entradas expiradas y devuelve cuántas se borraron"""
+        now = time.time()
+        with self._lock:
+            expired_keys = [key for key, entry in self._entries.items() if entry[0] <= now]
+            for key in expired_keys:
+                self._remove(key)
+            self.expirations += len(expired_keys)
+        return len(expired_keys)
+    
+    def items(self) -> List[Tuple[str, Any, float]]:
+        """Entradas vigentes (clave, datos, expira_en) de la menos a la más usada"""
+        now = time.time()
+        with self._lock:
+            return [(key, entry[2], entry[0]) for key, entry in self._entries.items() if entry[0] > now]
+    
+    def stats(self) -> Dict[str, int]:
+        """Contadores de uso del caché"""
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+
 class WeatherCache:
+    """
+    Caché de datos meteorológicos (Redis o memoria)
+    
+    Soporta stale-while-revalidate: cada entrada es fresca durante su TTL
+    (TTL blando) y sigue disponible como "vieja" durante `stale_ttl`
+    segundos más (TTL duro), para servirla al instante mientras se
+    refresca en segundo plano.
+    
+    Las claves se derivan de las coordenadas ajustadas a una rejilla de
+    `grid_degrees` grados: un índice de alias traduce cada nombre de
+    ciudad ya resuelto ("Montevideo", "montevideo, UY", ...) a su celda,
+    y todos los nombres de una misma celda comparten las entradas.
+    Los nombres sin alias usan una clave por nombre.
+    """
+    
     def __init__(self):
         self.redis_url = os.getenv('REDIS_URL')
         self.use_redis = REDIS_AVAILABLE and self.redis_url
+        self.stale_ttl = int(os.getenv('CACHE_STALE_TTL', '600'))
+        self.serializer = get_serializer(os.getenv('CACHE_SERIALIZER', 'binary'))
+        self.memory_cache: Optional[LRUMemoryCache] = None
+        self.sweep_interval = int(os.getenv('CACHE_SWEEP_INTERVAL', '300'))
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop_sweeper = threading.Event()
+        
+        self.grid_degrees = float(os.getenv('CACHE_GRID_DEGREES', '0.1'))
+        self.alias_ttl = int(os.getenv('CACHE_ALIAS_TTL_DAYS', '30')) * 86400
+        # Copia local del índice de alias (con Redis, el índice compartido
+        # está en Redis y aquí solo se guardan los ya consultados)
+        self.aliases = LRUMemoryCache(max_entries=int(os.getenv('CACHE_ALIAS_MAX_ENTRIES', '10000')))
         
         if self.use_redis:
             try:
@@ -27,17 +226,115 @@ class WeatherCache:
             except Exception as e:
                 print(f"❌ Error conectando a Redis: {e}")
                 self.use_redis = False
-                self.memory_cache = {}
+                self._init_memory_cache()
         else:
-            self.memory_cache = {}
+            self._init_memory_cache()
             print("📝 Usando caché en memoria")
     
+    def _init_memory_cache(self):
+        self.memory_cache = LRUMemoryCache(
+            max_entries=int(os.getenv('CACHE_MAX_ENTRIES', '1000')),
+            max_bytes=int(os.getenv('CACHE_MAX_BYTES', '0')),
+            on_evict=self._record_eviction
+        )
+    
+    async def call_async(self, function: Callable[..., Any], *args: Any) -> Any:
+        """
+        Ejecuta una operación del caché desde una corutina. Con Redis las
+        llamadas de redis-py bloquean, así que se hacen en un hilo para no
+        detener el event loop; en memoria se ejecutan directamente.
+        """
+        if not self.use_redis:
+            return function(*args)
+        return await run_blocking(function, *args)
+    
+    @staticmethod
+    def _metric_type(data_type: str) -> str:
+        """Tipo de dato para las métricas ('aggregated:a+b' -> 'aggregated')"""
+        return data_type.split(':', 1)[0]
+    
+    def _record_eviction(self, key: str, data_type: Optional[str]):
+        metrics.inc('weather_cache_evictions_total', data_type=self._metric_type(data_type or 'unknown'))
+    
+    def _record_read(self, data_type: str, found: bool, stale: bool):
+        result = 'miss' if not found else 'stale' if stale else 'hit'
+        metrics.inc('weather_cache_requests_total', data_type=self._metric_type(data_type), result=result)
+    
+    def _get_alias_key(self, city: str) -> str:
+        return f"alias:{normalize_city(city)}"
+    
+    def get_alias(self, city: str) -> Optional[Dict[str, Any]]:
+        """
+        Busca un nombre en el índice de alias.
+        
+        Returns:
+            {'cell', 'city', 'country'} o None si el nombre no tiene celda.
+        """
+        if self.grid_degrees <= 0:
+            return None
+        
+        key = self._get_alias_key(city)
+        alias = self.aliases.get(key)
+        if alias is not None or not self.use_redis:
+            return alias
+        
+        try:
+            raw = self.redis_client.get(key)
+            if raw:
+                alias = json.loads(raw)
+                ttl = self.redis_client.ttl(key)
+                self.aliases.set(key, alias, ttl if ttl and ttl > 0 else self.alias_ttl)
+                return alias
+        except Exception as e:
+            print(f"Error obteniendo alias del caché: {e}")
+        
+        return None
+    
+    def set_alias(self, city: str, latitude: float, longitude: float,
+                  name: Optional[str] = None, country: Optional[str] = None):
+        """
+        Asocia un nombre de ciudad a la celda de sus coordenadas.
+        
+        `name` y `country` son el nombre a mostrar para ese alias, ya que
+        los datos guardados en la celda pueden venir de otro nombre.
+        """
+        if self.grid_degrees <= 0:
+            return
+        
+        key = self._get_alias_key(city)
+        alias = {
+            'cell': grid_cell(latitude, longitude, self.grid_degrees),
+            'city': name,
+            'country': country
+        }
+        
+        try:
+            if self.use_redis:
+                self.redis_client.setex(key, self.alias_ttl, json.dumps(alias))
+            self.aliases.set(key, alias, self.alias_ttl)
+        except Exception as e:
+            print(f"Error guardando alias en caché: {e}")
+    
     def _get_cache_key(self, city: str, data_type: str) -> str:
-        """Genera clave única para el caché"""
-        return f"weather:{city.lower().replace(' ', '_')}:{data_type}"
+        """Genera clave única para el caché (por celda si el nombre tiene alias)"""
+        alias = self.get_alias(city)
+        if alias is not None:
+            return f"weather:cell:{alias['cell']}:{data_type}"
+        return f"weather:{normalize_city(city).replace(' ', '_')}:{data_type}"
     
     def get(self, city: str, data_type: str) -> Optional[Dict[Any, Any]]:
-        """Obtiene datos del caché"""
+        """Obtiene datos frescos del caché"""
+        data, stale = self.get_entry(city, data_type)
+        return None if stale else data
+    
+    def get_entry(self, city: str, data_type: str) -> Tuple[Optional[Dict[Any, Any]], bool]:
+        """
+        Obtiene datos del caché aunque hayan superado su TTL blando.
+        
+        Returns:
+            (datos, viejo): `viejo` es True si la entrada ya no es fresca
+            pero sigue dentro de la ventana stale-while-revalidate.
+        """
         key = self._get_cache_key(city, data_type)
         
         try:
@@ -45,57 +342,306 @@ class WeatherCache:
                 data = self.redis_client.get(key)
                 if data:
                     cached_data = json.loads(data)
-                    # Verificar si no ha expirado
-                    if datetime.fromisoformat(cached_data['expires_at']) > datetime.now():
-                        return cached_data['data']
-                    else:
-                        self.redis_client.delete(key)
+                    # Redis expira la clave al final de la ventana de datos viejos
+                    stale = datetime.fromisoformat(cached_data['expires_at']) <= datetime.now()
+                    self._record_read(data_type, True, stale)
+                    return cached_data['data'], stale
             else:
-                if key in self.memory_cache:
-                    cached_data = self.memory_cache[key]
-                    if datetime.fromisoformat(cached_data['expires_at']) > datetime.now():
-                        return cached_data['data']
-                    else:
-                        del self.memory_cache[key]
+                data, remaining = self.memory_cache.get_with_ttl(key)
+                if data is not None:
+                    stale = remaining <= self.stale_ttl
+                    self._record_read(data_type, True, stale)
+                    return data, stale
         except Exception as e:
             print(f"Error obteniendo del caché: {e}")
         
-        return None
+        self._record_read(data_type, False, False)
+        return None, False
     
-    def set(self, city: str, data_type: str, data: Dict[Any, Any], ttl_minutes: int = 30):
-        """Guarda datos en el caché"""
+    def get_weather_entry(self, city: str, data_type: str) -> Tuple[Optional[WeatherData], bool]:
+        """
+        Obtiene un WeatherData guardado con `set_weather`.
+        
+        Returns:
+            (datos, viejo), con la misma semántica que `get_entry`.
+        """
         key = self._get_cache_key(city, data_type)
-        expires_at = datetime.now() + timedelta(minutes=ttl_minutes)
         
-        cached_data = {
-            'data': data,
-            'expires_at': expires_at.isoformat()
-        }
+        try:
+            if self.use_redis:
+                raw = self.redis_client.get(key)
+                if raw:
+                    # Prefijo: instante (epoch) hasta el que la entrada es fresca
+                    (fresh_until,) = struct.unpack_from('<d', raw)
+                    stale = fresh_until <= time.time()
+                    self._record_read(data_type, True, stale)
+                    return self.serializer.loads(raw[8:]), stale
+            else:
+                raw, remaining = self.memory_cache.get_with_ttl(key)
+                if raw is not None:
+                    stale = remaining <= self.stale_ttl
+                    self._record_read(data_type, True, stale)
+                    return self.serializer.loads(raw), stale
+        except Exception as e:
+            print(f"Error obteniendo del caché: {e}")
+        
+        self._record_read(data_type, False, False)
+        return None, False
+    
+    def set_weather(self, city: str, data_type: str, weather_data: WeatherData, ttl_minutes: int = 30,
+                    ttl_seconds: Optional[int] = None):
+        """Guarda un WeatherData serializado con el serializador configurado"""
+        key = self._get_cache_key(city, data_type)
+        ttl = ttl_seconds if ttl_seconds is not None else ttl_minutes * 60
         
         try:
+            payload = self.serializer.dumps(weather_data)
             if self.use_redis:
+                fresh_until = struct.pack('<d', time.time() + ttl)
+                self.redis_client.setex(key, ttl + self.stale_ttl, fresh_until + payload)
+            else:
+                self.memory_cache.set(key, payload, ttl + self.stale_ttl, label=data_type)
+        except Exception as e:
+            print(f"Error guardando en caché: {e}")
+    
+    def get_ttl(self, city: str, data_type: str) -> Optional[float]:
+        """Segundos que le quedan a una entrada como fresca (None si no existe o es vieja)"""
+        key = self._get_cache_key(city, data_type)
+        
+        try:
+            if self.use_redis:
+                ttl = self.redis_client.ttl(key)
+                remaining = ttl - self.stale_ttl if ttl and ttl > 0 else 0
+            else:
+                remaining = (self.memory_cache.ttl(key) or 0) - self.stale_ttl
+            return float(remaining) if remaining > 0 else None
+        except Exception as e:
+            print(f"Error obteniendo TTL del caché: {e}")
+        
+        return None
+    
+    def set(self, city: str, data_type: str, data: Dict[Any, Any], ttl_minutes: int = 30,
+            ttl_seconds: Optional[int] = None):
+        """Guarda datos en el caché (`ttl_seconds` tiene prioridad sobre `ttl_minutes`)"""
+        key = self._get_cache_key(city, data_type)
+        ttl = ttl_seconds if ttl_seconds is not None else ttl_minutes * 60
+        
+        try:
+            if self.use_redis:
+                expires_at = datetime.now() + timedelta(seconds=ttl)
+                cached_data = {
+                    'data': data,
+                    'expires_at': expires_at.isoformat()
+                }
                 self.redis_client.setex(
                     key, 
-                    ttl_minutes * 60, 
+                    ttl + self.stale_ttl, 
                     json.dumps(cached_data, default=str)
                 )
             else:
-                self.memory_cache[key] = cached_data
+                self.memory_cache.set(key, data, ttl + self.stale_ttl, label=data_type)
         except Exception as e:
             print(f"Error guardando en caché: {e}")
     
     def clear_expired(self):
         """Limpia entradas expiradas del caché en memoria"""
         if not self.use_redis:
-            now = datetime.now()
-            expired_keys = []
-            for key, data in self.memory_cache.items():
-                if datetime.fromisoformat(data['expires_at']) <= now:
-                    expired_keys.append(key)
+            self.memory_cache.clear_expired()
+    
+    def start_sweeper(self):
+        """Inicia el barrido periódico de entradas expiradas en segundo plano"""
+        if self.use_redis or self.sweep_interval <= 0 or self._sweeper is not None:
+            return
+        
+        def sweep():
+            while not self._stop_sweeper.wait(self.sweep_interval):
+                removed = self.memory_cache.clear_expired()
+                if removed:
+                    print(f"🧹 {removed} entradas expiradas eliminadas del caché")
+        
+        self._stop_sweeper.clear()
+        self._sweeper = threading.Thread(target=sweep, name='cache-sweeper', daemon=True)
+        self._sweeper.start()
+    
+    def stop_sweeper(self):
+        """Detiene el barrido periódico"""
+        self._stop_sweeper.set()
+        self._sweeper = None
+    
+    def stats(self) -> Dict[str, int]:
+        """Contadores del caché en memoria (vacío si se usa Redis)"""
+        if self.use_redis:
+            return {}
+        stats = self.memory_cache.stats()
+        stats['aliases'] = len(self.aliases)
+        return stats
+
+
+class GeocodingCache:
+    """
+    Caché de geocodificación (nombre de ciudad -> CityInfo)
+    
+    Las coordenadas de una ciudad no cambian, así que se guardan con un
+    TTL largo. Las ciudades desconocidas también se cachean (caché
+    negativa) con un TTL más corto para no repetir búsquedas fallidas.
+    
+    Backends: memoria, Redis (el mismo que WeatherCache) o disco (JSON).
+    En memoria y en disco las entradas se guardan en un `LRUMemoryCache`
+    de `GEOCODE_CACHE_MAX_ENTRIES` entradas; en disco los cambios se
+    escriben por lotes cada `GEOCODE_CACHE_FLUSH_INTERVAL` segundos en un
+    hilo aparte (y al detener el bot con `flush`).
+    """
+    
+    def __init__(self, redis_client=None):
+        self.ttl_seconds = int(os.getenv('GEOCODE_CACHE_TTL_DAYS', '30')) * 86400
+        self.negative_ttl_seconds = int(os.getenv('GEOCODE_NEGATIVE_TTL_HOURS', '6')) * 3600
+        self.backend = os.getenv('GEOCODE_CACHE_BACKEND', 'redis' if redis_client else 'memory').lower()
+        self.path = os.getenv('GEOCODE_CACHE_PATH', 'geocode_cache.json')
+        self.flush_interval = float(os.getenv('GEOCODE_CACHE_FLUSH_INTERVAL', '30'))
+        self.redis_client = redis_client
+        # clave -> {'data': CityInfo como dict o None si la ciudad es desconocida}
+        self.entries = LRUMemoryCache(
+            max_entries=int(os.getenv('GEOCODE_CACHE_MAX_ENTRIES', '10000')),
+            on_evict=lambda key, label: metrics.inc('weather_cache_evictions_total', data_type='geocoding')
+        )
+        self._dirty = False
+        self._save_lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._stop_flusher = threading.Event()
+        
+        if self.backend == 'redis' and not self.redis_client:
+            print("❌ Redis no disponible para geocodificación, usando memoria")
+            self.backend = 'memory'
+        
+        if self.backend == 'disk':
+            self._load()
+    
+    async def call_async(self, function: Callable[..., Any], *args: Any) -> Any:
+        """Como `WeatherCache.call_async`: en un hilo solo con el backend Redis"""
+        if self.backend != 'redis':
+            return function(*args)
+        return await run_blocking(function, *args)
+    
+    def _get_cache_key(self, city: str) -> str:
+        return f"geocode:{normalize_city(city)}"
+    
+    def get(self, city: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Busca una ciudad en el caché.
+        
+        Returns:
+            (encontrada, datos): `encontrada` indica si hay entrada en el
+            caché; `datos` es None si la ciudad se sabe desconocida.
+        """
+        key = self._get_cache_key(city)
+        
+        try:
+            if self.backend == 'redis':
+                raw = self.redis_client.get(key)
+                if raw:
+                    metrics.inc('weather_cache_requests_total', data_type='geocoding', result='hit')
+                    return True, json.loads(raw)['data']
+            else:
+                entry = self.entries.get(key)
+                if entry is not None:
+                    metrics.inc('weather_cache_requests_total', data_type='geocoding', result='hit')
+                    return True, entry['data']
+        except Exception as e:
+            print(f"Error obteniendo geocodificación del caché: {e}")
+        
+        metrics.inc('weather_cache_requests_total', data_type='geocoding', result='miss')
+        return False, None
+    
+    def set(self, city: str, data: Optional[Dict[str, Any]]):
+        """Guarda el resultado de geocodificar una ciudad (None = desconocida)"""
+        key = self._get_cache_key(city)
+        ttl = self.ttl_seconds if data is not None else self.negative_ttl_seconds
+        
+        try:
+            if self.backend == 'redis':
+                entry = {
+                    'data': data,
+                    'expires_at': (datetime.now() + timedelta(seconds=ttl)).isoformat()
+                }
+                self.redis_client.setex(key, ttl, json.dumps(entry))
+            else:
+                self.entries.set(key, {'data': data}, ttl)
+                if self.backend == 'disk':
+                    self._dirty = True
+                    self._start_flusher()
+        except Exception as e:
+            print(f"Error guardando geocodificación en caché: {e}")
+    
+    def _load(self):
+        """Carga las entradas persistidas en disco que siguen vigentes"""
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    stored = json.load(f)
+                now = datetime.now()
+                # El fichero está en orden LRU: las más recientes quedan al final
+                for key, entry in stored.items():
+                    ttl = (datetime.fromisoformat(entry['expires_at']) - now).total_seconds()
+                    if ttl > 0:
+                        self.entries.set(key, {'data': entry['data']}, ttl)
+                print(f"🗺️ {len(self.entries)} ciudades cargadas del caché de geocodificación")
+        except Exception as e:
+            print(f"Error cargando caché de geocodificación: {e}")
+            self.entries.clear()
+    
+    def _save(self):
+        """Persiste las entradas en disco (escritura atómica)"""
+        now_epoch, now = time.time(), datetime.now()
+        stored = {
+            key: {
+                'data': entry['data'],
+                'expires_at': (now + timedelta(seconds=expires_at - now_epoch)).isoformat()
+            }
+            for key, entry, expires_at in self.entries.items()
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(stored, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+    
+    def flush(self):
+        """Escribe en disco los cambios pendientes (backend de disco)"""
+        if self.backend != 'disk':
+            return
+        
+        with self._save_lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            try:
+                self._save()
+            except Exception as e:
+                self._dirty = True
+                print(f"Error guardando caché de geocodificación: {e}")
+    
+    def _start_flusher(self):
+        """Inicia la escritura periódica en segundo plano (una sola vez)"""
+        if self._flusher is not None:
+            return
+        
+        with self._save_lock:
+            if self._flusher is not None:
+                return
             
-            for key in expired_keys:
-                del self.memory_cache[key]
+            def run():
+                while not self._stop_flusher.wait(self.flush_interval):
+                    self.flush()
+            
+            self._flusher = threading.Thread(target=run, name='geocode-flusher', daemon=True)
+            self._flusher.start()
+    
+    def close(self):
+        """Detiene la escritura periódica y guarda los cambios pendientes"""
+        self._stop_flusher.set()
+        self._flusher = None
+        self.flush()
 
 
 # Instancia global del caché
-weather_cache = WeatherCache()
\ No newline at end of file
+weather_cache = WeatherCache()
+geocoding_cache = GeocodingCache(weather_cache.redis_client if weather_cache.use_redis else None)
\ No newline at end of file
@@ -0,0 +1,283 @@
+"""
+Envío de mensajes a Telegram respetando sus límites de frecuencia
+
+Telegram admite unos 30 mensajes por segundo en total, uno por segundo
+en cada chat privado y unos 20 por minuto en cada grupo. Todas las
+peticiones del bot (respuestas, ediciones y envíos programados) pasan
+por una cola de salida con cubetas de tokens por chat y global; las
+respuestas interactivas tienen prioridad sobre los envíos masivos, y si
+Telegram responde con RetryAfter se pausa el chat y se reintenta.
+"""
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from collections import deque
+from typing import Any, Callable, Coroutine, Dict, Iterable, List, Optional, Tuple
+
+from telegram import Bot
+from telegram.constants import ParseMode
+from telegram.error import RetryAfter, TelegramError
+from telegram.ext import BaseRateLimiter
+
+from metrics import metrics
+
+
+# Prioridades de la cola de salida (menor valor = sale antes)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BROADCAST = 1
+
+
+class TokenBucket:
+    """
+    Cubeta de tokens con reservas.
+    
+    Los tokens pueden quedar en negativo: cada reserva toma un token
+    aunque aún no exista y devuelve cuánto hay que esperar hasta que
+    se repongan.
+    """
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+    
+    def _refill(self):
+        now = time.monotonic()
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+    
+    def wait_time(self) -> float:
+        """Segundos hasta que haya un token disponible"""
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+    
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+    
+    def reserve(self) -> float:
+        """Toma un token y devuelve cuánto esperar para usarlo"""
+        self.take()
+        return max(0.0, -self.tokens / self.rate)
+    
+    def pause(self, seconds: float):
+        """Retrasa el próximo token `seconds` (conservando las reservas pendientes)"""
+        self._refill()
+        self.tokens = min(self.tokens, 1) - seconds * self.rate
+    
+    @property
+    def idle(self) -> bool:
+        """Si está llena (no guarda información útil)"""
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """
+    Limitador de salida del bot con prioridades.
+    
+    Cada petición con `chat_id` espera primero su turno en la cubeta del
+    chat y después un token de la cubeta global, que se reparte en orden
+    de prioridad: las respuestas a usuarios adelantan a los envíos
+    programados. La prioridad se indica con `rate_limit_args` en los
+    métodos del bot (por defecto, interactiva).
+    """
+    
+    def __init__(self):
+        self.global_rate = float(os.getenv('TELEGRAM_GLOBAL_RATE', '25'))
+        self.global_burst = float(os.getenv('TELEGRAM_GLOBAL_BURST', '25'))
+        self.chat_interval = float(os.getenv('TELEGRAM_CHAT_INTERVAL', '1'))
+        self.group_interval = float(os.getenv('TELEGRAM_GROUP_INTERVAL', '3'))
+        self.chat_burst = float(os.getenv('TELEGRAM_CHAT_BURST', '3'))
+        self.max_retries = int(os.getenv('TELEGRAM_SEND_RETRIES', '3'))
+        
+        self._global = TokenBucket(self.global_rate, self.global_burst)
+        self._chats: Dict[int, TokenBucket] = {}
+        
+        # Cola de espera del token global: (prioridad, orden, futuro)
+        self._waiting: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        
+        # Métricas
+        self.queued: Dict[int, int] = {}
+        self.max_queue_depth = 0
+        self.sent = 0
+        self.retries = 0
+        self.failed = 0
+        self._wait_times = deque(maxlen=1000)
+        self._latencies = deque(maxlen=1000)
+    
+    async def initialize(self):
+        pass
+    
+    async def shutdown(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        for _, _, future in self._waiting:
+            future.cancel()
+        self._waiting.clear()
+    
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Los grupos y canales tienen id negativo y un límite más estricto
+            interval = self.group_interval if chat_id < 0 else self.chat_interval
+            bucket = self._chats[chat_id] = TokenBucket(1 / interval, self.chat_burst)
+            
+            # Olvidar los chats cuya cubeta ya se llenó
+            if len(self._chats) > 10000:
+                self._chats = {chat: b for chat, b in self._chats.items() if not b.idle or chat == chat_id}
+        return bucket
+    
+    async def _acquire_global(self, priority: int):
+        """Espera un token global, respetando la prioridad"""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._sequence), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+        await future
+    
+    async def _dispatch(self):
+        """Reparte los tokens globales a la petición de mayor prioridad"""
+        while self._waiting:
+            delay = self._global.wait_time()
+            if delay > 0:
+                # Tras la espera se vuelve a mirar la cabeza de la cola, por
+                # si llegó entretanto una petición más prioritaria
+                await asyncio.sleep(delay)
+                continue
+            
+            _, _, future = heapq.heappop(self._waiting)
+            if not future.done():
+                self._global.take()
+                future.set_result(None)
+    
+    def _track(self, priority: int, delta: int):
+        self.queued[priority] = self.queued.get(priority, 0) + delta
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+    
+    @property
+    def queue_depth(self) -> int:
+        return sum(self.queued.values())
+    
+    async def _wait_turn(self, chat_id: Optional[int], priority: int):
+        """Espera el turno del chat y después el global"""
+        if chat_id is None:
+            return
+        
+        # Primero el chat y después el global, para que un chat con espera
+        # larga no retenga tokens globales que otros chats podrían usar
+        delay = self._chat_bucket(chat_id).reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self._acquire_global(priority)
+    
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ):
+        priority = rate_limit_args if rate_limit_args is not None else PRIORITY_INTERACTIVE
+        
+        chat_id = data.get('chat_id')
+        try:
+            chat_id = int(chat_id) if chat_id is not None else None
+        except (TypeError, ValueError):
+            # @canal: se trata como un grupo
+            chat_id = -abs(hash(chat_id))
+        
+        start = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            self._track(priority, 1)
+            queued_at = time.monotonic()
+            try:
+                await self._wait_turn(chat_id, priority)
+            finally:
+                self._track(priority, -1)
+            waited = time.monotonic() - queued_at
+            self._wait_times.append(waited)
+            metrics.observe('telegram_queue_wait_seconds', waited, priority=priority)
+            
+            sent_at = time.monotonic()
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self.retries += 1
+                if attempt == self.max_retries or chat_id is None:
+                    self.failed += 1
+                    raise
+                print(f"⏳ Telegram pide esperar {e.retry_after}s antes de escribir a {chat_id}")
+                self._chat_bucket(chat_id).pause(e.retry_after)
+                continue
+            except Exception:
+                self.failed += 1
+                raise
+            finally:
+                metrics.observe('telegram_send_seconds', time.monotonic() - sent_at, endpoint=endpoint)
+            
+            self.sent += 1
+            self._latencies.append(time.monotonic() - start)
+            return result
+    
+    @staticmethod
+    def _percentile(values: Iterable[float], fraction: float) -> float:
+        ordered = sorted(values)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+    
+    def stats(self) -> Dict[str, Any]:
+        """Métricas de la cola de salida (tiempos en milisegundos)"""
+        return {
+            'queue_depth': self.queue_depth,
+            'queue_depth_by_priority': {p: n for p, n in self.queued.items() if n},
+            'max_queue_depth': self.max_queue_depth,
+            'sent': self.sent,
+            'retries': self.retries,
+            'failed': self.failed,
+            'wait_p50_ms': round(self._percentile(self._wait_times, 0.5) * 1000, 1),
+            'wait_p95_ms': round(self._percentile(self._wait_times, 0.95) * 1000, 1),
+            'latency_p50_ms': round(self._percentile(self._latencies, 0.5) * 1000, 1),
+            'latency_p95_ms': round(self._percentile(self._latencies, 0.95) * 1000, 1),
+        }
+
+
+class RateLimitedSender:
+    """Envía mensajes masivos con prioridad baja en la cola de salida"""
+    
+    def __init__(self, bot: Bot):
+        self.bot = bot
+    
+    async def send(self, chat_id: int, text: str, **kwargs) -> bool:
+        """Envía un mensaje en Markdown; devuelve si se entregó"""
+        try:
+            await self.bot.send_message(
+                chat_id=chat_id,
+                text=text,
+                parse_mode=ParseMode.MARKDOWN,
+                rate_limit_args=PRIORITY_BROADCAST,
+                **kwargs
+            )
+            return True
+        except TelegramError as e:
+            print(f"❌ Error enviando mensaje a {chat_id}: {e}")
+            return False
+    
+    async def send_many(self, messages: Iterable[Tuple[int, str]]) -> int:
+        """Envía varios mensajes; la cola de salida los espacia. Devuelve cuántos se entregaron"""
+        results = await asyncio.gather(*(self.send(chat_id, text) for chat_id, text in messages))
+        return sum(results)
+
+
+# Instancia global del limitador de salida
+outbound_limiter = PriorityRateLimiter()
@@ -2,440 +2,948 @@
 Fetcher para obtener datos de múltiples APIs meteorológicas
 """
 import os
+import time
+import asyncio
 import requests
+import httpx
 import pytz
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
-from models import WeatherData, HourlyWeather, DailyWeather, CityInfo
-from cache import weather_cache
+from typing import Optional, List, Dict, Any, Tuple, Callable, NamedTuple, Awaitable
+from itertools import islice
+from functools import partial
+from models import WeatherData, HourlySeries, DailySeries, CityInfo
+from cache import weather_cache, geocoding_cache, normalize_city, grid_cell, run_blocking
+from http_session import http_sessions
+from singleflight import SingleFlight, AsyncSingleFlight, BackgroundRefresh, AsyncBackgroundRefresh
+from resilience import provider_health, is_provider_failure
+from quota import quota_manager
+from json_stream import iter_array_items, collect_array_items, IJSON_AVAILABLE
+from gazetteer import gazetteer
+from metrics import metrics
 
 
-class WeatherFetcher:
+# (url, params, headers) de una petición a un proveedor
+RequestSpec = Tuple[str, Dict[str, Any], Dict[str, str]]
+
+# Llamadas a OpenWeatherMap de una geocodificación: ciudad y zona horaria
+GEOCODING_CALLS = 2
+
+
+class StreamSpec(NamedTuple):
+    """Array grande de una respuesta que se decodifica de forma incremental"""
+    path: str  # p. ej. 'properties.timeseries'
+    limit: int  # elementos que usa el parser
+    # Escalares que preceden al array y que el parser también necesita
+    fields: Tuple[str, ...] = ()
+
+
+class ProviderSpec(NamedTuple):
+    """Descripción de un proveedor meteorológico"""
+    label: str
+    enabled: bool
+    needs_city_info: bool
+    build_request: Callable[[str, Optional[CityInfo]], RequestSpec]
+    parse: Callable[[Any, Optional[CityInfo]], WeatherData]
+    # Decodificación incremental opcional (JSON_STREAMING)
+    stream: Optional[StreamSpec] = None
+
+
+class BaseWeatherFetcher:
+    """
+    Lógica común a los fetchers síncrono y asíncrono: claves de API,
+    construcción de peticiones y parseo de respuestas de cada proveedor.
+    """
+    
     def __init__(self):
         self.owm_key = os.getenv('OWM_KEY')
         self.weatherapi_key = os.getenv('WEATHERAPI_KEY')
         self.tomorrow_key = os.getenv('TOMORROW_KEY')
         self.visualcrossing_key = os.getenv('VISUALCROSSING_KEY')
+        self.timeout = 10
+        
+        # Proveedores indexados por su tipo de dato en el caché
+        self.providers: Dict[str, ProviderSpec] = {
+            'openweathermap': ProviderSpec(
+                'OpenWeatherMap', bool(self.owm_key), True,
+                self._openweathermap_request, self._parse_openweathermap
+            ),
+            'metno': ProviderSpec(
+                'MET Norway', True, True,
+                self._metno_request, self._parse_metno,
+                StreamSpec('properties.timeseries', 168)
+            ),
+            'weatherapi': ProviderSpec(
+                'WeatherAPI', bool(self.weatherapi_key), False,
+                self._weatherapi_request, self._parse_weatherapi
+            ),
+            'tomorrow': ProviderSpec(
+                'Tomorrow.io', bool(self.tomorrow_key), True,
+                self._tomorrow_request, self._parse_tomorrow
+            ),
+            'visualcrossing': ProviderSpec(
+                'Visual Crossing', bool(self.visualcrossing_key), False,
+                self._visualcrossing_request, self._parse_visualcrossing,
+                StreamSpec('days', 7, ('resolvedAddress', 'timezone'))
+            ),
+        }
+        
+        # Decodificación incremental de las respuestas grandes (requiere ijson)
+        self.stream_json = os.getenv('JSON_STREAMING', 'false').lower() == 'true'
+        if self.stream_json and not IJSON_AVAILABLE:
+            print("❌ ijson no disponible, se decodifica el JSON completo")
+            self.stream_json = False
+    
+    # --- Geocodificación ---
+    
+    def _geocoding_request(self, city: str) -> RequestSpec:
+        url = "http://api.openweathermap.org/geo/1.0/direct"
+        params = {
+            'q': city,
+            'limit': 1,
+            'appid': self.owm_key
+        }
+        return url, params, {}
+    
+    def _timezone_request(self, location: Dict[str, Any]) -> RequestSpec:
+        # Obtener timezone usando coordenadas
+        url = "http://api.openweathermap.org/data/2.5/weather"
+        params = {
+            'lat': location['lat'],
+            'lon': location['lon'],
+            'appid': self.owm_key
+        }
+        return url, params, {}
+    
+    def _parse_city_info(self, location: Dict[str, Any], tz_data: Dict[str, Any]) -> CityInfo:
+        # Calcular timezone offset
+        timezone_offset = tz_data.get('timezone', 0)
+        timezone_name = f"UTC{timezone_offset//3600:+d}"
+        
+        return CityInfo(
+            name=location['name'],
+            country=location['country'],
+            latitude=location['lat'],
+            longitude=location['lon'],
+            timezone=timezone_name
+        )
+    
+    def _register_alias(self, city: str, city_info: CityInfo):
+        """Asocia el nombre consultado a la celda del caché de sus coordenadas"""
+        if weather_cache.get_alias(city) is None:
+            weather_cache.set_alias(
+                city, city_info.latitude, city_info.longitude,
+                city_info.name, city_info.country
+            )
+    
+    # --- Cuotas ---
+    
+    def _quota_skipped(self, provider: str):
+        quota_manager.record_skip(provider)
+        print(f"🚦 Cuota agotada para {self.providers[provider].label}, se omite la consulta")
+    
+    def _note_rate_limited(self, provider: str, error: Exception):
+        """Ante un 429 deja de consultar al proveedor lo que indique Retry-After"""
+        response = getattr(error, 'response', None)
+        if getattr(response, 'status_code', None) != 429:
+            return
+        try:
+            seconds = float(response.headers.get('Retry-After', 60))
+        except (TypeError, ValueError):
+            seconds = 60
+        quota_manager.block(provider, seconds)
+    
+    def _flight_key(self, provider: str, city: str, city_info: Optional[CityInfo]) -> Tuple[str, str]:
+        """
+        Clave de coalescencia de una consulta: la celda del caché de las
+        coordenadas ya resueltas, para que "Montevideo" y "montevideo, uy"
+        compartan la petición, o el nombre normalizado si no hay CityInfo.
+        """
+        if city_info is not None and weather_cache.grid_degrees > 0:
+            return provider, grid_cell(city_info.latitude, city_info.longitude, weather_cache.grid_degrees)
+        return provider, normalize_city(city)
+    
+    def _record_error(self, provider: str, error: Exception):
+        """
+        Registra una consulta fallida. Solo los timeouts, errores de red,
+        429 y 5xx cuentan para el circuit breaker del proveedor; un 4xx o
+        una respuesta que no se pudo parsear se registran sin abrirlo.
+        """
+        failure = is_provider_failure(error)
+        if failure:
+            provider_health.record_failure(provider)
+        else:
+            provider_health.record_response(provider)
+        metrics.inc('weather_provider_errors_total', provider=provider,
+                    kind='provider' if failure else 'request')
+        self._note_rate_limited(provider, error)
+        print(f"Error con {self.providers[provider].label}: {error}")
+    
+    def _city_info_offline(self, city: str) -> Optional[CityInfo]:
+        """Ciudad del diccionario geográfico local, sin llamadas a la API (si está cargado)"""
+        start = time.perf_counter()
+        city_info = gazetteer.find(city)
+        if city_info:
+            metrics.observe('weather_geocoding_seconds', time.perf_counter() - start,
+                            direction='forward', service='gazetteer')
+            self._register_alias(city, city_info)
+        return city_info
+    
+    def _city_info_from_cache(self, city: str, cached: Optional[Dict[str, Any]]) -> Optional[CityInfo]:
+        if not cached:
+            return None
+        city_info = CityInfo(**cached)
+        self._register_alias(city, city_info)
+        return city_info
+    
+    # --- Decodificación incremental ---
+    
+    @staticmethod
+    def _stream_document(stream: StreamSpec, items: Any, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Dict con la misma forma que el JSON para el parser del proveedor:
+        `fields` con el array (lista o iterador perezoso) en su ruta
+        """
+        node = fields
+        *parents, leaf = stream.path.split('.')
+        for key in parents:
+            node = node.setdefault(key, {})
+        node[leaf] = items
+        return fields
+    
+    # --- OpenWeatherMap ---
+    
+    def _openweathermap_request(self, city: str, city_info: CityInfo) -> RequestSpec:
+        # OneCall API para datos completos
+        url = "https://api.openweathermap.org/data/3.0/onecall"
+        params = {
+            'lat': city_info.latitude,
+            'lon': city_info.longitude,
+            'appid': self.owm_key,
+            'units': 'metric',
+            'exclude': 'minutely,alerts'
+        }
+        return url, params, {}
+    
+    def _parse_openweathermap(self, data: Dict[str, Any], city_info: CityInfo) -> WeatherData:
+        # Procesar datos horarios
+        hourly_data = HourlySeries()
+        for hour in data.get('hourly', [])[:24]:  # Solo 24 horas
+            hourly_data.add(
+                datetime=datetime.fromtimestamp(hour['dt']),
+                temperature=hour['temp'],
+                precipitation=hour.get('rain', {}).get('1h', 0) + hour.get('snow', {}).get('1h', 0),
+                wind_speed=hour['wind_speed'],
+                source='OpenWeatherMap'
+            )
+        
+        # Procesar datos diarios
+        daily_data = DailySeries()
+        for day in data.get('daily', [])[:7]:  # 7 días
+            daily_data.add(
+                date=datetime.fromtimestamp(day['dt']),
+                temp_min=day['temp']['min'],
+                temp_max=day['temp']['max'],
+                precipitation=day.get('rain', 0) + day.get('snow', 0),
+                wind_speed=day['wind_speed'],
+                source='OpenWeatherMap'
+            )
+        
+        return WeatherData(
+            city=city_info.name,
+            country=city_info.country,
+            timezone=city_info.timezone,
+            hourly=hourly_data,
+            daily=daily_data
+        )
+    
+    # --- MET Norway ---
+    
+    def _metno_request(self, city: str, city_info: CityInfo) -> RequestSpec:
+        url = "https://api.met.no/weatherapi/locationforecast/2.0/compact"
+        params = {
+            'lat': city_info.latitude,
+            'lon': city_info.longitude
+        }
+        headers = {
+            'User-Agent': 'UniversalWeatherBot/1.0'
+        }
+        return url, params, headers
+    
+    def _parse_metno(self, data: Dict[str, Any], city_info: CityInfo) -> WeatherData:
+        """
+        Construye los datos horarios y diarios en una sola pasada por
+        `timeseries`, y deja de leer en cuanto cubre el horizonte: 24
+        horas y 7 días (como mucho 168 filas).
+        """
+        hourly_data = HourlySeries()
+        daily_data = DailySeries()
+        
+        # Agrupar por días para datos diarios
+        daily_temps = {}
+        daily_precip = {}
+        daily_wind = {}
+        
+        for index, item in enumerate(islice(data['properties']['timeseries'], 168)):  # 7 días
+            dt = datetime.fromisoformat(item['time'].replace('Z', '+00:00'))
+            date_key = dt.date()
+            
+            if date_key not in daily_temps:
+                # Un octavo día ya no se usa: si además están las 24 horas, terminar
+                if len(daily_temps) >= 7 and index >= 24:
+                    break
+                daily_temps[date_key] = []
+                daily_precip[date_key] = []
+                daily_wind[date_key] = []
+            
+            details = item['data']['instant']['details']
+            next_hour = item['data'].get('next_1_hours')
+            
+            precipitation = 0
+            if next_hour is not None:
+                precipitation = next_hour['details'].get('precipitation_amount', 0)
+                daily_precip[date_key].append(precipitation)
+            
+            daily_temps[date_key].append(details['air_temperature'])
+            daily_wind[date_key].append(details['wind_speed'])
+            
+            # Datos horarios de las primeras 24 filas
+            if index < 24:
+                hourly_data.add(
+                    datetime=dt,
+                    temperature=details['air_temperature'],
+                    precipitation=precipitation,
+                    wind_speed=details['wind_speed'],
+                    source='MET Norway'
+                )
+        
+        for date_key in list(daily_temps.keys())[:7]:
+            daily_data.add(
+                date=datetime.combine(date_key, datetime.min.time()),
+                temp_min=min(daily_temps[date_key]),
+                temp_max=max(daily_temps[date_key]),
+                precipitation=sum(daily_precip.get(date_key, [])),
+                wind_speed=sum(daily_wind[date_key]) / len(daily_wind[date_key]),
+                source='MET Norway'
+            )
+        
+        return WeatherData(
+            city=city_info.name,
+            country=city_info.country,
+            timezone=city_info.timezone,
+            hourly=hourly_data,
+            daily=daily_data
+        )
+    
+    # --- WeatherAPI ---
+    
+    def _weatherapi_request(self, city: str, city_info: Optional[CityInfo] = None) -> RequestSpec:
+        url = "http://api.weatherapi.com/v1/forecast.json"
+        params = {
+            'key': self.weatherapi_key,
+            'q': city,
+            'days': 7,
+            'aqi': 'no',
+            'alerts': 'no'
+        }
+        return url, params, {}
+    
+    def _parse_weatherapi(self, data: Dict[str, Any], city_info: Optional[CityInfo] = None) -> WeatherData:
+        location = data['location']
+        
+        # Datos horarios para hoy
+        hourly_data = HourlySeries()
+        today_forecast = data['forecast']['forecastday'][0]
+        for hour in today_forecast['hour']:
+            dt = datetime.strptime(hour['time'], '%Y-%m-%d %H:%M')
+            hourly_data.add(
+                datetime=dt,
+                temperature=hour['temp_c'],
+                precipitation=hour['precip_mm'],
+                wind_speed=hour['wind_kph'] / 3.6,  # Convertir km/h a m/s
+                source='WeatherAPI'
+            )
+        
+        # Datos diarios
+        daily_data = DailySeries()
+        for day in data['forecast']['forecastday']:
+            dt = datetime.strptime(day['date'], '%Y-%m-%d')
+            day_data = day['day']
+            daily_data.add(
+                date=dt,
+                temp_min=day_data['mintemp_c'],
+                temp_max=day_data['maxtemp_c'],
+                precipitation=day_data['totalprecip_mm'],
+                wind_speed=day_data['maxwind_kph'] / 3.6,  # Convertir km/h a m/s
+                source='WeatherAPI'
+            )
+        
+        return WeatherData(
+            city=location['name'],
+            country=location['country'],
+            timezone=location['tz_id'],
+            hourly=hourly_data,
+            daily=daily_data
+        )
+    
+    # --- Tomorrow.io ---
+    
+    def _tomorrow_request(self, city: str, city_info: CityInfo) -> RequestSpec:
+        url = "https://api.tomorrow.io/v4/timelines"
+        params = {
+            'location': f"{city_info.latitude},{city_info.longitude}",
+            'fields': 'temperature,precipitationIntensity,windSpeed',
+            'timesteps': '1h,1d',
+            'units': 'metric',
+            'apikey': self.tomorrow_key
+        }
+        return url, params, {}
+    
+    def _parse_tomorrow(self, data: Dict[str, Any], city_info: CityInfo) -> WeatherData:
+        hourly_data = HourlySeries()
+        daily_data = DailySeries()
+        
+        for timeline in data['data']['timelines']:
+            if timeline['timestep'] == '1h':
+                # Datos horarios
+                for interval in timeline['intervals'][:24]:
+                    dt = datetime.fromisoformat(interval['startTime'].replace('Z', '+00:00'))
+                    values = interval['values']
+                    hourly_data.add(
+                        datetime=dt,
+                        temperature=values['temperature'],
+                        precipitation=values['precipitationIntensity'],
+                        wind_speed=values['windSpeed'],
+                        source='Tomorrow.io'
+                    )
+            elif timeline['timestep'] == '1d':
+                # Datos diarios
+                for interval in timeline['intervals'][:7]:
+                    dt = datetime.fromisoformat(interval['startTime'].replace('Z', '+00:00'))
+                    values = interval['values']
+                    daily_data.add(
+                        date=dt,
+                        temp_min=values['temperature'] - 5,  # Aproximación
+                        temp_max=values['temperature'] + 5,  # Aproximación
+                        precipitation=values['precipitationIntensity'] * 24,
+                        wind_speed=values['windSpeed'],
+                        source='Tomorrow.io'
+                    )
+        
+        return WeatherData(
+            city=city_info.name,
+            country=city_info.country,
+            timezone=city_info.timezone,
+            hourly=hourly_data,
+            daily=daily_data
+        )
+    
+    # --- Visual Crossing ---
+    
+    def _visualcrossing_request(self, city: str, city_info: Optional[CityInfo] = None) -> RequestSpec:
+        url = f"https://weather.visualcrossing.com/VisualCrossingWebServices/rest/services/timeline/{city}"
+        params = {
+            'key': self.visualcrossing_key,
+            'unitGroup': 'metric',
+            'include': 'hours,days',
+            'elements': 'temp,tempmin,tempmax,precip,windspeed'
+        }
+        return url, params, {}
+    
+    def _parse_visualcrossing(self, data: Dict[str, Any], city_info: Optional[CityInfo] = None) -> WeatherData:
+        """Datos horarios de hoy y diarios de 7 días en una sola pasada por `days`"""
+        hourly_data = HourlySeries()
+        daily_data = DailySeries()
+        
+        for index, day in enumerate(islice(data['days'], 7)):
+            # Datos horarios para hoy
+            if index == 0:
+                for hour in day.get('hours', []):
+                    dt = datetime.fromisoformat(f"{day['datetime']}T{hour['datetime']}")
+                    hourly_data.add(
+                        datetime=dt,
+                        temperature=hour['temp'],
+                        precipitation=hour.get('precip', 0),
+                        wind_speed=hour['windspeed'] / 3.6,  # Convertir km/h a m/s
+                        source='Visual Crossing'
+                    )
+            
+            # Datos diarios
+            daily_data.add(
+                date=datetime.fromisoformat(day['datetime']),
+                temp_min=day['tempmin'],
+                temp_max=day['tempmax'],
+                precipitation=day.get('precip', 0),
+                wind_speed=day['windspeed'] / 3.6,  # Convertir km/h a m/s
+                source='Visual Crossing'
+            )
+        
+        return WeatherData(
+            city=data['resolvedAddress'].split(',')[0],
+            country=data['resolvedAddress'].split(',')[-1].strip(),
+            timezone=data['timezone'],
+            hourly=hourly_data,
+            daily=daily_data
+        )
+
+
+class WeatherFetcher(BaseWeatherFetcher):
+    """Fetcher síncrono basado en requests"""
+    
+    def __init__(self):
+        super().__init__()
+        self._single_flight = SingleFlight()
+        self._refresh = BackgroundRefresh(int(os.getenv('CACHE_REFRESH_WORKERS', '4')))
+    
+    @property
+    def session(self) -> requests.Session:
+        """Sesión HTTP compartida con pool de conexiones y reintentos"""
+        return http_sessions.get_session()
+    
+    def _take_quota(self, provider: str, cost: int = 1) -> bool:
+        """Reserva cuota del proveedor, esperando un poco si la ventana está por reiniciarse"""
+        allowed, wait = quota_manager.acquire(provider, cost)
+        if not allowed and wait <= quota_manager.max_wait:
+            time.sleep(wait)
+            allowed, _ = quota_manager.acquire(provider, cost)
+        if not allowed:
+            self._quota_skipped(provider)
+        return allowed
+    
+    def _take_retry_quota(self, provider: str) -> bool:
+        """Reserva cuota para reintentar una respuesta 429/5xx: cada reintento es otra llamada"""
+        allowed, _ = quota_manager.acquire(provider)
+        if not allowed:
+            self._quota_skipped(provider)
+        return allowed
+    
+    def _get_json(self, url: str, params: Dict[str, Any], headers: Dict[str, str],
+                  timeout: Optional[float] = None) -> Any:
+        """Realiza una petición GET y devuelve el JSON de la respuesta"""
+        response = self.session.get(url, params=params, headers=headers, timeout=timeout or self.timeout)
+        response.raise_for_status()
+        return response.json()
+    
+    def _get_weather(self, spec: ProviderSpec, request: RequestSpec, timeout: float,
+                     city_info: Optional[CityInfo]) -> WeatherData:
+        """
+        Descarga y parsea la respuesta del proveedor. Con JSON_STREAMING
+        se decodifica a medida que llega el cuerpo y la conexión se cierra
+        en cuanto el parser cubre el horizonte.
+        """
+        if not (self.stream_json and spec.stream):
+            return spec.parse(self._get_json(*request, timeout=timeout), city_info)
+        
+        url, params, headers = request
+        with self.session.get(url, params=params, headers=headers, timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            # Los campos se rellenan mientras el parser recorre el array
+            fields: Dict[str, Any] = {field: None for field in spec.stream.fields}
+            items = iter_array_items(response.raw, spec.stream.path, fields)
+            return spec.parse(self._stream_document(spec.stream, items, fields), city_info)
+    
+    def get_cached_city_info(self, city: str) -> Tuple[bool, Optional[CityInfo]]:
+        """
+        Información de la ciudad sin llamadas a la API: diccionario local o
+        caché de geocodificación (que incluye ciudades desconocidas).
+        
+        Returns:
+            (encontrada, CityInfo o None si se sabe que no existe)
+        """
+        city_info = self._city_info_offline(city)
+        if city_info:
+            return True, city_info
+        
+        found, cached = geocoding_cache.get(city)
+        if found:
+            return True, self._city_info_from_cache(city, cached)
+        return False, None
     
     def get_city_info(self, city: str) -> Optional[CityInfo]:
         """Obtiene información de la ciudad usando OpenWeatherMap Geocoding"""
-        if not self.owm_key:
+        found, city_info = self.get_cached_city_info(city)
+        if found or not self.owm_key:
+            return city_info
+        
+        # Geocodificación y zona horaria: dos llamadas con la clave de OpenWeatherMap
+        if not self._take_quota('openweathermap', GEOCODING_CALLS):
             return None
         
+        start = time.perf_counter()
         try:
-            url = f"http://api.openweathermap.org/geo/1.0/direct"
-            params = {
-                'q': city,
-                'limit': 1,
-                'appid': self.owm_key
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            with http_sessions.guard_retries(partial(self._take_retry_quota, 'openweathermap')):
+                data = self._get_json(*self._geocoding_request(city))
             
             if not data:
+                geocoding_cache.set(city, None)
                 return None
             
             location = data[0]
             
-            # Obtener timezone usando coordenadas
-            tz_url = f"http://api.openweathermap.org/data/2.5/weather"
-            tz_params = {
-                'lat': location['lat'],
-                'lon': location['lon'],
-                'appid': self.owm_key
-            }
-            
-            tz_response = requests.get(tz_url, params=tz_params, timeout=10)
+            url, params, headers = self._timezone_request(location)
+            with http_sessions.guard_retries(partial(self._take_retry_quota, 'openweathermap')):
+                tz_response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
             tz_data = tz_response.json()
             
-            # Calcular timezone offset
-            timezone_offset = tz_data.get('timezone', 0)
-            timezone_name = f"UTC{timezone_offset//3600:+d}"
-            
-            return CityInfo(
-                name=location['name'],
-                country=location['country'],
-                latitude=location['lat'],
-                longitude=location['lon'],
-                timezone=timezone_name
-            )
+            city_info = self._parse_city_info(location, tz_data)
+            geocoding_cache.set(city, city_info.dict())
+            self._register_alias(city, city_info)
+            return city_info
         except Exception as e:
             print(f"Error obteniendo info de ciudad: {e}")
             return None
+        finally:
+            metrics.observe('weather_geocoding_seconds', time.perf_counter() - start,
+                            direction='forward', service='openweathermap')
     
-    def fetch_openweathermap(self, city: str) -> Optional[WeatherData]:
-        """Obtiene datos de OpenWeatherMap"""
-        if not self.owm_key:
+    def _fetch(self, provider: str, city: str, city_info: Optional[CityInfo] = None) -> Optional[WeatherData]:
+        """
+        Obtiene los datos de un proveedor (caché o API).
+        
+        Las llamadas concurrentes para la misma ubicación (celda del
+        caché) y proveedor se coalescen en una sola petición al proveedor.
+        """
+        if not self.providers[provider].enabled:
             return None
         
-        # Verificar caché
-        cached = weather_cache.get(city, 'openweathermap')
+        return self._single_flight.do(
+            self._flight_key(provider, city, city_info),
+            self._fetch_uncoalesced, provider, city, city_info
+        )
+    
+    def _fetch_uncoalesced(self, provider: str, city: str, city_info: Optional[CityInfo]) -> Optional[WeatherData]:
+        # Verificar caché; una entrada vieja se sirve y se refresca en segundo plano
+        cached, stale = weather_cache.get_weather_entry(city, provider)
         if cached:
-            return WeatherData(**cached)
+            if stale:
+                self._refresh.submit(
+                    self._flight_key(provider, city, city_info),
+                    self._fetch_upstream, provider, city, city_info
+                )
+            return cached
+        
+        return self._fetch_upstream(provider, city, city_info)
+    
+    def _fetch_upstream(self, provider: str, city: str, city_info: Optional[CityInfo]) -> Optional[WeatherData]:
+        """Consulta la API del proveedor y guarda el resultado en caché"""
+        spec = self.providers[provider]
+        
+        # Proveedor caído: se descarta sin esperar al timeout
+        if not provider_health.breaker(provider, spec.label).allow():
+            return None
         
         try:
-            city_info = self.get_city_info(city)
-            if not city_info:
+            if spec.needs_city_info:
+                city_info = city_info or self.get_city_info(city)
+                if not city_info:
+                    provider_health.release(provider)
+                    return None
+            
+            if not self._take_quota(provider):
+                provider_health.release(provider)
                 return None
             
-            # OneCall API para datos completos
-            url = "https://api.openweathermap.org/data/3.0/onecall"
-            params = {
-                'lat': city_info.latitude,
-                'lon': city_info.longitude,
-                'appid': self.owm_key,
-                'units': 'metric',
-                'exclude': 'minutely,alerts'
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            # Procesar datos horarios
-            hourly_data = []
-            for hour in data.get('hourly', [])[:24]:  # Solo 24 horas
-                hourly_data.append(HourlyWeather(
-                    datetime=datetime.fromtimestamp(hour['dt']),
-                    temperature=hour['temp'],
-                    precipitation=hour.get('rain', {}).get('1h', 0) + hour.get('snow', {}).get('1h', 0),
-                    wind_speed=hour['wind_speed'],
-                    source='OpenWeatherMap'
-                ))
-            
-            # Procesar datos diarios
-            daily_data = []
-            for day in data.get('daily', [])[:7]:  # 7 días
-                daily_data.append(DailyWeather(
-                    date=datetime.fromtimestamp(day['dt']),
-                    temp_min=day['temp']['min'],
-                    temp_max=day['temp']['max'],
-                    precipitation=day.get('rain', 0) + day.get('snow', 0),
-                    wind_speed=day['wind_speed'],
-                    source='OpenWeatherMap'
-                ))
-            
-            weather_data = WeatherData(
-                city=city_info.name,
-                country=city_info.country,
-                timezone=city_info.timezone,
-                hourly=hourly_data,
-                daily=daily_data
-            )
+            start = time.monotonic()
+            with http_sessions.guard_retries(partial(self._take_retry_quota, provider)):
+                weather_data = self._get_weather(
+                    spec, spec.build_request(city, city_info),
+                    provider_health.timeout(provider, self.timeout), city_info
+                )
+            elapsed = time.monotonic() - start
+            provider_health.record_success(provider, elapsed)
+            metrics.observe('weather_provider_fetch_seconds', elapsed, provider=provider)
             
             # Guardar en caché
-            weather_cache.set(city, 'openweathermap', weather_data.dict())
+            weather_cache.set_weather(city, provider, weather_data)
             return weather_data
             
         except Exception as e:
-            print(f"Error con OpenWeatherMap: {e}")
+            self._record_error(provider, e)
             return None
     
-    def fetch_metno(self, city: str) -> Optional[WeatherData]:
-        """Obtiene datos de MET Norway"""
-        try:
-            city_info = self.get_city_info(city)
-            if not city_info:
-                return None
-            
-            # Verificar caché
-            cached = weather_cache.get(city, 'metno')
-            if cached:
-                return WeatherData(**cached)
-            
-            url = "https://api.met.no/weatherapi/locationforecast/2.0/compact"
-            params = {
-                'lat': city_info.latitude,
-                'lon': city_info.longitude
-            }
-            headers = {
-                'User-Agent': 'UniversalWeatherBot/1.0'
-            }
-            
-            response = requests.get(url, params=params, headers=headers, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            hourly_data = []
-            daily_data = []
-            
-            # Procesar datos horarios
-            for item in data['properties']['timeseries'][:24]:
-                dt = datetime.fromisoformat(item['time'].replace('Z', '+00:00'))
-                details = item['data']['instant']['details']
-                
-                precipitation = 0
-                if 'next_1_hours' in item['data']:
-                    precipitation = item['data']['next_1_hours']['details'].get('precipitation_amount', 0)
-                
-                hourly_data.append(HourlyWeather(
-                    datetime=dt,
-                    temperature=details['air_temperature'],
-                    precipitation=precipitation,
-                    wind_speed=details['wind_speed'],
-                    source='MET Norway'
-                ))
-            
-            # Agrupar por días para datos diarios
-            daily_temps = {}
-            daily_precip = {}
-            daily_wind = {}
-            
-            for item in data['properties']['timeseries'][:168]:  # 7 días
-                dt = datetime.fromisoformat(item['time'].replace('Z', '+00:00'))
-                date_key = dt.date()
-                details = item['data']['instant']['details']
-                
-                if date_key not in daily_temps:
-                    daily_temps[date_key] = []
-                    daily_precip[date_key] = []
-                    daily_wind[date_key] = []
-                
-                daily_temps[date_key].append(details['air_temperature'])
-                daily_wind[date_key].append(details['wind_speed'])
-                
-                if 'next_1_hours' in item['data']:
-                    daily_precip[date_key].append(
-                        item['data']['next_1_hours']['details'].get('precipitation_amount', 0)
-                    )
-            
-            for date_key in list(daily_temps.keys())[:7]:
-                daily_data.append(DailyWeather(
-                    date=datetime.combine(date_key, datetime.min.time()),
-                    temp_min=min(daily_temps[date_key]),
-                    temp_max=max(daily_temps[date_key]),
-                    precipitation=sum(daily_precip.get(date_key, [])),
-                    wind_speed=sum(daily_wind[date_key]) / len(daily_wind[date_key]),
-                    source='MET Norway'
-                ))
-            
-            weather_data = WeatherData(
-                city=city_info.name,
-                country=city_info.country,
-                timezone=city_info.timezone,
-                hourly=hourly_data,
-                daily=daily_data
-            )
-            
-            # Guardar en caché
-            weather_cache.set(city, 'metno', weather_data.dict())
-            return weather_data
-            
-        except Exception as e:
-            print(f"Error con MET Norway: {e}")
+    def refresh(self, provider: str, city: str, city_info: Optional[CityInfo] = None) -> Optional[WeatherData]:
+        """Consulta el proveedor sin mirar el caché y guarda el resultado (para refrescar antes de expirar)"""
+        if not self.providers[provider].enabled:
             return None
+        
+        return self._single_flight.do(
+            self._flight_key(provider, city, city_info),
+            self._fetch_upstream, provider, city, city_info
+        )
     
-    def fetch_weatherapi(self, city: str) -> Optional[WeatherData]:
+    def fetch_openweathermap(self, city: str, city_info: Optional[CityInfo] = None) -> Optional[WeatherData]:
+        """Obtiene datos de OpenWeatherMap"""
+        return self._fetch('openweathermap', city, city_info)
+    
+    def fetch_metno(self, city: str, city_info: Optional[CityInfo] = None) -> Optional[WeatherData]:
+        """Obtiene datos de MET Norway"""
+        return self._fetch('metno', city, city_info)
+    
+    def fetch_weatherapi(self, city: str, city_info: Optional[CityInfo] = None) -> Optional[WeatherData]:
         """Obtiene datos de WeatherAPI"""
-        if not self.weatherapi_key:
-            return None
+        return self._fetch('weatherapi', city, city_info)
+    
+    def fetch_tomorrow(self, city: str, city_info: Optional[CityInfo] = None) -> Optional[WeatherData]:
+        """Obtiene datos de Tomorrow.io"""
+        return self._fetch('tomorrow', city, city_info)
+    
+    def fetch_visualcrossing(self, city: str, city_info: Optional[CityInfo] = None) -> Optional[WeatherData]:
+        """Obtiene datos de Visual Crossing"""
+        return self._fetch('visualcrossing', city, city_info)
+
+
+class AsyncWeatherFetcher(BaseWeatherFetcher):
+    """
+    Fetcher asíncrono basado en httpx.
+    
+    Expone la misma interfaz que WeatherFetcher pero con corutinas, para
+    que los handlers del bot no bloqueen el event loop mientras esperan
+    a los proveedores.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._single_flight = AsyncSingleFlight()
+        self._refresh = AsyncBackgroundRefresh()
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        # Se crea bajo demanda para quedar ligado al event loop del bot
+        if self._client is None or self._client.is_closed:
+            self._client = http_sessions.create_async_client(self.timeout)
+        return self._client
+    
+    async def aclose(self):
+        """Cierra el cliente HTTP subyacente"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def _acquire_quota(self, provider: str, cost: int = 1) -> Tuple[bool, float]:
+        """`quota_manager.acquire` sin bloquear el event loop (con Redis, en un hilo)"""
+        if quota_manager.backend != 'redis':
+            return quota_manager.acquire(provider, cost)
+        return await run_blocking(quota_manager.acquire, provider, cost)
+    
+    async def _take_quota(self, provider: str, cost: int = 1) -> bool:
+        """Reserva cuota del proveedor, esperando un poco si la ventana está por reiniciarse"""
+        allowed, wait = await self._acquire_quota(provider, cost)
+        if not allowed and wait <= quota_manager.max_wait:
+            await asyncio.sleep(wait)
+            allowed, _ = await self._acquire_quota(provider, cost)
+        if not allowed:
+            self._quota_skipped(provider)
+        return allowed
+    
+    async def _take_retry_quota(self, provider: str) -> bool:
+        """Reserva cuota para reintentar una respuesta 429/5xx: cada reintento es otra llamada"""
+        allowed, _ = await self._acquire_quota(provider)
+        if not allowed:
+            self._quota_skipped(provider)
+        return allowed
+    
+    async def _get_json(self, url: str, params: Dict[str, Any], headers: Dict[str, str],
+                        timeout: Optional[float] = None) -> Any:
+        """Realiza una petición GET y devuelve el JSON de la respuesta"""
+        response = await http_sessions.async_get(
+            self._get_client(), url, params=params, headers=headers, timeout=timeout or self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    async def _get_weather(self, spec: ProviderSpec, request: RequestSpec, timeout: float,
+                           city_info: Optional[CityInfo]) -> WeatherData:
+        """
+        Descarga y parsea la respuesta del proveedor. Con JSON_STREAMING
+        el cuerpo se decodifica a medida que llega y la conexión se cierra
+        en cuanto se tienen los elementos que usa el parser.
+        """
+        if not (self.stream_json and spec.stream):
+            return spec.parse(await self._get_json(*request, timeout=timeout), city_info)
         
-        # Verificar caché
-        cached = weather_cache.get(city, 'weatherapi')
-        if cached:
-            return WeatherData(**cached)
+        url, params, headers = request
+        async with http_sessions.async_stream(
+            self._get_client(), url, params=params, headers=headers, timeout=timeout
+        ) as response:
+            response.raise_for_status()
+            chunks = response.aiter_bytes()
+            try:
+                items, fields = await collect_array_items(
+                    chunks, spec.stream.path, spec.stream.limit, spec.stream.fields
+                )
+            finally:
+                # El parser puede parar antes del final del cuerpo
+                await chunks.aclose()
+        return spec.parse(self._stream_document(spec.stream, items, fields), city_info)
+    
+    async def _hedged(self, provider: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Petición con duplicado opcional: si no hay respuesta dentro del p95
+        del proveedor se lanza otra igual y gana la primera que responda.
+        El duplicado es otra llamada a la API: reserva su propia cuota y
+        no se lanza si no queda.
+        """
+        delay = provider_health.hedge_delay(provider)
+        if delay is None:
+            return await call()
         
+        tasks = {asyncio.ensure_future(call())}
         try:
-            url = "http://api.weatherapi.com/v1/forecast.json"
-            params = {
-                'key': self.weatherapi_key,
-                'q': city,
-                'days': 7,
-                'aqi': 'no',
-                'alerts': 'no'
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            location = data['location']
-            
-            # Datos horarios para hoy
-            hourly_data = []
-            today_forecast = data['forecast']['forecastday'][0]
-            for hour in today_forecast['hour']:
-                dt = datetime.strptime(hour['time'], '%Y-%m-%d %H:%M')
-                hourly_data.append(HourlyWeather(
-                    datetime=dt,
-                    temperature=hour['temp_c'],
-                    precipitation=hour['precip_mm'],
-                    wind_speed=hour['wind_kph'] / 3.6,  # Convertir km/h a m/s
-                    source='WeatherAPI'
-                ))
-            
-            # Datos diarios
-            daily_data = []
-            for day in data['forecast']['forecastday']:
-                dt = datetime.strptime(day['date'], '%Y-%m-%d')
-                day_data = day['day']
-                daily_data.append(DailyWeather(
-                    date=dt,
-                    temp_min=day_data['mintemp_c'],
-                    temp_max=day_data['maxtemp_c'],
-                    precipitation=day_data['totalprecip_mm'],
-                    wind_speed=day_data['maxwind_kph'] / 3.6,  # Convertir km/h a m/s
-                    source='WeatherAPI'
-                ))
-            
-            weather_data = WeatherData(
-                city=location['name'],
-                country=location['country'],
-                timezone=location['tz_id'],
-                hourly=hourly_data,
-                daily=daily_data
-            )
-            
-            # Guardar en caché
-            weather_cache.set(city, 'weatherapi', weather_data.dict())
-            return weather_data
-            
-        except Exception as e:
-            print(f"Error con WeatherAPI: {e}")
-            return None
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and (await self._acquire_quota(provider))[0]:
+                provider_health.record_hedge(provider)
+                tasks.add(asyncio.ensure_future(call()))
+            
+            error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
     
-    def fetch_tomorrow(self, city: str) -> Optional[WeatherData]:
-        """Obtiene datos de Tomorrow.io"""
-        if not self.tomorrow_key:
-            return None
+    async def get_cached_city_info(self, city: str) -> Tuple[bool, Optional[CityInfo]]:
+        """Como `WeatherFetcher.get_cached_city_info`: sin llamadas a la API"""
+        # Los cachés con Redis se consultan en un hilo (ver `call_async`)
+        city_info = await weather_cache.call_async(self._city_info_offline, city)
+        if city_info:
+            return True, city_info
         
-        # Verificar caché
-        cached = weather_cache.get(city, 'tomorrow')
-        if cached:
-            return WeatherData(**cached)
+        found, cached = await geocoding_cache.call_async(geocoding_cache.get, city)
+        if found:
+            return True, await weather_cache.call_async(self._city_info_from_cache, city, cached)
+        return False, None
+    
+    async def get_city_info(self, city: str) -> Optional[CityInfo]:
+        """Obtiene información de la ciudad usando OpenWeatherMap Geocoding"""
+        found, city_info = await self.get_cached_city_info(city)
+        if found or not self.owm_key:
+            return city_info
+        
+        if not await self._take_quota('openweathermap', GEOCODING_CALLS):
+            return None
         
+        start = time.perf_counter()
         try:
-            city_info = self.get_city_info(city)
-            if not city_info:
-                return None
-            
-            url = "https://api.tomorrow.io/v4/timelines"
-            params = {
-                'location': f"{city_info.latitude},{city_info.longitude}",
-                'fields': 'temperature,precipitationIntensity,windSpeed',
-                'timesteps': '1h,1d',
-                'units': 'metric',
-                'apikey': self.tomorrow_key
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            with http_sessions.guard_retries(partial(self._take_retry_quota, 'openweathermap')):
+                data = await self._get_json(*self._geocoding_request(city))
             
-            hourly_data = []
-            daily_data = []
-            
-            for timeline in data['data']['timelines']:
-                if timeline['timestep'] == '1h':
-                    # Datos horarios
-                    for interval in timeline['intervals'][:24]:
-                        dt = datetime.fromisoformat(interval['startTime'].replace('Z', '+00:00'))
-                        values = interval['values']
-                        hourly_data.append(HourlyWeather(
-                            datetime=dt,
-                            temperature=values['temperature'],
-                            precipitation=values['precipitationIntensity'],
-                            wind_speed=values['windSpeed'],
-                            source='Tomorrow.io'
-                        ))
-                elif timeline['timestep'] == '1d':
-                    # Datos diarios
-                    for interval in timeline['intervals'][:7]:
-                        dt = datetime.fromisoformat(interval['startTime'].replace('Z', '+00:00'))
-                        values = interval['values']
-                        daily_data.append(DailyWeather(
-                            date=dt,
-                            temp_min=values['temperature'] - 5,  # Aproximación
-                            temp_max=values['temperature'] + 5,  # Aproximación
-                            precipitation=values['precipitationIntensity'] * 24,
-                            wind_speed=values['windSpeed'],
-                            source='Tomorrow.io'
-                        ))
+            if not data:
+                await geocoding_cache.call_async(geocoding_cache.set, city, None)
+                return None
             
-            weather_data = WeatherData(
-                city=city_info.name,
-                country=city_info.country,
-                timezone=city_info.timezone,
-                hourly=hourly_data,
-                daily=daily_data
-            )
+            location = data[0]
             
-            # Guardar en caché
-            weather_cache.set(city, 'tomorrow', weather_data.dict())
-            return weather_data
+            url, params, headers = self._timezone_request(location)
+            with http_sessions.guard_retries(partial(self._take_retry_quota, 'openweathermap')):
+                tz_response = await http_sessions.async_get(self._get_client(), url, params=params, headers=headers)
+            tz_data = tz_response.json()
             
+            city_info = self._parse_city_info(location, tz_data)
+            await geocoding_cache.call_async(geocoding_cache.set, city, city_info.dict())
+            await weather_cache.call_async(self._register_alias, city, city_info)
+            return city_info
         except Exception as e:
-            print(f"Error con Tomorrow.io: {e}")
+            print(f"Error obteniendo info de ciudad: {e}")
             return None
+        finally:
+            metrics.observe('weather_geocoding_seconds', time.perf_counter() - start,
+                            direction='forward', service='openweathermap')
     
-    def fetch_visualcrossing(self, city: str) -> Optional[WeatherData]:
-        """Obtiene datos de Visual Crossing"""
-        if not self.visualcrossing_key:
+    async def _fetch(self, provider: str, city: str, city_info: Optional[CityInfo] = None) -> Optional[WeatherData]:
+        """Obtiene los datos de un proveedor (caché o API), coalesciendo llamadas idénticas"""
+        if not self.providers[provider].enabled:
             return None
         
-        # Verificar caché
-        cached = weather_cache.get(city, 'visualcrossing')
+        return await self._single_flight.do(
+            self._flight_key(provider, city, city_info),
+            self._fetch_uncoalesced, provider, city, city_info
+        )
+    
+    async def _fetch_uncoalesced(self, provider: str, city: str, city_info: Optional[CityInfo]) -> Optional[WeatherData]:
+        cached, stale = await weather_cache.call_async(weather_cache.get_weather_entry, city, provider)
         if cached:
-            return WeatherData(**cached)
+            if stale:
+                self._refresh.submit(
+                    self._flight_key(provider, city, city_info),
+                    self._fetch_upstream, provider, city, city_info
+                )
+            return cached
+        
+        return await self._fetch_upstream(provider, city, city_info)
+    
+    async def _fetch_upstream(self, provider: str, city: str, city_info: Optional[CityInfo]) -> Optional[WeatherData]:
+        """Consulta la API del proveedor y guarda el resultado en caché"""
+        spec = self.providers[provider]
+        
+        if not provider_health.breaker(provider, spec.label).allow():
+            return None
         
         try:
-            url = f"https://weather.visualcrossing.com/VisualCrossingWebServices/rest/services/timeline/{city}"
-            params = {
-                'key': self.visualcrossing_key,
-                'unitGroup': 'metric',
-                'include': 'hours,days',
-                'elements': 'temp,tempmin,tempmax,precip,windspeed'
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            # Datos horarios para hoy
-            hourly_data = []
-            if data['days']:
-                today = data['days'][0]
-                for hour in today.get('hours', []):
-                    dt = datetime.strptime(f"{today['datetime']} {hour['datetime']}", '%Y-%m-%d %H:%M:%S')
-                    hourly_data.append(HourlyWeather(
-                        datetime=dt,
-                        temperature=hour['temp'],
-                        precipitation=hour.get('precip', 0),
-                        wind_speed=hour['windspeed'] / 3.6,  # Convertir km/h a m/s
-                        source='Visual Crossing'
-                    ))
-            
-            # Datos diarios
-            daily_data = []
-            for day in data['days'][:7]:
-                dt = datetime.strptime(day['datetime'], '%Y-%m-%d')
-                daily_data.append(DailyWeather(
-                    date=dt,
-                    temp_min=day['tempmin'],
-                    temp_max=day['tempmax'],
-                    precipitation=day.get('precip', 0),
-                    wind_speed=day['windspeed'] / 3.6,  # Convertir km/h a m/s
-                    source='Visual Crossing'
-                ))
-            
-            weather_data = WeatherData(
-                city=data['resolvedAddress'].split(',')[0],
-                country=data['resolvedAddress'].split(',')[-1].strip(),
-                timezone=data['timezone'],
-                hourly=hourly_data,
-                daily=daily_data
-            )
+            if spec.needs_city_info:
+                city_info = city_info or await self.get_city_info(city)
+                if not city_info:
+                    provider_health.release(provider)
+                    return None
+            
+            if not await self._take_quota(provider):
+                provider_health.release(provider)
+                return None
             
-            # Guardar en caché
-            weather_cache.set(city, 'visualcrossing', weather_data.dict())
+            start = time.monotonic()
+            request = spec.build_request(city, city_info)
+            timeout = provider_health.timeout(provider, self.timeout)
+            # Los duplicados heredan la reserva de cuota de cada reintento
+            with http_sessions.guard_retries(partial(self._take_retry_quota, provider)):
+                weather_data = await self._hedged(
+                    provider, lambda: self._get_weather(spec, request, timeout, city_info)
+                )
+            elapsed = time.monotonic() - start
+            provider_health.record_success(provider, elapsed)
+            metrics.observe('weather_provider_fetch_seconds', elapsed, provider=provider)
+            
+            await weather_cache.call_async(weather_cache.set_weather, city, provider, weather_data)
             return weather_data
             
         except Exception as e:
-            print(f"Error con Visual Crossing: {e}")
+            self._record_error(provider, e)
+            return None
+    
+    async def refresh(self, provider: str, city: str, city_info: Optional[CityInfo] = None) -> Optional[WeatherData]:
+        """Consulta el proveedor sin mirar el caché y guarda el resultado (para refrescar antes de expirar)"""
+        if not self.providers[provider].enabled:
             return None
+        
+        return await self._single_flight.do(
+            self._flight_key(provider, city, city_info),
+            self._fetch_upstream, provider, city, city_info
+        )
+    
+    async def fetch_openweathermap(self, city: str, city_info: Optional[CityInfo] = None) -> Optional[WeatherData]:
+        """Obtiene datos de OpenWeatherMap"""
+        return await self._fetch('openweathermap', city, city_info)
+    
+    async def fetch_metno(self, city: str, city_info: Optional[CityInfo] = None) -> Optional[WeatherData]:
+        """Obtiene datos de MET Norway"""
+        return await self._fetch('metno', city, city_info)
+    
+    async def fetch_weatherapi(self, city: str, city_info: Optional[CityInfo] = None) -> Optional[WeatherData]:
+        """Obtiene datos de WeatherAPI"""
+        return await self._fetch('weatherapi', city, city_info)
+    
+    async def fetch_tomorrow(self, city: str, city_info: Optional[CityInfo] = None) -> Optional[WeatherData]:
+        """Obtiene datos de Tomorrow.io"""
+        return await self._fetch('tomorrow', city, city_info)
+    
+    async def fetch_visualcrossing(self, city: str, city_info: Optional[CityInfo] = None) -> Optional[WeatherData]:
+        """Obtiene datos de Visual Crossing"""
+        return await self._fetch('visualcrossing', city, city_info)
 
 
-# Instancia global del fetcher
-weather_fetcher = WeatherFetcher()
\ No newline at end of file
+# Instancias globales de los fetchers
+weather_fetcher = WeatherFetcher()
+async_weather_fetcher = AsyncWeatherFetcher()
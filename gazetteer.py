@@ -0,0 +1,345 @@
+"""
+Diccionario geográfico local (opcional)
+
+Carga un fichero de ciudades con el formato de GeoNames (p. ej.
+cities15000.txt de https://download.geonames.org/export/dump/) y
+responde sin llamadas a la API:
+
+- nombre -> CityInfo, con la zona horaria IANA de la ciudad
+- coordenadas -> ciudad más cercana
+
+Al cargarlo por primera vez se compila un índice binario junto al
+fichero (`GAZETTEER_INDEX_PATH`) que en los arranques siguientes se
+mapea en memoria: las columnas se leen directamente del mapa, sin
+copiarlas. Contiene las ciudades ordenadas como un árbol KD implícito
+sobre sus coordenadas cartesianas en la esfera (la distancia euclídea
+crece con la distancia real, también a través del antimeridiano) y los
+nombres normalizados ordenados para buscarlos por bisección.
+"""
+import os
+import sys
+import math
+import mmap
+import struct
+import bisect
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from models import CityInfo
+from cache import normalize_city
+
+
+EARTH_RADIUS_KM = 6371.0
+
+MAGIC = b'GZT1'
+_HEADER = struct.Struct('<4sBBxxqqIII')
+_SECTION = struct.Struct('<Q')
+_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+# Columnas del fichero de GeoNames
+_NAME, _ASCIINAME, _ALTERNATE_NAMES, _LATITUDE, _LONGITUDE, _FEATURE_CLASS = 1, 2, 3, 4, 5, 6
+_COUNTRY, _POPULATION, _TIMEZONE = 8, 14, 17
+
+
+def _to_xyz(latitude: float, longitude: float) -> Tuple[float, float, float]:
+    """Punto de la esfera unitaria"""
+    phi = math.radians(latitude)
+    lam = math.radians(longitude)
+    cos_phi = math.cos(phi)
+    return cos_phi * math.cos(lam), cos_phi * math.sin(lam), math.sin(phi)
+
+
+def _chord_to_km(squared_chord: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(squared_chord) / 2))
+
+
+def _pack_strings(values: List[bytes]) -> Tuple[array, bytes]:
+    """Tabla de cadenas: offsets uint32[n + 1] y bytes concatenados"""
+    offsets = array('I', [0])
+    for value in values:
+        offsets.append(offsets[-1] + len(value))
+    return offsets, b''.join(values)
+
+
+class _Strings:
+    """Secuencia de solo lectura sobre una tabla de cadenas (bytes)"""
+    
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self.offsets = offsets
+        self.blob = blob
+    
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+    
+    def __getitem__(self, index: int) -> bytes:
+        return bytes(self.blob[self.offsets[index]:self.offsets[index + 1]])
+
+
+class Gazetteer:
+    """Índice en memoria de ciudades por nombre y por cercanía"""
+    
+    def __init__(self):
+        self.path = os.getenv('GAZETTEER_PATH', '')
+        self.index_path = os.getenv('GAZETTEER_INDEX_PATH', f"{self.path}.idx" if self.path else '')
+        self.alternate_names = os.getenv('GAZETTEER_ALTERNATE_NAMES', 'true').lower() == 'true'
+        self.min_population = int(os.getenv('GAZETTEER_MIN_POPULATION', '0'))
+        self.max_distance_km = float(os.getenv('GAZETTEER_MAX_DISTANCE_KM', '30'))
+        
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._mmap: Optional[mmap.mmap] = None
+        
+        if self.path:
+            self._load()
+    
+    @property
+    def loaded(self) -> bool:
+        return self.size > 0
+    
+    # --- Construcción y carga del índice ---
+    
+    def _source_signature(self) -> Tuple[int, int]:
+        stat = os.stat(self.path)
+        return stat.st_size, stat.st_mtime_ns
+    
+    def _load(self):
+        try:
+            signature = self._source_signature()
+        except OSError as e:
+            print(f"❌ Diccionario geográfico no disponible: {e}")
+            return
+        
+        try:
+            if self._attach_file(signature):
+                print(f"🗺️ {self.size} ciudades cargadas del índice del diccionario geográfico")
+                return
+        except Exception as e:
+            print(f"Error leyendo el índice del diccionario geográfico, se reconstruye: {e}")
+        
+        try:
+            blob = self._build(signature)
+        except Exception as e:
+            print(f"❌ Error cargando el diccionario geográfico: {e}")
+            return
+        
+        try:
+            tmp_path = f"{self.index_path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(blob)
+            os.replace(tmp_path, self.index_path)
+            self._attach_file(signature)
+        except Exception as e:
+            # Sin permisos de escritura el índice se usa desde memoria
+            print(f"Error guardando el índice del diccionario geográfico: {e}")
+            self._attach(memoryview(blob))
+        print(f"🗺️ {self.size} ciudades cargadas del diccionario geográfico")
+    
+    def _attach_file(self, signature: Tuple[int, int]) -> bool:
+        """Mapea el índice compilado si corresponde al fichero de origen"""
+        if not os.path.exists(self.index_path):
+            return False
+        
+        with open(self.index_path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        magic, little_endian, alternate_names, size, mtime_ns, _, _, _ = _HEADER.unpack_from(mapped, 0)
+        if (magic != MAGIC or bool(little_endian) != _LITTLE_ENDIAN
+                or bool(alternate_names) != self.alternate_names or (size, mtime_ns) != signature):
+            mapped.close()
+            return False
+        
+        self._attach(memoryview(mapped))
+        self._mmap = mapped
+        return True
+    
+    def _build(self, signature: Tuple[int, int]) -> bytes:
+        """Lee el fichero de GeoNames y compila el índice binario"""
+        cities = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                row = line.rstrip('\n').split('\t')
+                if len(row) <= _TIMEZONE or row[_FEATURE_CLASS] != 'P':
+                    continue
+                population = int(row[_POPULATION] or 0)
+                if population < self.min_population:
+                    continue
+                names = {row[_NAME], row[_ASCIINAME]}
+                if self.alternate_names and row[_ALTERNATE_NAMES]:
+                    names.update(row[_ALTERNATE_NAMES].split(','))
+                cities.append((
+                    float(row[_LATITUDE]), float(row[_LONGITUDE]), population,
+                    row[_COUNTRY], row[_TIMEZONE], row[_NAME], names
+                ))
+        
+        points = [_to_xyz(city[0], city[1]) for city in cities]
+        
+        # Árbol KD implícito: en cada rango la mediana del eje queda en el centro
+        order = list(range(len(cities)))
+        
+        def build(lo: int, hi: int, axis: int):
+            if hi - lo <= 1:
+                return
+            order[lo:hi] = sorted(order[lo:hi], key=lambda i: points[i][axis])
+            mid = (lo + hi) // 2
+            build(lo, mid, (axis + 1) % 3)
+            build(mid + 1, hi, (axis + 1) % 3)
+        
+        build(0, len(order), 0)
+        cities = [cities[i] for i in order]
+        points = [points[i] for i in order]
+        
+        zones: Dict[str, int] = {}
+        zone_ids = array('H', (zones.setdefault(city[4], len(zones)) for city in cities))
+        
+        keys = []
+        for row, city in enumerate(cities):
+            for key in {normalize_city(name) for name in city[6] if name.strip()}:
+                keys.append((key.encode('utf-8'), -city[2], row))
+        # Para un mismo nombre, primero la ciudad más poblada
+        keys.sort()
+        
+        name_offsets, names_blob = _pack_strings([city[5].encode('utf-8') for city in cities])
+        zone_offsets, zones_blob = _pack_strings([zone.encode('utf-8') for zone in zones])
+        key_offsets, keys_blob = _pack_strings([key[0] for key in keys])
+        
+        sections = [
+            array('d', (p[0] for p in points)),
+            array('d', (p[1] for p in points)),
+            array('d', (p[2] for p in points)),
+            array('d', (city[0] for city in cities)),
+            array('d', (city[1] for city in cities)),
+            zone_ids,
+            ''.join(city[3][:2].ljust(2) for city in cities).encode('ascii', 'replace'),
+            name_offsets, names_blob,
+            zone_offsets, zones_blob,
+            key_offsets, keys_blob,
+            array('I', (key[2] for key in keys)),
+        ]
+        
+        parts = [_HEADER.pack(MAGIC, _LITTLE_ENDIAN, self.alternate_names, signature[0], signature[1],
+                              len(cities), len(zones), len(keys))]
+        for section in sections:
+            raw = section.tobytes() if isinstance(section, array) else section
+            parts.append(_SECTION.pack(len(raw)))
+            parts.append(raw)
+            parts.append(b'\0' * (-len(raw) % 8))
+        return b''.join(parts)
+    
+    def _attach(self, view: memoryview):
+        """Prepara las columnas como vistas sobre el índice, sin copiarlas"""
+        _, _, _, _, _, size, _, _ = _HEADER.unpack_from(view, 0)
+        offset = _HEADER.size
+        
+        sections = []
+        for _ in range(14):
+            (length,) = _SECTION.unpack_from(view, offset)
+            offset += _SECTION.size
+            sections.append(view[offset:offset + length])
+            offset += length + (-length % 8)
+        
+        (self._x, self._y, self._z, self._lat, self._lon) = (s.cast('d') for s in sections[:5])
+        self._zone_ids = sections[5].cast('H')
+        self._countries = sections[6]
+        self._names = _Strings(sections[7].cast('I'), sections[8])
+        self._zones = _Strings(sections[9].cast('I'), sections[10])
+        self._keys = _Strings(sections[11].cast('I'), sections[12])
+        self._key_rows = sections[13].cast('I')
+        self.size = size
+    
+    # --- Consultas ---
+    
+    def _city_info(self, row: int) -> CityInfo:
+        return CityInfo(
+            name=self._names[row].decode('utf-8'),
+            country=self.country(row),
+            latitude=self._lat[row],
+            longitude=self._lon[row],
+            timezone=self._zones[self._zone_ids[row]].decode('utf-8')
+        )
+    
+    def country(self, row: int) -> str:
+        return bytes(self._countries[row * 2:row * 2 + 2]).decode('ascii').strip()
+    
+    def _find_row(self, key: str, country: Optional[str] = None) -> Optional[int]:
+        encoded = key.encode('utf-8')
+        index = bisect.bisect_left(self._keys, encoded)
+        while index < len(self._keys) and self._keys[index] == encoded:
+            row = self._key_rows[index]
+            if country is None or self.country(row) == country:
+                return row
+            index += 1
+        return None
+    
+    def find(self, city: str) -> Optional[CityInfo]:
+        """
+        Busca una ciudad por nombre ("Montevideo", "montevideo, UY").
+        
+        Entre ciudades homónimas devuelve la más poblada; un código de
+        país de dos letras tras la última coma restringe la búsqueda.
+        """
+        if not self.loaded:
+            return None
+        
+        key = normalize_city(city)
+        row = self._find_row(key)
+        if row is None and ',' in key:
+            name, suffix = key.split(',', 1)[0].strip(), key.rsplit(',', 1)[1].strip()
+            country = suffix.upper() if len(suffix) == 2 else None
+            row = self._find_row(name, country)
+        
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._city_info(row)
+    
+    def _nearest_row(self, latitude: float, longitude: float) -> Tuple[int, float]:
+        """Ciudad más cercana y su distancia en km"""
+        x, y, z = _to_xyz(latitude, longitude)
+        coords = (self._x, self._y, self._z)
+        best_row, best = -1, math.inf
+        
+        # Pila de (inicio, fin, eje, cota inferior de la distancia²)
+        stack = [(0, self.size, 0, 0.0)]
+        while stack:
+            lo, hi, axis, bound = stack.pop()
+            if lo >= hi or bound >= best:
+                continue
+            mid = (lo + hi) // 2
+            dx, dy, dz = x - self._x[mid], y - self._y[mid], z - self._z[mid]
+            distance = dx * dx + dy * dy + dz * dz
+            if distance < best:
+                best_row, best = mid, distance
+            
+            diff = (x, y, z)[axis] - coords[axis][mid]
+            next_axis = (axis + 1) % 3
+            near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+            # Primero la rama del lado del punto; la otra solo si puede estar más cerca
+            stack.append((far[0], far[1], next_axis, diff * diff))
+            stack.append((near[0], near[1], next_axis, 0.0))
+        
+        return best_row, _chord_to_km(best)
+    
+    def nearest(self, latitude: float, longitude: float) -> Optional[CityInfo]:
+        """Ciudad más cercana a unas coordenadas (None si está a más de `max_distance_km`)"""
+        if not self.loaded:
+            return None
+        
+        row, distance = self._nearest_row(latitude, longitude)
+        if row < 0 or distance > self.max_distance_km:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._city_info(row)
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            'cities': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+# Instancia global del diccionario geográfico
+gazetteer = Gazetteer()
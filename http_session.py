@@ -0,0 +1,192 @@
+"""
+Sesiones HTTP compartidas con pool de conexiones, keep-alive y reintentos
+
+Solo se reintentan los errores de conexión y las respuestas 429/5xx. Los
+timeouts de lectura no: cada proveedor tiene un timeout adaptativo y un
+circuit breaker (`resilience.py`) que deben ver cada timeout como un
+fallo, en lugar de esperar varias veces el timeout por debajo del fetcher.
+
+Cada reintento es otra llamada facturable al proveedor: con
+`guard_retries` el fetcher reserva cuota antes de cada uno, y si no
+queda se devuelve la última respuesta sin reintentar.
+"""
+import os
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional, Any, AsyncIterator, Callable, Iterator
+
+import requests
+import httpx
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util.retry import Retry
+
+
+# Respuestas que se reintentan con backoff
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Comprobación previa a cada reintento de una respuesta (ver `guard_retries`)
+_retry_guard: ContextVar[Optional[Callable[[], Any]]] = ContextVar('retry_guard', default=None)
+
+
+class CappedRetry(Retry):
+    """Retry que limita la espera indicada por la cabecera Retry-After"""
+
+    def __init__(self, *args: Any, max_retry_after: float = 10.0, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.max_retry_after = max_retry_after
+
+    def new(self, **kwargs: Any) -> 'CappedRetry':
+        # urllib3 crea un Retry nuevo en cada intento (increment) copiando
+        # solo los argumentos del constructor
+        kwargs.setdefault('max_retry_after', self.max_retry_after)
+        return super().new(**kwargs)
+
+    def get_retry_after(self, response) -> Optional[float]:
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, self.max_retry_after)
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None,
+                  _stacktrace=None) -> 'CappedRetry':
+        retry = super().increment(method, url, response=response, error=error,
+                                  _pool=_pool, _stacktrace=_stacktrace)
+        check = _retry_guard.get()
+        if response is not None and response.status in RETRY_STATUS_CODES and check and not check():
+            # Con raise_on_status=False urllib3 devuelve la última respuesta
+            raise MaxRetryError(_pool, url, ResponseError(f"reintento denegado tras {response.status}"))
+        return retry
+
+
+class HTTPSessionManager:
+    """
+    Gestiona las conexiones HTTP hacia los proveedores meteorológicos.
+
+    Mantiene una única sesión de requests (con un pool por host) y crea
+    clientes httpx con los mismos límites, de modo que las conexiones
+    TCP/TLS se reutilizan entre peticiones en lugar de abrirse cada vez.
+    """
+
+    def __init__(self):
+        self.pool_connections = int(os.getenv('HTTP_POOL_CONNECTIONS', '10'))
+        self.pool_maxsize = int(os.getenv('HTTP_POOL_MAXSIZE', '20'))
+        self.max_retries = int(os.getenv('HTTP_MAX_RETRIES', '2'))
+        self.backoff_factor = float(os.getenv('HTTP_BACKOFF_FACTOR', '0.5'))
+        self.max_retry_after = float(os.getenv('HTTP_MAX_RETRY_AFTER', '10'))
+        self.keepalive_expiry = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '30'))
+
+        self._session: Optional[requests.Session] = None
+        self._lock = threading.Lock()
+
+    def _build_retry(self) -> Retry:
+        return CappedRetry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            # Un timeout de lectura se propaga al fetcher sin reintentos
+            read=False,
+            status=self.max_retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+            max_retry_after=self.max_retry_after
+        )
+
+    def get_session(self) -> requests.Session:
+        """Devuelve la sesión compartida (se crea en el primer uso)"""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    adapter = HTTPAdapter(
+                        pool_connections=self.pool_connections,
+                        pool_maxsize=self.pool_maxsize,
+                        max_retries=self._build_retry()
+                    )
+                    session = requests.Session()
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
+
+    def create_async_client(self, timeout: float) -> httpx.AsyncClient:
+        """Crea un cliente httpx con pool de conexiones y keep-alive"""
+        limits = httpx.Limits(
+            max_connections=self.pool_connections * self.pool_maxsize,
+            max_keepalive_connections=self.pool_maxsize,
+            keepalive_expiry=self.keepalive_expiry
+        )
+        # httpx solo reintenta errores de conexión (no timeouts de lectura);
+        # los códigos HTTP se reintentan en async_get
+        transport = httpx.AsyncHTTPTransport(limits=limits, retries=self.max_retries)
+        return httpx.AsyncClient(timeout=timeout, limits=limits, transport=transport)
+
+    def _retry_delay(self, attempt: int, response: httpx.Response) -> float:
+        """Espera antes del siguiente intento: Retry-After o backoff exponencial"""
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_retry_after)
+            except ValueError:
+                pass
+        return self.backoff_factor * (2 ** attempt)
+
+    @contextmanager
+    def guard_retries(self, check: Callable[[], Any]) -> Iterator[None]:
+        """
+        Consulta `check` antes de reintentar una respuesta 429/5xx; si
+        devuelve False se devuelve esa respuesta sin reintentar. Con la
+        sesión de requests `check` es una función y con `async_get` y
+        `async_stream` una corutina. Vale para las peticiones del hilo o
+        la tarea actual (y las tareas que se creen dentro del bloque).
+        """
+        token = _retry_guard.set(check)
+        try:
+            yield
+        finally:
+            _retry_guard.reset(token)
+
+    @staticmethod
+    async def _may_retry() -> bool:
+        check = _retry_guard.get()
+        return check is None or await check()
+
+    async def async_get(self, client: httpx.AsyncClient, url: str, **kwargs: Any) -> httpx.Response:
+        """GET asíncrono con reintentos y backoff ante 429 y errores 5xx"""
+        for attempt in range(self.max_retries + 1):
+            response = await client.get(url, **kwargs)
+            if (response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries
+                    or not await self._may_retry()):
+                return response
+
+            await asyncio.sleep(self._retry_delay(attempt, response))
+
+        return response
+
+    @asynccontextmanager
+    async def async_stream(self, client: httpx.AsyncClient, url: str,
+                           **kwargs: Any) -> AsyncIterator[httpx.Response]:
+        """Como `async_get`, pero sin leer el cuerpo: se consume con `aiter_bytes`"""
+        for attempt in range(self.max_retries + 1):
+            async with client.stream('GET', url, **kwargs) as response:
+                if (response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries
+                        or not await self._may_retry()):
+                    yield response
+                    return
+                delay = self._retry_delay(attempt, response)
+
+            await asyncio.sleep(delay)
+
+    def close(self):
+        """Cierra la sesión compartida"""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+# Instancia global del gestor de sesiones
+http_sessions = HTTPSessionManager()
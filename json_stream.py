@@ -0,0 +1,126 @@
+"""
+Decodificación incremental de JSON con ijson (opcional)
+
+Permite recorrer los elementos de un array grande de la respuesta a
+medida que se leen, sin construir el documento completo, y dejar de
+leer en cuanto el parser tiene lo que necesita. `iter_array_items`
+lee de un fichero (requests en streaming); `collect_array_items`, de
+los trozos que entrega httpx con `aiter_bytes`.
+"""
+from typing import Any, AsyncIterator, BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+
+_SCALAR_EVENTS = ('string', 'number', 'boolean', 'null')
+
+# Bytes que el parser asíncrono de ijson procesa de cada vez: decodifica
+# todo lo leído aunque se detenga antes, así que con trozos de red
+# grandes (hasta 64 KiB) procesaría bastante más de lo necesario
+_ASYNC_BUF_SIZE = 4096
+
+
+def iter_array_items(stream: BinaryIO, path: str, fields: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+    """
+    Recorre los elementos del array en `path` (p. ej. 'properties.timeseries').
+    
+    Si se pasa `fields`, se rellenan por el camino los escalares cuyo
+    prefijo coincide con una de sus claves (p. ej. 'timezone'); solo
+    están completos para los campos que preceden al array en el JSON
+    o que se leyeron antes de detener la iteración.
+    """
+    item_path = f"{path}.item"
+    builder = None
+    
+    for prefix, event, value in ijson.parse(stream, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if not builder.containers:
+                yield builder.value
+                builder = None
+            continue
+        
+        if prefix == item_path and event in ('start_map', 'start_array'):
+            builder = ObjectBuilder()
+            builder.event(event, value)
+        elif prefix == item_path and event in _SCALAR_EVENTS:
+            yield value
+        elif fields is not None and prefix in fields and event in _SCALAR_EVENTS:
+            fields[prefix] = value
+
+
+class _AsyncChunkReader:
+    """
+    Adapta un iterador asíncrono de trozos de bytes al `read` asíncrono
+    que espera ijson. Con `replay` se leen primero esos trozos; con
+    `record` se guardan los trozos leídos del iterador.
+    """
+    
+    def __init__(self, chunks: AsyncIterator[bytes], replay: Sequence[bytes] = (),
+                 record: Optional[List[bytes]] = None):
+        self._chunks = chunks
+        self._replay = list(replay)
+        self._record = record
+        self._buffer = b''
+    
+    async def read(self, size: int = -1) -> bytes:
+        if size == 0:
+            return b''
+        if not self._buffer:
+            if self._replay:
+                self._buffer = self._replay.pop(0)
+            else:
+                try:
+                    self._buffer = await self._chunks.__anext__()
+                except StopAsyncIteration:
+                    return b''
+                if self._record is not None:
+                    self._record.append(self._buffer)
+        
+        if size < 0 or size >= len(self._buffer):
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+async def collect_array_items(chunks: AsyncIterator[bytes], path: str, limit: int,
+                              fields: Sequence[str] = ()) -> Tuple[List[Any], Dict[str, Any]]:
+    """
+    Lee como mucho `limit` elementos del array en `path` de un cuerpo que
+    llega por trozos y deja de consumir `chunks` en cuanto los tiene.
+    
+    `fields` son escalares que preceden al array en el JSON (p. ej.
+    'timezone'); se leen antes y solo se vuelven a recorrer los trozos
+    que hicieron falta para encontrarlos. No cierra `chunks`.
+    
+    Returns:
+        (elementos, {campo: valor o None})
+    """
+    values: Dict[str, Any] = {field: None for field in fields}
+    
+    replay: List[bytes] = []
+    if fields:
+        pending = set(fields)
+        reader = _AsyncChunkReader(chunks, record=replay)
+        async for prefix, event, value in ijson.parse(reader, buf_size=_ASYNC_BUF_SIZE, use_float=True):
+            if prefix in pending and event in _SCALAR_EVENTS:
+                values[prefix] = value
+                pending.discard(prefix)
+            if not pending or (prefix == path and event == 'start_array'):
+                break
+    
+    items: List[Any] = []
+    if limit <= 0:
+        return items, values
+    async for item in ijson.items(_AsyncChunkReader(chunks, replay), f"{path}.item",
+                                 buf_size=_ASYNC_BUF_SIZE, use_float=True):
+        items.append(item)
+        if len(items) >= limit:
+            break
+    return items, values
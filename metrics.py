@@ -0,0 +1,276 @@
+"""
+Métricas de rendimiento en formato de texto de Prometheus
+
+Histogramas de latencia y contadores en memoria para las rutas
+calientes del bot: consultas a cada proveedor, geocodificación,
+aciertos y fallos del caché por tipo de dato, tiempo de CPU de la
+agregación, formateo de mensajes y envíos a Telegram. El estado de
+otros componentes (cola de salida, cuotas, circuit breakers) se añade
+al exportar mediante colectores.
+
+Las métricas se sirven en `http://METRICS_HOST:METRICS_PORT/metrics`
+(desactivado con `METRICS_PORT=0`) y con el comando /stats.
+"""
+import os
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+# Límites superiores (segundos) de los buckets de los histogramas
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+# Métricas conocidas: nombre -> (tipo, descripción)
+METRICS = {
+    'weather_provider_fetch_seconds': ('histogram', "Latencia de las consultas a cada proveedor meteorológico"),
+    'weather_provider_errors_total': ('counter', "Consultas a proveedores que terminaron en error (kind: provider o request)"),
+    'weather_geocoding_seconds': ('histogram', "Latencia de la geocodificación (directa o inversa) por servicio"),
+    'weather_cache_requests_total': ('counter', "Lecturas del caché por tipo de dato y resultado (hit, stale, miss)"),
+    'weather_cache_evictions_total': ('counter', "Entradas expulsadas del caché en memoria por tipo de dato"),
+    'weather_aggregation_cpu_seconds': ('histogram', "Tiempo de CPU de cada agregación de fuentes"),
+    'weather_render_seconds': ('histogram', "Tiempo de formateo de un mensaje por variante"),
+    'telegram_send_seconds': ('histogram', "Duración de cada petición a la API de Telegram por método"),
+    'telegram_queue_wait_seconds': ('histogram', "Espera en la cola de salida por prioridad"),
+    'bot_command_seconds': ('histogram', "Duración total de cada comando del bot"),
+}
+
+# Etiquetas ordenadas de una serie
+Labels = Tuple[Tuple[str, str], ...]
+# (nombre, tipo, descripción, [(etiquetas, valor)]) devuelto por un colector
+Family = Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]
+
+
+class Histogram:
+    """Histograma de buckets fijos (no acumulados hasta exportarlo)"""
+    
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+    
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # Un contador por bucket más el de +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+    
+    def cumulative(self) -> List[int]:
+        total = 0
+        result = []
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+    
+    def quantile(self, fraction: float) -> Optional[float]:
+        """Cuantil estimado por interpolación lineal dentro del bucket (como `histogram_quantile`)"""
+        if not self.count:
+            return None
+        
+        rank = fraction * self.count
+        lower, seen = 0.0, 0
+        for upper, count in zip(self.buckets, self.counts):
+            if count and seen + count >= rank:
+                return lower + (upper - lower) * (rank - seen) / count
+            lower, seen = upper, seen + count
+        # En el bucket +Inf solo se conoce su límite inferior
+        return self.buckets[-1]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class MetricsRegistry:
+    """
+    Registro de histogramas y contadores con servidor HTTP opcional.
+    
+    Todas las operaciones son seguras entre hilos; con
+    `METRICS_ENABLED=false` registrar una medida no hace nada.
+    """
+    
+    def __init__(self):
+        self.enabled = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+        self.host = os.getenv('METRICS_HOST', '127.0.0.1')
+        self.port = int(os.getenv('METRICS_PORT', '0'))
+        
+        self._lock = threading.Lock()
+        # nombre -> etiquetas -> histograma o valor del contador
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+        
+        self._server: Optional[ThreadingHTTPServer] = None
+    
+    # --- Registro de medidas ---
+    
+    def observe(self, name: str, value: float, **labels):
+        """Añade una medida (en segundos) al histograma `name`"""
+        if not self.enabled:
+            return
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+    
+    def inc(self, name: str, amount: float = 1, **labels):
+        """Incrementa el contador `name`"""
+        if not self.enabled:
+            return
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+    
+    @contextmanager
+    def timer(self, name: str, cpu: bool = False, **labels) -> Iterator[None]:
+        """
+        Mide la duración del bloque. Con `cpu=True` mide el tiempo de CPU
+        del hilo actual, sin contar esperas (solo para código sin await).
+        """
+        clock = time.thread_time if cpu else time.perf_counter
+        start = clock()
+        try:
+            yield
+        finally:
+            self.observe(name, clock() - start, **labels)
+    
+    def register_collector(self, collector: Callable[[], Iterable[Family]]):
+        """Añade una función que devuelve métricas calculadas al exportar"""
+        self._collectors.append(collector)
+    
+    # --- Consulta y exportación ---
+    
+    def _snapshot(self) -> Tuple[Dict[str, Dict[Labels, Histogram]], Dict[str, Dict[Labels, float]]]:
+        with self._lock:
+            histograms = {}
+            for name, series in self._histograms.items():
+                histograms[name] = {}
+                for key, histogram in series.items():
+                    copy = histograms[name][key] = Histogram(histogram.buckets)
+                    copy.counts = list(histogram.counts)
+                    copy.sum = histogram.sum
+                    copy.count = histogram.count
+            counters = {name: dict(series) for name, series in self._counters.items()}
+        return histograms, counters
+    
+    def histograms(self) -> Dict[str, Dict[Labels, Histogram]]:
+        """Copia de los histogramas registrados"""
+        return self._snapshot()[0]
+    
+    def counters(self) -> Dict[str, Dict[Labels, float]]:
+        """Copia de los contadores registrados"""
+        return self._snapshot()[1]
+    
+    def render(self) -> str:
+        """Todas las métricas en formato de texto de Prometheus (versión 0.0.4)"""
+        histograms, counters = self._snapshot()
+        lines: List[str] = []
+        
+        for name in sorted(set(histograms) | set(counters)):
+            kind, description = METRICS.get(name, ('histogram' if name in histograms else 'counter', ''))
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in sorted(counters.get(name, {}).items()):
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+            for key, histogram in sorted(histograms.get(name, {}).items()):
+                bounds = [_format_value(bound) for bound in histogram.buckets] + ['+Inf']
+                for bound, count in zip(bounds, histogram.cumulative()):
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', bound))} {count}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_value(histogram.sum)}")
+                lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                print(f"Error recogiendo métricas: {e}")
+                continue
+            for name, kind, description, samples in families:
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    lines.append(f"{name}{_format_labels(_labels(labels))} {_format_value(value)}")
+        
+        return '\n'.join(lines) + '\n'
+    
+    # --- Servidor HTTP ---
+    
+    def start_server(self) -> bool:
+        """Sirve /metrics en un hilo en segundo plano si `METRICS_PORT` está configurado"""
+        if not self.port or self._server is not None:
+            return False
+        
+        registry = self
+        
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+        except OSError as e:
+            print(f"❌ No se pudo abrir el endpoint de métricas en {self.host}:{self.port}: {e}")
+            return False
+        
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='metrics-server', daemon=True).start()
+        print(f"📈 Métricas en http://{self.host}:{self._server.server_port}/metrics")
+        return True
+    
+    def stop_server(self):
+        """Detiene el servidor HTTP de métricas"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# Instancia global del registro de métricas
+metrics = MetricsRegistry()
@@ -2,8 +2,9 @@
 Modelos de datos meteorológicos usando Pydantic
 """
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, NamedTuple, Optional
 from datetime import datetime
+from series import ForecastSeries
 
 
 class HourlyWeather(BaseModel):
@@ -25,13 +26,55 @@ class DailyWeather(BaseModel):
     source: str = Field(description="Fuente de los datos")
 
 
+class HourlyPoint(NamedTuple):
+    """Fila de una serie horaria (mismos campos que HourlyWeather)"""
+    datetime: datetime
+    temperature: float
+    precipitation: float
+    wind_speed: float
+    source: str
+
+
+class DailyPoint(NamedTuple):
+    """Fila de una serie diaria (mismos campos que DailyWeather)"""
+    date: datetime
+    temp_min: float
+    temp_max: float
+    precipitation: float
+    wind_speed: float
+    source: str
+
+
+class HourlySeries(ForecastSeries):
+    """Serie horaria columnar"""
+    __slots__ = ()
+    fields = ('temperature', 'precipitation', 'wind_speed')
+    point = HourlyPoint
+    row_model = HourlyWeather
+    
+    def add(self, datetime: datetime, temperature: float, precipitation: float, wind_speed: float, source: str):
+        self._append(datetime, source, (temperature, precipitation, wind_speed))
+
+
+class DailySeries(ForecastSeries):
+    """Serie diaria columnar"""
+    __slots__ = ()
+    fields = ('temp_min', 'temp_max', 'precipitation', 'wind_speed')
+    point = DailyPoint
+    row_model = DailyWeather
+    
+    def add(self, date: datetime, temp_min: float, temp_max: float, precipitation: float, wind_speed: float,
+            source: str):
+        self._append(date, source, (temp_min, temp_max, precipitation, wind_speed))
+
+
 class WeatherData(BaseModel):
-    """Datos meteorológicos completos"""
+    """Datos meteorológicos completos (series columnares; `.dict()` las exporta como listas de filas)"""
     city: str
     country: str
     timezone: str
-    hourly: List[HourlyWeather] = []
-    daily: List[DailyWeather] = []
+    hourly: HourlySeries = Field(default_factory=HourlySeries)
+    daily: DailySeries = Field(default_factory=DailySeries)
     last_updated: datetime = Field(default_factory=datetime.now)
 
 
@@ -41,4 +84,20 @@ class CityInfo(BaseModel):
     country: str
     latitude: float
     longitude: float
-    timezone: str
\ No newline at end of file
+    timezone: str
+
+
+class BatchWeatherResult(BaseModel):
+    """Resultado de una consulta de varias ciudades"""
+    results: Dict[str, WeatherData] = {}
+    errors: Dict[str, str] = {}
+
+
+class Subscription(BaseModel):
+    """Envío diario programado del pronóstico a un chat"""
+    chat_id: int
+    city: str
+    send_time: str = Field(description="Hora local de envío (HH:MM)")
+    timezone: str = Field(description="Zona horaria IANA o UTC±N")
+    kind: str = Field(default='hoy', description="'hoy' (horario) o 'semana' (diario)")
+    variant: Optional[str] = Field(default=None, description="Variante del mensaje (por defecto, programado_<kind>)")
@@ -0,0 +1,179 @@
+"""
+Precalentamiento del caché para las ciudades más consultadas
+
+Registra cuántas veces se pide cada ciudad y, periódicamente, refresca
+en segundo plano las más populares poco antes de que expiren sus
+entradas en el caché, de modo que el siguiente usuario no tenga que
+esperar a los cinco proveedores. Un presupuesto de peticiones por
+minuto limita el consumo de las APIs.
+"""
+import os
+import time
+import asyncio
+import threading
+from typing import Dict, List, Optional
+
+from aggregator import async_weather_aggregator
+from cache import weather_cache, normalize_city
+from fetcher import async_weather_fetcher, GEOCODING_CALLS
+
+
+class CachePrewarmer:
+    """
+    Refresca las ciudades más consultadas antes de que expire su caché.
+    
+    La popularidad decae a la mitad cada `decay_minutes`, para seguir
+    la demanda reciente en lugar de la acumulada.
+    """
+    
+    def __init__(self):
+        self.enabled = os.getenv('PREWARM_ENABLED', 'true').lower() == 'true'
+        self.top_n = int(os.getenv('PREWARM_TOP_N', '10'))
+        self.interval = int(os.getenv('PREWARM_INTERVAL', '60'))
+        self.lead_seconds = int(os.getenv('PREWARM_LEAD_SECONDS', '180'))
+        self.budget_per_minute = int(os.getenv('PREWARM_BUDGET_PER_MINUTE', '20'))
+        self.decay_minutes = int(os.getenv('PREWARM_DECAY_MINUTES', '60'))
+        self.max_tracked = int(os.getenv('PREWARM_MAX_TRACKED', '1000'))
+        
+        # ciudad normalizada -> popularidad / nombre tal como se pidió
+        self._counts: Dict[str, float] = {}
+        self._names: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._last_decay = time.time()
+        
+        self._window_start = 0.0
+        self._spent = 0
+        self._task: Optional[asyncio.Task] = None
+        
+        self.refreshed = 0
+        self.skipped_budget = 0
+    
+    def record(self, city: str):
+        """Registra una consulta de la ciudad"""
+        if not city:
+            return
+        
+        key = normalize_city(city)
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0.0) + 1
+            self._names.setdefault(key, city)
+            
+            if len(self._counts) > self.max_tracked:
+                least = min(self._counts, key=self._counts.get)
+                del self._counts[least]
+                del self._names[least]
+    
+    def _decay(self):
+        """Reduce a la mitad la popularidad si pasó el periodo de decaimiento"""
+        now = time.time()
+        if now - self._last_decay < self.decay_minutes * 60:
+            return
+        
+        with self._lock:
+            self._last_decay = now
+            for key in list(self._counts):
+                self._counts[key] /= 2
+                if self._counts[key] < 0.5:
+                    del self._counts[key]
+                    del self._names[key]
+    
+    def top(self, n: Optional[int] = None) -> List[str]:
+        """Ciudades más consultadas, de mayor a menor popularidad"""
+        with self._lock:
+            ranked = sorted(self._counts, key=self._counts.get, reverse=True)
+            return [self._names[key] for key in ranked[:n or self.top_n]]
+    
+    def _take_budget(self, cost: int) -> bool:
+        """Descuenta `cost` peticiones del presupuesto del minuto en curso"""
+        now = time.time()
+        if now - self._window_start >= 60:
+            self._window_start = now
+            self._spent = 0
+        
+        if self._spent + cost > self.budget_per_minute:
+            return False
+        self._spent += cost
+        return True
+    
+    def _expiring(self, city: str, data_type: str) -> bool:
+        """Si la entrada falta, está vieja o expira dentro del margen"""
+        ttl = weather_cache.get_ttl(city, data_type)
+        return ttl is None or ttl < self.lead_seconds
+    
+    async def _prewarm(self, city: str) -> bool:
+        """
+        Refresca una ciudad si hace falta; devuelve False si no alcanzó el presupuesto.
+        
+        Cada petición a una API cuenta para el presupuesto, también la
+        geocodificación de una ciudad que aún no está en caché. El agregado
+        se recalcula con las fuentes recién guardadas, sin volver a
+        consultar a los proveedores que fallaron.
+        """
+        if not await weather_cache.call_async(self._expiring, city, async_weather_aggregator.aggregated_data_type()):
+            return True
+        
+        found, city_info = await async_weather_fetcher.get_cached_city_info(city)
+        if not found and async_weather_fetcher.owm_key:
+            if not self._take_budget(GEOCODING_CALLS):
+                self.skipped_budget += 1
+                return False
+            city_info = await async_weather_fetcher.get_city_info(city)
+        
+        providers = [
+            provider for provider in async_weather_aggregator.enabled_providers()
+            if (city_info or not async_weather_fetcher.providers[provider].needs_city_info)
+            and await weather_cache.call_async(self._expiring, city, provider)
+        ]
+        if not self._take_budget(len(providers)):
+            self.skipped_budget += 1
+            return False
+        
+        await asyncio.gather(*(
+            async_weather_fetcher.refresh(provider, city, city_info)
+            for provider in providers
+        ))
+        await weather_cache.call_async(async_weather_aggregator.recombine_cached, city)
+        self.refreshed += 1
+        return True
+    
+    async def run_once(self) -> int:
+        """Revisa las ciudades populares y refresca las que están por expirar"""
+        self._decay()
+        refreshed = self.refreshed
+        
+        for city in self.top():
+            try:
+                if not await self._prewarm(city):
+                    break
+            except Exception as e:
+                print(f"Error precalentando {city}: {e}")
+        
+        return self.refreshed - refreshed
+    
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            refreshed = await self.run_once()
+            if refreshed:
+                print(f"🔥 {refreshed} ciudades precalentadas en el caché")
+    
+    def start(self):
+        """Inicia el precalentamiento periódico en el event loop actual"""
+        if not self.enabled or self.interval <= 0 or self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+    
+    async def stop(self):
+        """Detiene el precalentamiento periódico"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+# Instancia global del precalentador
+cache_prewarmer = CachePrewarmer()
@@ -0,0 +1,214 @@
+"""
+Control de cuotas de las APIs meteorológicas
+
+Cuenta las llamadas de cada proveedor por clave de API y por ventana
+(minuto, hora y día, alineadas al reloj UTC). Antes de cada petición se
+comprueba que quede cuota: si no, la llamada se omite (o se espera un
+poco si la ventana que la impide está por reiniciarse). Los contadores
+viven en memoria o en el Redis del caché, para compartirlos entre
+varias instancias del bot.
+"""
+import os
+import time
+import hashlib
+import threading
+from typing import Any, Dict, Tuple
+
+from cache import weather_cache
+
+
+# Duración de cada ventana en segundos
+WINDOWS = {
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400,
+}
+
+# Límites aproximados de los planes gratuitos. Solo se aplican con
+# QUOTA_FREE_TIER_DEFAULTS=true; si no, cada límite se configura con
+# su variable de entorno (0 o ausente = sin límite)
+FREE_TIER_LIMITS = {
+    'openweathermap': {'minute': 60, 'day': 1000},
+    'weatherapi': {'day': 3000},
+    'tomorrow': {'hour': 25, 'day': 500},
+    'visualcrossing': {'day': 1000},
+    'metno': {},
+}
+
+# Variable de entorno con la clave de API de cada proveedor
+KEY_ENV = {
+    'openweathermap': 'OWM_KEY',
+    'weatherapi': 'WEATHERAPI_KEY',
+    'tomorrow': 'TOMORROW_KEY',
+    'visualcrossing': 'VISUALCROSSING_KEY',
+}
+
+
+class QuotaManager:
+    """
+    Cuotas por proveedor y ventana.
+    
+    Los límites se configuran con `QUOTA_<PROVEEDOR>_PER_<VENTANA>`,
+    por ejemplo `QUOTA_TOMORROW_PER_HOUR=25`. Con
+    `QUOTA_FREE_TIER_DEFAULTS=true` los no configurados toman los de
+    `FREE_TIER_LIMITS`.
+    """
+    
+    def __init__(self, redis_client=None):
+        self.enabled = os.getenv('QUOTA_ENABLED', 'true').lower() == 'true'
+        self.backend = os.getenv('QUOTA_BACKEND', 'redis' if redis_client else 'memory').lower()
+        # Espera máxima (s) a que se reinicie una ventana antes de omitir la llamada
+        self.max_wait = float(os.getenv('QUOTA_MAX_WAIT', '2'))
+        self.redis_client = redis_client
+        
+        if self.backend == 'redis' and not self.redis_client:
+            print("❌ Redis no disponible para cuotas, usando memoria")
+            self.backend = 'memory'
+        
+        free_tier = os.getenv('QUOTA_FREE_TIER_DEFAULTS', 'false').lower() == 'true'
+        self.limits: Dict[str, Dict[str, int]] = {}
+        for provider, free_tier_limits in FREE_TIER_LIMITS.items():
+            defaults = free_tier_limits if free_tier else {}
+            limits = {}
+            for window in WINDOWS:
+                value = int(os.getenv(f'QUOTA_{provider.upper()}_PER_{window.upper()}', defaults.get(window, 0)))
+                if value > 0:
+                    limits[window] = value
+            self.limits[provider] = limits
+        
+        # Contadores en memoria: clave -> llamadas
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # Proveedor -> instante hasta el que no se le consulta (tras un 429)
+        self._blocked_until: Dict[str, float] = {}
+        
+        self.skipped: Dict[str, int] = {}
+    
+    @staticmethod
+    def _key_id(provider: str) -> str:
+        """Identificador de la clave de API (hash, para no guardarla en Redis)"""
+        api_key = os.getenv(KEY_ENV[provider], '') if provider in KEY_ENV else ''
+        return hashlib.sha1(api_key.encode()).hexdigest()[:8] if api_key else 'public'
+    
+    def _counter_key(self, provider: str, window: str, now: float) -> str:
+        bucket = int(now // WINDOWS[window])
+        return f"quota:{provider}:{self._key_id(provider)}:{window}:{bucket}"
+    
+    @staticmethod
+    def _resets_in(window: str, now: float) -> float:
+        return WINDOWS[window] - now % WINDOWS[window]
+    
+    def _increment(self, keys: Dict[str, str], cost: int) -> Dict[str, int]:
+        """Suma `cost` a los contadores y devuelve sus nuevos valores"""
+        if self.backend == 'redis':
+            pipe = self.redis_client.pipeline()
+            for window, key in keys.items():
+                pipe.incrby(key, cost)
+                pipe.expire(key, WINDOWS[window] + 60)
+            values = pipe.execute()[::2]
+            return dict(zip(keys, (int(value) for value in values)))
+        
+        with self._lock:
+            result = {}
+            for window, key in keys.items():
+                self._counts[key] = self._counts.get(key, 0) + cost
+                result[window] = self._counts[key]
+            return result
+    
+    def _decrement(self, keys: Dict[str, str], cost: int):
+        if self.backend == 'redis':
+            pipe = self.redis_client.pipeline()
+            for key in keys.values():
+                pipe.decrby(key, cost)
+            pipe.execute()
+            return
+        
+        with self._lock:
+            for key in keys.values():
+                self._counts[key] -= cost
+    
+    def _read(self, key: str) -> int:
+        if self.backend == 'redis':
+            value = self.redis_client.get(key)
+            return int(value) if value else 0
+        return self._counts.get(key, 0)
+    
+    def _prune(self, now: float):
+        """Elimina los contadores en memoria de ventanas ya cerradas"""
+        current = {self._counter_key(p, w, now) for p in self.limits for w in self.limits[p]}
+        with self._lock:
+            for key in list(self._counts):
+                if key not in current:
+                    del self._counts[key]
+    
+    def acquire(self, provider: str, cost: int = 1) -> Tuple[bool, float]:
+        """
+        Reserva `cost` llamadas del proveedor.
+        
+        Returns:
+            (permitido, segundos hasta que se reinicie la ventana que lo impide)
+        """
+        if not self.enabled:
+            return True, 0.0
+        
+        now = time.time()
+        blocked_until = self._blocked_until.get(provider, 0.0)
+        if blocked_until > now:
+            return False, blocked_until - now
+        
+        limits = self.limits.get(provider)
+        if not limits:
+            return True, 0.0
+        
+        keys = {window: self._counter_key(provider, window, now) for window in limits}
+        try:
+            counts = self._increment(keys, cost)
+        except Exception as e:
+            # Sin almacén de contadores no se bloquean las consultas
+            print(f"Error contando cuota de {provider}: {e}")
+            return True, 0.0
+        
+        exceeded = [window for window, count in counts.items() if count > limits[window]]
+        if not exceeded:
+            if self.backend == 'memory' and len(self._counts) > 1000:
+                self._prune(now)
+            return True, 0.0
+        
+        self._decrement(keys, cost)
+        return False, max(self._resets_in(window, now) for window in exceeded)
+    
+    def record_skip(self, provider: str):
+        self.skipped[provider] = self.skipped.get(provider, 0) + 1
+    
+    def block(self, provider: str, seconds: float):
+        """Deja de consultar al proveedor durante `seconds` (p. ej. tras un 429)"""
+        self._blocked_until[provider] = max(self._blocked_until.get(provider, 0.0), time.time() + seconds)
+    
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Uso y cuota restante de cada proveedor con límites"""
+        now = time.time()
+        result = {}
+        for provider, limits in self.limits.items():
+            windows = {}
+            for window, limit in limits.items():
+                try:
+                    used = self._read(self._counter_key(provider, window, now))
+                except Exception:
+                    used = 0
+                windows[window] = {
+                    'used': used,
+                    'limit': limit,
+                    'remaining': max(0, limit - used),
+                    'resets_in': int(self._resets_in(window, now)),
+                }
+            blocked = self._blocked_until.get(provider, 0.0) - now
+            result[provider] = {
+                'windows': windows,
+                'skipped': self.skipped.get(provider, 0),
+                'blocked_for': int(blocked) if blocked > 0 else 0,
+            }
+        return result
+
+
+# Instancia global del gestor de cuotas
+quota_manager = QuotaManager(weather_cache.redis_client if weather_cache.use_redis else None)
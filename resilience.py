@@ -0,0 +1,224 @@
+"""
+Circuit breakers y timeouts adaptativos por proveedor
+
+Si un proveedor falla varias veces seguidas, su circuito se abre y las
+consultas siguientes se descartan al instante en lugar de esperar el
+timeout completo. Pasado un tiempo se deja pasar una sola petición de
+prueba (semiabierto): si funciona el circuito se cierra, si no vuelve a
+abrirse.
+
+El timeout de cada proveedor se ajusta a su latencia observada (p95
+multiplicado por un margen), dentro de un mínimo y del timeout base.
+Opcionalmente, si una petición supera el p95 se lanza un duplicado
+(petición cubierta) y se usa la primera respuesta.
+"""
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+import httpx
+import requests
+import urllib3
+
+
+# Errores de red y timeouts de requests, urllib3 (al leer el cuerpo en
+# streaming) y httpx
+TRANSIENT_ERRORS = (
+    asyncio.TimeoutError,
+    requests.Timeout,
+    requests.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+    urllib3.exceptions.HTTPError,
+    httpx.TransportError,
+)
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """
+    Si un error indica que el proveedor está caído o saturado: timeout,
+    error de red, 429 o 5xx. Los errores de la petición (otros 4xx, p. ej.
+    una ciudad mal escrita) y las respuestas que no se pueden parsear no
+    cuentan para el circuit breaker.
+    """
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status is not None and (status == 429 or status >= 500)
+
+
+class CircuitBreaker:
+    """Circuit breaker de un proveedor: cerrado, abierto o semiabierto"""
+    
+    CLOSED = 'cerrado'
+    OPEN = 'abierto'
+    HALF_OPEN = 'semiabierto'
+    
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        
+        self.state = self.CLOSED
+        self.failures = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self._lock = threading.Lock()
+    
+    def allow(self) -> bool:
+        """Si se puede consultar al proveedor ahora"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.CLOSED:
+                return True
+            
+            if self.state == self.OPEN and now - self._opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+            
+            # Semiabierto: una sola prueba a la vez; si la prueba no
+            # informa (tarea cancelada) se permite otra tras el periodo
+            if self.state == self.HALF_OPEN and (
+                self._probe_started is None or now - self._probe_started >= self.reset_seconds
+            ):
+                self._probe_started = now
+                return True
+            
+            self.rejected += 1
+            return False
+    
+    def release(self):
+        """
+        La consulta autorizada por `allow` no llegó al proveedor (p. ej.
+        sin cuota): si era la prueba del semiabierto, se permite otra.
+        """
+        with self._lock:
+            self._probe_started = None
+    
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                print(f"✅ Circuito cerrado para {self.name}")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_started = None
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"🔌 Circuito abierto para {self.name} tras {self.failures} fallos")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_started = None
+
+
+class LatencyTracker:
+    """Latencias recientes de un proveedor y timeout derivado de ellas"""
+    
+    def __init__(self, window: int):
+        self.samples = deque(maxlen=window)
+        self.p50: Optional[float] = None
+        self.p95: Optional[float] = None
+        self._lock = threading.Lock()
+    
+    def record(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+            ordered = sorted(self.samples)
+            self.p50 = ordered[len(ordered) // 2]
+            self.p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class ProviderHealth:
+    """Estado de salud de todos los proveedores (compartido por ambos fetchers)"""
+    
+    def __init__(self):
+        self.failure_threshold = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+        self.reset_seconds = float(os.getenv('CIRCUIT_RESET_SECONDS', '30'))
+        self.timeout_min = float(os.getenv('ADAPTIVE_TIMEOUT_MIN', '2'))
+        self.timeout_multiplier = float(os.getenv('ADAPTIVE_TIMEOUT_MULTIPLIER', '3'))
+        self.min_samples = int(os.getenv('ADAPTIVE_TIMEOUT_MIN_SAMPLES', '20'))
+        self.window = int(os.getenv('ADAPTIVE_TIMEOUT_WINDOW', '200'))
+        self.hedge = os.getenv('HEDGE_REQUESTS', 'false').lower() == 'true'
+        
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.latencies: Dict[str, LatencyTracker] = {}
+        self.hedged: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    def breaker(self, provider: str, label: Optional[str] = None) -> CircuitBreaker:
+        breaker = self.breakers.get(provider)
+        if breaker is None:
+            with self._lock:
+                breaker = self.breakers.setdefault(
+                    provider,
+                    CircuitBreaker(label or provider, self.failure_threshold, self.reset_seconds)
+                )
+        return breaker
+    
+    def _tracker(self, provider: str) -> LatencyTracker:
+        tracker = self.latencies.get(provider)
+        if tracker is None:
+            with self._lock:
+                tracker = self.latencies.setdefault(provider, LatencyTracker(self.window))
+        return tracker
+    
+    def timeout(self, provider: str, default: float) -> float:
+        """Timeout para la próxima petición: p95 × margen, entre el mínimo y `default`"""
+        tracker = self._tracker(provider)
+        if len(tracker.samples) < self.min_samples or tracker.p95 is None:
+            return default
+        return min(default, max(self.timeout_min, tracker.p95 * self.timeout_multiplier))
+    
+    def hedge_delay(self, provider: str) -> Optional[float]:
+        """Espera antes de lanzar una petición duplicada (None = sin duplicado)"""
+        tracker = self._tracker(provider)
+        if not self.hedge or len(tracker.samples) < self.min_samples:
+            return None
+        return tracker.p95
+    
+    def record_hedge(self, provider: str):
+        self.hedged[provider] = self.hedged.get(provider, 0) + 1
+    
+    def record_success(self, provider: str, seconds: float):
+        self._tracker(provider).record(seconds)
+        self.breaker(provider).record_success()
+    
+    def record_failure(self, provider: str):
+        self.breaker(provider).record_failure()
+    
+    def release(self, provider: str):
+        """La consulta se omitió antes de llegar al proveedor (ver `CircuitBreaker.release`)"""
+        self.breaker(provider).release()
+    
+    def record_response(self, provider: str):
+        """
+        El proveedor respondió pero la consulta falló (4xx o respuesta
+        inesperada): no es un fallo del proveedor, así que cierra el
+        circuito sin registrar la latencia.
+        """
+        self.breaker(provider).record_success()
+    
+    def stats(self, default_timeout: float = 10) -> Dict[str, Dict[str, Any]]:
+        """Estado de cada proveedor (latencias en milisegundos)"""
+        result = {}
+        for provider, breaker in list(self.breakers.items()):
+            tracker = self._tracker(provider)
+            result[provider] = {
+                'state': breaker.state,
+                'failures': breaker.failures,
+                'rejected': breaker.rejected,
+                'hedged': self.hedged.get(provider, 0),
+                'timeout': round(self.timeout(provider, default_timeout), 2),
+                'p50_ms': round(tracker.p50 * 1000, 1) if tracker.p50 is not None else None,
+                'p95_ms': round(tracker.p95 * 1000, 1) if tracker.p95 is not None else None,
+            }
+        return result
+
+
+# Instancia global del estado de los proveedores
+provider_health = ProviderHealth()
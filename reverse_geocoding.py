@@ -0,0 +1,293 @@
+"""
+Geocodificación inversa asíncrona con caché espacial
+
+Convierte las coordenadas de una ubicación compartida en el nombre de
+una ciudad. Cada resultado se guarda en la celda de una rejilla junto
+con las coordenadas consultadas; una ubicación nueva se resuelve sin
+peticiones con el resultado más cercano de su celda o de las ocho
+vecinas, si está a menos de `REVERSE_GEOCODE_MAX_DISTANCE_KM`. Si no hay
+ninguno se consulta OpenWeatherMap y después Nominatim con httpx, sin
+bloquear el event loop. Con el diccionario geográfico local cargado
+(`GAZETTEER_PATH`) las ubicaciones cercanas a una ciudad conocida se
+resuelven antes, sin caché ni peticiones.
+"""
+import os
+import json
+import math
+import time
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from cache import weather_cache, LRUMemoryCache, run_blocking
+from gazetteer import gazetteer
+from http_session import http_sessions
+from metrics import metrics
+from quota import quota_manager
+from singleflight import AsyncSingleFlight
+
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distancia en kilómetros entre dos coordenadas"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class ReverseGeocoder:
+    """
+    Geocodificador inverso con caché por celdas (memoria y, si hay,
+    Redis). Las ubicaciones sin ciudad conocida también se cachean,
+    con un TTL más corto y solo para su propia celda.
+    """
+    
+    def __init__(self, redis_client=None):
+        self.grid_degrees = float(os.getenv('REVERSE_GEOCODE_GRID_DEGREES', '0.05'))
+        self.max_distance_km = float(os.getenv('REVERSE_GEOCODE_MAX_DISTANCE_KM', '3'))
+        self.ttl_seconds = int(os.getenv('REVERSE_GEOCODE_TTL_DAYS', '30')) * 86400
+        self.negative_ttl_seconds = int(os.getenv('REVERSE_GEOCODE_NEGATIVE_TTL_HOURS', '6')) * 3600
+        self.timeout = float(os.getenv('REVERSE_GEOCODE_TIMEOUT', '10'))
+        # Nominatim admite como mucho una petición por segundo
+        self.nominatim_interval = float(os.getenv('NOMINATIM_MIN_INTERVAL', '1'))
+        self.owm_key = os.getenv('OWM_KEY')
+        
+        self.redis_client = redis_client
+        self.memory = LRUMemoryCache(
+            max_entries=int(os.getenv('REVERSE_GEOCODE_MAX_ENTRIES', '5000')),
+            on_evict=lambda key, label: metrics.inc('weather_cache_evictions_total', data_type='reverse_geocoding')
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self._single_flight = AsyncSingleFlight()
+        self._nominatim_lock: Optional[asyncio.Lock] = None
+        self._nominatim_last = 0.0
+        
+        self.hits = 0
+        self.misses = 0
+    
+    # --- Caché espacial ---
+    
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        """Fila y columna de la celda (mismo ajuste que `cache.grid_cell`)"""
+        longitude = ((longitude + 180) % 360) - 180
+        return math.floor(latitude / self.grid_degrees + 0.5), math.floor(longitude / self.grid_degrees + 0.5)
+    
+    def _key(self, row: int, col: int) -> str:
+        # Las columnas dan la vuelta en el antimeridiano
+        columns = round(360 / self.grid_degrees)
+        col = (col + columns // 2) % columns - columns // 2
+        return f"revgeo:{self.grid_degrees:g}:{row}:{col}"
+    
+    def _neighbourhood(self, latitude: float, longitude: float) -> List[str]:
+        """Claves de la celda y sus ocho vecinas (la propia en el centro)"""
+        row, col = self._cell(latitude, longitude)
+        return [self._key(row + dr, col + dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1)]
+    
+    def _get_entries(self, keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        entries = [self.memory.get(key, count=False) for key in keys]
+        missing = [i for i, entry in enumerate(entries) if entry is None]
+        if not missing or not self.redis_client:
+            return entries
+        
+        try:
+            # Una sola ida y vuelta para todas las celdas que faltan
+            pipe = self.redis_client.pipeline()
+            for i in missing:
+                pipe.get(keys[i])
+                pipe.ttl(keys[i])
+            values = pipe.execute()
+            for i, raw, ttl in zip(missing, values[::2], values[1::2]):
+                if raw and ttl > 0:
+                    entries[i] = json.loads(raw)
+                    self.memory.set(keys[i], entries[i], ttl)
+        except Exception as e:
+            print(f"Error leyendo geocodificación inversa del caché: {e}")
+        return entries
+    
+    def _lookup_cached(self, latitude: float, longitude: float) -> Tuple[bool, Optional[str]]:
+        """(encontrada, nombre) usando el resultado más cercano de las celdas vecinas"""
+        entries = self._get_entries(self._neighbourhood(latitude, longitude))
+        
+        own = entries[4]
+        if own is not None and own['name'] is None:
+            return True, None
+        
+        best: Optional[Tuple[float, str]] = None
+        for entry in entries:
+            if not entry or not entry['name']:
+                continue
+            distance = haversine_km(latitude, longitude, entry['lat'], entry['lon'])
+            if distance <= self.max_distance_km and (best is None or distance < best[0]):
+                best = (distance, entry['name'])
+        
+        if best is None:
+            return False, None
+        return True, best[1]
+    
+    async def _call_async(self, function, *args):
+        """Con Redis, las operaciones del caché (redis-py, bloqueantes) se hacen en un hilo"""
+        if not self.redis_client:
+            return function(*args)
+        return await run_blocking(function, *args)
+    
+    def _store(self, latitude: float, longitude: float, name: Optional[str]):
+        row, col = self._cell(latitude, longitude)
+        key = self._key(row, col)
+        entry = {'name': name, 'lat': latitude, 'lon': longitude}
+        ttl = self.ttl_seconds if name is not None else self.negative_ttl_seconds
+        
+        self.memory.set(key, entry, ttl)
+        if self.redis_client:
+            try:
+                self.redis_client.setex(key, ttl, json.dumps(entry))
+            except Exception as e:
+                print(f"Error guardando geocodificación inversa en caché: {e}")
+    
+    # --- Consultas ---
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = http_sessions.create_async_client(self.timeout)
+        return self._client
+    
+    async def aclose(self):
+        """Cierra el cliente HTTP subyacente"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def _call_quota(self, function, *args):
+        """Operaciones de cuota sin bloquear el event loop (con el backend Redis, en un hilo)"""
+        if quota_manager.backend != 'redis':
+            return function(*args)
+        return await run_blocking(function, *args)
+    
+    async def _take_retry_quota(self) -> bool:
+        """Cada reintento ante un 429/5xx es otra llamada a OpenWeatherMap"""
+        allowed, _ = await self._call_quota(quota_manager.acquire, 'openweathermap')
+        if not allowed:
+            await self._call_quota(quota_manager.record_skip, 'openweathermap')
+        return allowed
+    
+    async def _query_openweathermap(self, latitude: float, longitude: float) -> Tuple[bool, Optional[str]]:
+        if not self.owm_key or self.owm_key == 'your_openweathermap_api_key_here':
+            return False, None
+        
+        allowed, _ = await self._call_quota(quota_manager.acquire, 'openweathermap')
+        if not allowed:
+            await self._call_quota(quota_manager.record_skip, 'openweathermap')
+            return False, None
+        
+        with http_sessions.guard_retries(self._take_retry_quota):
+            response = await http_sessions.async_get(
+                self._get_client(), "http://api.openweathermap.org/geo/1.0/reverse",
+                params={'lat': latitude, 'lon': longitude, 'limit': 1, 'appid': self.owm_key}
+            )
+        if response.status_code != 200:
+            return False, None
+        
+        data = response.json()
+        if not data:
+            return True, None
+        city = data[0].get('name', '')
+        country = data[0].get('country', '')
+        if not city:
+            return True, None
+        return True, f"{city}, {country}" if country else city
+    
+    async def _query_nominatim(self, latitude: float, longitude: float) -> Tuple[bool, Optional[str]]:
+        # Nominatim (OpenStreetMap): gratuito pero con límites de uso
+        if self._nominatim_lock is None:
+            self._nominatim_lock = asyncio.Lock()
+        async with self._nominatim_lock:
+            wait = self._nominatim_last + self.nominatim_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._nominatim_last = time.monotonic()
+        
+        response = await http_sessions.async_get(
+            self._get_client(), "https://nominatim.openstreetmap.org/reverse",
+            params={'format': 'json', 'lat': latitude, 'lon': longitude, 'zoom': 10, 'addressdetails': 1},
+            headers={'User-Agent': 'UniversalWeatherBot/1.0'}
+        )
+        if response.status_code != 200:
+            return False, None
+        
+        address = response.json().get('address', {})
+        
+        # Intentar obtener la ciudad de diferentes campos
+        city = (address.get('city') or
+                address.get('town') or
+                address.get('village') or
+                address.get('municipality') or
+                address.get('county'))
+        country = address.get('country')
+        
+        if city:
+            return True, f"{city}, {country}" if country else city
+        return True, country
+    
+    async def _resolve(self, latitude: float, longitude: float) -> Optional[str]:
+        """Consulta los servicios en orden y cachea la respuesta"""
+        self.misses += 1
+        answered = False
+        
+        for service, query in (('openweathermap', self._query_openweathermap),
+                               ('nominatim', self._query_nominatim)):
+            start = time.perf_counter()
+            try:
+                source_answered, name = await query(latitude, longitude)
+            except Exception as e:
+                print(f"Error en geocodificación inversa: {e}")
+                continue
+            finally:
+                metrics.observe('weather_geocoding_seconds', time.perf_counter() - start,
+                                direction='reverse', service=service)
+            
+            answered = answered or source_answered
+            if name:
+                await self._call_async(self._store, latitude, longitude, name)
+                return name
+        
+        # Solo se cachea "sin ciudad" si algún servicio respondió así
+        if answered:
+            await self._call_async(self._store, latitude, longitude, None)
+        return None
+    
+    async def lookup(self, latitude: float, longitude: float) -> Optional[str]:
+        """Nombre de la ciudad ("Ciudad, País") en unas coordenadas, o None"""
+        # Diccionario geográfico local: sin caché ni peticiones
+        start = time.perf_counter()
+        city_info = gazetteer.nearest(latitude, longitude)
+        if city_info:
+            metrics.observe('weather_geocoding_seconds', time.perf_counter() - start,
+                            direction='reverse', service='gazetteer')
+            return f"{city_info.name}, {city_info.country}" if city_info.country else city_info.name
+        
+        found, name = await self._call_async(self._lookup_cached, latitude, longitude)
+        metrics.inc('weather_cache_requests_total', data_type='reverse_geocoding', result='hit' if found else 'miss')
+        if found:
+            self.hits += 1
+            return name
+        
+        # Ubicaciones de la misma celda a la vez comparten una consulta
+        return await self._single_flight.do(
+            self._neighbourhood(latitude, longitude)[4],
+            self._resolve, latitude, longitude
+        )
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self.memory),
+        }
+
+
+# Instancia global del geocodificador inverso
+reverse_geocoder = ReverseGeocoder(weather_cache.redis_client if weather_cache.use_redis else None)
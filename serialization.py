@@ -0,0 +1,213 @@
+"""
+Serialización de WeatherData para el caché
+
+- JsonSerializer: JSON legible, con validación completa al leer.
+- BinarySerializer: formato columnar compacto (segundos epoch y valores
+  en centésimas int16 por campo) que se copia directamente desde y hacia
+  las columnas de las series, sin revalidar, ya que los datos del caché
+  son de confianza.
+"""
+import sys
+import json
+import math
+import struct
+from array import array
+from typing import Dict, List, Tuple
+
+from models import WeatherData, HourlySeries, DailySeries
+from series import ForecastSeries, split_datetime, to_datetime
+
+
+class JsonSerializer:
+    """Serializador JSON (formato original del caché)"""
+    
+    name = 'json'
+    
+    def dumps(self, weather_data: WeatherData) -> bytes:
+        return json.dumps(weather_data.dict(), default=str).encode('utf-8')
+    
+    def loads(self, raw: bytes) -> WeatherData:
+        return WeatherData(**json.loads(raw))
+
+
+_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+def _pack_array(typecode: str, values) -> bytes:
+    column = array(typecode, values)
+    if not _LITTLE_ENDIAN:
+        column.byteswap()
+    return column.tobytes()
+
+
+def _unpack_array(typecode: str, raw: memoryview, offset: int, count: int) -> Tuple[array, int]:
+    column = array(typecode)
+    size = column.itemsize * count
+    column.frombytes(raw[offset:offset + size])
+    if not _LITTLE_ENDIAN:
+        column.byteswap()
+    return column, offset + size
+
+
+# Los valores se guardan en centésimas (int16) si vuelven exactamente al
+# mismo float; si no (p. ej. km/h convertidos a m/s), en float64
+SCALE = 100
+
+
+def _pack_column(values) -> bytes:
+    scaled = []
+    for value in values:
+        try:
+            hundredths = round(value * SCALE)
+        except (ValueError, OverflowError):
+            break
+        # -0.0 se muestra distinto de 0.0
+        if (not -32768 <= hundredths <= 32767 or hundredths / SCALE != value
+                or math.copysign(1.0, value) < 0 < math.copysign(1.0, hundredths)):
+            break
+        scaled.append(hundredths)
+    else:
+        return b'h' + _pack_array('h', scaled)
+    return b'd' + _pack_array('d', values)
+
+
+def _unpack_column(raw: memoryview, offset: int, count: int) -> Tuple[List[float], int]:
+    typecode = chr(raw[offset])
+    column, offset = _unpack_array(typecode, raw, offset + 1, count)
+    if typecode == 'h':
+        return [value / SCALE for value in column], offset
+    return column, offset
+
+
+def _pack_str(value: str) -> bytes:
+    encoded = value.encode('utf-8')
+    return struct.pack('<H', len(encoded)) + encoded
+
+
+def _unpack_str(raw: memoryview, offset: int) -> Tuple[str, int]:
+    (length,) = struct.unpack_from('<H', raw, offset)
+    offset += 2
+    return bytes(raw[offset:offset + length]).decode('utf-8'), offset + length
+
+
+class BinarySerializer:
+    """
+    Serializador binario columnar.
+    
+    Estructura (little-endian):
+        magic | city | country | timezone | last_updated
+        tabla de fuentes (nombres internados, referenciados por índice)
+        horario: n | epoch int64[n] | offset int16[n] | fuente uint8[n]
+                 | temperature, precipitation, wind_speed columna[n]
+        diario:  n | epoch int64[n] | offset int16[n] | fuente uint8[n]
+                 | temp_min, temp_max, precipitation, wind_speed columna[n]
+        columna: tipo ('h' centésimas int16 o 'd' float64) | valores
+    
+    Cada valor se lee como el mismo float que se guardó, así que una
+    respuesta desde el caché se muestra igual que una recién descargada.
+    """
+    
+    name = 'binary'
+    MAGIC = b'WDB2'
+    
+    def dumps(self, weather_data: WeatherData) -> bytes:
+        sources: List[str] = []
+        source_ids: Dict[str, int] = {}
+        
+        def table_ids(series: ForecastSeries) -> List[int]:
+            """Índices de la fuente de cada fila en la tabla común"""
+            remap = []
+            for source in series.sources:
+                if source not in source_ids:
+                    source_ids[source] = len(sources)
+                    sources.append(source)
+                remap.append(source_ids[source])
+            return [remap[source_id] for source_id in series.source_ids]
+        
+        hourly = weather_data.hourly
+        daily = weather_data.daily
+        hourly_sources = table_ids(hourly)
+        daily_sources = table_ids(daily)
+        
+        updated_seconds, updated_minutes = split_datetime(weather_data.last_updated)
+        
+        parts = [
+            self.MAGIC,
+            _pack_str(weather_data.city),
+            _pack_str(weather_data.country),
+            _pack_str(weather_data.timezone),
+            struct.pack('<qih', updated_seconds, weather_data.last_updated.microsecond, updated_minutes),
+            struct.pack('<B', len(sources)),
+        ]
+        parts.extend(_pack_str(source) for source in sources)
+        
+        for series, series_sources in ((hourly, hourly_sources), (daily, daily_sources)):
+            parts.append(struct.pack('<I', len(series)))
+            parts.append(_pack_array('q', series.seconds))
+            parts.append(_pack_array('h', series.offsets))
+            parts.append(_pack_array('B', series_sources))
+            parts.extend(_pack_column(column) for column in series.columns)
+        
+        return b''.join(parts)
+    
+    @staticmethod
+    def _unpack_series(series_cls, sources: List[str], view: memoryview, offset: int) -> Tuple[ForecastSeries, int]:
+        (n,) = struct.unpack_from('<I', view, offset)
+        offset += 4
+        seconds, offset = _unpack_array('q', view, offset, n)
+        minutes, offset = _unpack_array('h', view, offset, n)
+        source_idx, offset = _unpack_array('B', view, offset, n)
+        columns = []
+        for _ in series_cls.fields:
+            column, offset = _unpack_column(view, offset, n)
+            columns.append(column)
+        
+        return series_cls.from_columns(seconds, minutes, sources, source_idx, columns), offset
+    
+    def loads(self, raw: bytes) -> WeatherData:
+        view = memoryview(raw)
+        if bytes(view[:4]) != self.MAGIC:
+            raise ValueError("Formato binario de caché desconocido")
+        
+        offset = 4
+        city, offset = _unpack_str(view, offset)
+        country, offset = _unpack_str(view, offset)
+        tz_name, offset = _unpack_str(view, offset)
+        updated_seconds, updated_micro, updated_minutes = struct.unpack_from('<qih', view, offset)
+        offset += struct.calcsize('<qih')
+        
+        (source_count,) = struct.unpack_from('<B', view, offset)
+        offset += 1
+        sources = []
+        for _ in range(source_count):
+            source, offset = _unpack_str(view, offset)
+            sources.append(source)
+        
+        # Datos de confianza: las columnas pasan a las series sin validación
+        hourly, offset = self._unpack_series(HourlySeries, sources, view, offset)
+        daily, offset = self._unpack_series(DailySeries, sources, view, offset)
+        
+        last_updated = to_datetime(updated_seconds, updated_minutes).replace(microsecond=updated_micro)
+        
+        return WeatherData.model_construct(
+            city=city,
+            country=country,
+            timezone=tz_name,
+            hourly=hourly,
+            daily=daily,
+            last_updated=last_updated
+        )
+
+
+SERIALIZERS = {
+    JsonSerializer.name: JsonSerializer,
+    BinarySerializer.name: BinarySerializer,
+}
+
+
+def get_serializer(name: str):
+    """Devuelve el serializador por nombre ('json' o 'binary')"""
+    try:
+        return SERIALIZERS[name.lower()]()
+    except KeyError:
+        raise ValueError(f"Serializador de caché desconocido: {name}")
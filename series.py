@@ -0,0 +1,205 @@
+"""
+Series de pronóstico compactas
+
+En lugar de un modelo de Pydantic por cada hora o día, una serie guarda
+sus datos en columnas (`array`): segundos de reloj desde epoch, offset
+de la zona horaria en minutos, índice de la fuente (los nombres se
+internan una sola vez por serie) y un float64 por campo numérico.
+
+Pydantic solo interviene en los bordes: al validar datos externos (p.
+ej. el JSON del caché) y al exportar con `.dict()`. La resolución de
+los instantes es el segundo y la de los offsets, el minuto.
+"""
+import sys
+import calendar
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+from pydantic_core import core_schema
+
+
+# Marcador de datetime sin zona horaria en la columna de offsets
+NAIVE = -32768
+EPOCH = datetime(1970, 1, 1)
+
+
+def split_datetime(dt: datetime) -> Tuple[int, int]:
+    """Devuelve (segundos de reloj local desde epoch, offset en minutos)"""
+    offset = dt.utcoffset()
+    minutes = NAIVE if offset is None else int(offset.total_seconds() // 60)
+    return calendar.timegm(dt.timetuple()), minutes
+
+
+# Datetimes ya decodificados: las mismas horas se repiten entre series
+# y los datetime son inmutables, así que se pueden compartir
+_DATETIMES: Dict[Tuple[int, int], datetime] = {}
+_DATETIMES_MAX = 8192
+_ZONES: Dict[int, timezone] = {}
+
+
+def to_datetime(seconds: int, minutes: int) -> datetime:
+    """Inverso de `split_datetime`"""
+    key = (seconds, minutes)
+    dt = _DATETIMES.get(key)
+    if dt is not None:
+        return dt
+    
+    dt = EPOCH + timedelta(seconds=seconds)
+    if minutes != NAIVE:
+        zone = _ZONES.get(minutes)
+        if zone is None:
+            zone = _ZONES[minutes] = timezone(timedelta(minutes=minutes))
+        dt = dt.replace(tzinfo=zone)
+    
+    if len(_DATETIMES) >= _DATETIMES_MAX:
+        _DATETIMES.clear()
+    _DATETIMES[key] = dt
+    return dt
+
+
+class ForecastSeries:
+    """
+    Serie columnar de datos meteorológicos.
+    
+    Las subclases definen `fields` (columnas numéricas), `point` (la
+    NamedTuple que se devuelve al indexar o iterar, con el instante
+    primero y la fuente al final) y `row_model` (el modelo de Pydantic
+    que valida los datos externos).
+    """
+    
+    __slots__ = ('seconds', 'offsets', 'source_ids', 'sources', '_source_index', 'columns')
+    
+    fields: Tuple[str, ...] = ()
+    point: Any = None
+    row_model: Any = None
+    
+    def __init__(self):
+        self.seconds = array('q')
+        self.offsets = array('h')
+        self.source_ids = array('H')
+        self.sources: List[str] = []
+        self._source_index: Dict[str, int] = {}
+        self.columns = tuple(array('d') for _ in self.fields)
+    
+    def _source_id(self, source: str) -> int:
+        source_id = self._source_index.get(source)
+        if source_id is None:
+            source_id = self._source_index[source] = len(self.sources)
+            self.sources.append(sys.intern(source))
+        return source_id
+    
+    def _append(self, when: datetime, source: str, values: Sequence[Any]):
+        # Convertir todo antes de tocar las columnas, para que un valor
+        # inválido no deje la serie a medias
+        numbers = [float(value) for value in values]
+        seconds, minutes = split_datetime(when)
+        source_id = self._source_id(source)
+        
+        self.seconds.append(seconds)
+        self.offsets.append(minutes)
+        self.source_ids.append(source_id)
+        for column, number in zip(self.columns, numbers):
+            column.append(number)
+    
+    @classmethod
+    def from_columns(cls, seconds: array, offsets: array, sources: List[str],
+                     source_ids: Sequence[int], columns: Sequence[Sequence[float]]) -> 'ForecastSeries':
+        """Construye la serie a partir de columnas ya decodificadas (datos de confianza)"""
+        series = cls()
+        series.seconds = seconds
+        series.offsets = offsets
+        series.source_ids = array('H', source_ids)
+        series.sources = [sys.intern(source) for source in sources]
+        series._source_index = {source: i for i, source in enumerate(series.sources)}
+        series.columns = tuple(array('d', column) for column in columns)
+        return series
+    
+    @classmethod
+    def from_rows(cls, rows) -> 'ForecastSeries':
+        """Construye la serie desde puntos, modelos o dicts (estos se validan)"""
+        series = cls()
+        time_field = cls.point._fields[0]
+        for row in rows:
+            if isinstance(row, dict):
+                row = cls.row_model(**row)
+            series._append(getattr(row, time_field), row.source, [getattr(row, field) for field in cls.fields])
+        return series
+    
+    def __len__(self) -> int:
+        return len(self.seconds)
+    
+    def _point(self, index: int):
+        return self.point(
+            to_datetime(self.seconds[index], self.offsets[index]),
+            *[column[index] for column in self.columns],
+            self.sources[self.source_ids[index]]
+        )
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._point(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("índice fuera de la serie")
+        return self._point(index)
+    
+    def __iter__(self) -> Iterator[Any]:
+        for index in range(len(self)):
+            yield self._point(index)
+    
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ForecastSeries):
+            return NotImplemented
+        return (
+            type(self) is type(other)
+            and self.seconds == other.seconds
+            and self.offsets == other.offsets
+            and self.columns == other.columns
+            and self.source_names() == other.source_names()
+        )
+    
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({len(self)} filas, fuentes={self.sources})"
+    
+    def column(self, field: str) -> array:
+        """Columna de un campo numérico"""
+        return self.columns[self.fields.index(field)]
+    
+    def source_names(self) -> List[str]:
+        """Fuente de cada fila"""
+        sources = self.sources
+        return [sources[source_id] for source_id in self.source_ids]
+    
+    def utc_seconds(self) -> List[int]:
+        """Instante de cada fila en UTC (o de reloj si no tiene zona)"""
+        return [
+            seconds if minutes == NAIVE else seconds - minutes * 60
+            for seconds, minutes in zip(self.seconds, self.offsets)
+        ]
+    
+    def to_models(self) -> list:
+        """Filas como modelos de Pydantic (para exponerlas fuera del bot)"""
+        return [self.row_model(**point._asdict()) for point in self]
+    
+    # --- Integración con Pydantic ---
+    
+    @classmethod
+    def _validate(cls, value: Any) -> 'ForecastSeries':
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, (list, tuple)):
+            return cls.from_rows(value)
+        raise ValueError(f"Se esperaba {cls.__name__} o una lista de filas")
+    
+    @staticmethod
+    def _serialize(series: 'ForecastSeries') -> List[Dict[str, Any]]:
+        return [point._asdict() for point in series]
+    
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source_type: Any, handler: Any) -> core_schema.CoreSchema:
+        return core_schema.no_info_plain_validator_function(
+            cls._validate,
+            serialization=core_schema.plain_serializer_function_ser_schema(cls._serialize)
+        )
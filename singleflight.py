@@ -0,0 +1,157 @@
+"""
+Coalescencia de peticiones concurrentes idénticas (single-flight)
+
+Cuando varias llamadas piden lo mismo a la vez (por ejemplo muchos
+usuarios con `/tiempo Montevideo` tras expirar el caché), solo la
+primera llega al proveedor; el resto espera y comparte su resultado.
+
+También incluye refrescos en segundo plano deduplicados, usados para
+revalidar entradas viejas del caché (stale-while-revalidate).
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+
+class _Call:
+    """Llamada en curso compartida entre hilos"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Single-flight para código síncrono (hilos)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Ejecuta `fn` una sola vez por clave entre llamadas concurrentes.
+
+        Las llamadas que llegan mientras hay otra en curso con la misma
+        clave esperan y reciben el mismo resultado (o excepción).
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def in_flight(self) -> int:
+        """Número de llamadas en curso"""
+        return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """Single-flight para corutinas (un único event loop)"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> Any:
+        """
+        Ejecuta la corutina `fn` una sola vez por clave.
+
+        La llamada compartida está protegida con `asyncio.shield`: si un
+        llamador se cancela (por ejemplo por el plazo del agregador), la
+        petición sigue en curso para el resto y su resultado se cachea.
+        """
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn(*args, **kwargs))
+            self._calls[key] = future
+            future.add_done_callback(lambda f: self._forget(key, f))
+
+        return await asyncio.shield(future)
+
+    def _forget(self, key: Hashable, future: asyncio.Future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        # Marca la excepción como recuperada aunque todos los llamadores
+        # se hayan cancelado, para no ensuciar el log del event loop
+        if not future.cancelled():
+            future.exception()
+
+    def in_flight(self) -> int:
+        """Número de llamadas en curso"""
+        return len(self._calls)
+
+
+class BackgroundRefresh:
+    """
+    Ejecuta refrescos en segundo plano sin duplicarlos.
+
+    Si ya hay un refresco en curso para una clave, las nuevas
+    solicitudes se ignoran hasta que termine.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='weather-refresh')
+        self._lock = threading.Lock()
+        self._pending: Set[Hashable] = set()
+
+    def submit(self, key: Hashable, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> bool:
+        """Programa `fn` si no hay otro refresco con la misma clave; devuelve si se programó"""
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+
+        def run():
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                print(f"Error refrescando {key}: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+        self._executor.submit(run)
+        return True
+
+
+class AsyncBackgroundRefresh:
+    """Equivalente de BackgroundRefresh para corutinas"""
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    def submit(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> bool:
+        """Crea una tarea para `fn` si no hay otra con la misma clave; devuelve si se creó"""
+        if key in self._tasks:
+            return False
+
+        async def run():
+            try:
+                await fn(*args, **kwargs)
+            except Exception as e:
+                print(f"Error refrescando {key}: {e}")
+            finally:
+                self._tasks.pop(key, None)
+
+        self._tasks[key] = asyncio.get_running_loop().create_task(run())
+        return True
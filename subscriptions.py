@@ -0,0 +1,240 @@
+"""
+Suscripciones a pronósticos diarios y su programación en la JobQueue
+
+Cada chat puede suscribirse a una o más ciudades con una hora local de
+envío. Las suscripciones con la misma hora y zona horaria comparten un
+trabajo diario; al ejecutarse se agrupan por ciudad, se consulta cada
+ciudad una sola vez y los mensajes salen por un emisor con límite de
+frecuencia.
+"""
+import os
+import re
+import json
+import threading
+from datetime import time, timedelta, timezone, tzinfo
+from typing import Callable, Dict, List, Optional
+
+import pytz
+from telegram.ext import Application, ContextTypes
+
+from models import Subscription, WeatherData
+from aggregator import async_weather_aggregator
+from cache import weather_cache
+from delivery import RateLimitedSender
+from prewarm import cache_prewarmer
+
+_TIME_PATTERN = re.compile(r'^([01]?\d|2[0-3]):([0-5]\d)$')
+_UTC_OFFSET_PATTERN = re.compile(r'^UTC(?:([+-]\d{1,2})(?::?([0-5]\d))?)?$', re.IGNORECASE)
+
+
+def parse_send_time(value: str) -> Optional[str]:
+    """Normaliza una hora HH:MM (None si no es válida)"""
+    match = _TIME_PATTERN.match(value.strip())
+    if not match:
+        return None
+    return f"{int(match.group(1)):02d}:{match.group(2)}"
+
+
+def parse_timezone(name: str) -> tzinfo:
+    """
+    Convierte un nombre de zona horaria en tzinfo.
+    
+    Acepta nombres IANA ("America/Montevideo") y desplazamientos fijos
+    como los de CityInfo ("UTC-3", "UTC+5:30").
+    """
+    match = _UTC_OFFSET_PATTERN.match(name.strip())
+    if match:
+        hours = match.group(1) or '+0'
+        offset = timedelta(hours=abs(int(hours)), minutes=int(match.group(2) or 0))
+        return timezone(-offset if hours.startswith('-') else offset)
+    
+    try:
+        return pytz.timezone(name.strip())
+    except pytz.UnknownTimeZoneError:
+        raise ValueError(f"Zona horaria desconocida: {name}")
+
+
+class SubscriptionStore:
+    """
+    Almacén de suscripciones (una por chat y hora de envío)
+    
+    Backends: memoria, Redis (hash `subscriptions`) o disco (JSON).
+    """
+    
+    def __init__(self, redis_client=None):
+        self.backend = os.getenv('SUBSCRIPTIONS_BACKEND', 'redis' if redis_client else 'disk').lower()
+        self.path = os.getenv('SUBSCRIPTIONS_PATH', 'subscriptions.json')
+        self.redis_client = redis_client
+        self.redis_key = 'subscriptions'
+        self.entries: Dict[str, Subscription] = {}
+        self._lock = threading.Lock()
+        
+        if self.backend == 'redis' and not self.redis_client:
+            print("❌ Redis no disponible para suscripciones, usando disco")
+            self.backend = 'disk'
+        
+        self._load()
+    
+    @staticmethod
+    def _get_key(chat_id: int, send_time: str) -> str:
+        return f"{chat_id}:{send_time}"
+    
+    def add(self, subscription: Subscription):
+        """Guarda una suscripción (reemplaza la del mismo chat y hora)"""
+        key = self._get_key(subscription.chat_id, subscription.send_time)
+        with self._lock:
+            self.entries[key] = subscription
+            self._persist(key, subscription)
+    
+    def remove(self, chat_id: int, send_time: Optional[str] = None) -> int:
+        """Elimina las suscripciones de un chat (todas o la de una hora); devuelve cuántas"""
+        with self._lock:
+            keys = [
+                key for key, subscription in self.entries.items()
+                if subscription.chat_id == chat_id and send_time in (None, subscription.send_time)
+            ]
+            for key in keys:
+                del self.entries[key]
+                self._persist(key, None)
+        return len(keys)
+    
+    def for_chat(self, chat_id: int) -> List[Subscription]:
+        with self._lock:
+            return sorted(
+                (subscription for subscription in self.entries.values() if subscription.chat_id == chat_id),
+                key=lambda subscription: subscription.send_time
+            )
+    
+    def all(self) -> List[Subscription]:
+        with self._lock:
+            return list(self.entries.values())
+    
+    def _load(self):
+        """Carga las suscripciones persistidas"""
+        try:
+            if self.backend == 'redis':
+                raw_entries = {
+                    key.decode() if isinstance(key, bytes) else key: json.loads(value)
+                    for key, value in self.redis_client.hgetall(self.redis_key).items()
+                }
+            elif self.backend == 'disk' and os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    raw_entries = json.load(f)
+            else:
+                raw_entries = {}
+            
+            self.entries = {key: Subscription(**data) for key, data in raw_entries.items()}
+            if self.entries:
+                print(f"📬 {len(self.entries)} suscripciones cargadas")
+        except Exception as e:
+            print(f"Error cargando suscripciones: {e}")
+            self.entries = {}
+    
+    def _persist(self, key: str, subscription: Optional[Subscription]):
+        """Guarda un cambio en el backend (None = eliminada)"""
+        try:
+            if self.backend == 'redis':
+                if subscription is None:
+                    self.redis_client.hdel(self.redis_key, key)
+                else:
+                    self.redis_client.hset(self.redis_key, key, json.dumps(subscription.dict()))
+            elif self.backend == 'disk':
+                # Escritura atómica del fichero completo
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(
+                        {k: s.dict() for k, s in self.entries.items()},
+                        f, ensure_ascii=False
+                    )
+                os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Error guardando suscripciones: {e}")
+
+
+class BroadcastScheduler:
+    """
+    Programa los envíos diarios de las suscripciones en la JobQueue.
+    
+    Hay un trabajo por cada combinación de hora y zona horaria; se
+    sincronizan con `sync_jobs` cada vez que cambian las suscripciones.
+    """
+    
+    JOB_PREFIX = 'broadcast:'
+    
+    def __init__(self, application: Application, store: SubscriptionStore,
+                 formatter: Callable[[Subscription, WeatherData], str]):
+        self.application = application
+        self.store = store
+        self.formatter = formatter
+        self.sender = RateLimitedSender(application.bot)
+        # Suscripciones fijas de la configuración (no se persisten)
+        self.static: List[Subscription] = []
+    
+    def subscriptions(self) -> List[Subscription]:
+        return self.static + self.store.all()
+    
+    def _job_name(self, subscription: Subscription) -> str:
+        return f"{self.JOB_PREFIX}{subscription.send_time}@{subscription.timezone}"
+    
+    def sync_jobs(self):
+        """Crea o elimina trabajos diarios según las suscripciones actuales"""
+        job_queue = self.application.job_queue
+        if job_queue is None:
+            print("❌ JobQueue no disponible: instala python-telegram-bot[job-queue]")
+            return
+        
+        wanted = {self._job_name(subscription): subscription for subscription in self.subscriptions()}
+        existing = set()
+        
+        for job in job_queue.jobs():
+            if not job.name or not job.name.startswith(self.JOB_PREFIX):
+                continue
+            if job.name in wanted:
+                existing.add(job.name)
+            else:
+                job.schedule_removal()
+        
+        for name, subscription in wanted.items():
+            if name in existing:
+                continue
+            hour, minute = map(int, subscription.send_time.split(':'))
+            job_queue.run_daily(
+                self._run_job,
+                time=time(hour, minute, tzinfo=parse_timezone(subscription.timezone)),
+                name=name,
+                data=(subscription.send_time, subscription.timezone)
+            )
+    
+    async def _run_job(self, context: ContextTypes.DEFAULT_TYPE):
+        send_time, tz_name = context.job.data
+        due = [
+            subscription for subscription in self.subscriptions()
+            if subscription.send_time == send_time and subscription.timezone == tz_name
+        ]
+        sent = await self.broadcast(due)
+        print(f"📨 {sent}/{len(due)} pronósticos programados enviados ({send_time} {tz_name})")
+    
+    async def broadcast(self, subscriptions: List[Subscription]) -> int:
+        """Consulta cada ciudad una vez y envía el pronóstico a cada chat"""
+        if not subscriptions:
+            return 0
+        
+        for subscription in subscriptions:
+            cache_prewarmer.record(subscription.city)
+        
+        batch = await async_weather_aggregator.get_aggregated_weather_batch(
+            [subscription.city for subscription in subscriptions]
+        )
+        for city, error in batch.errors.items():
+            print(f"❌ Sin pronóstico programado para {city}: {error}")
+        
+        messages = [
+            (subscription.chat_id, self.formatter(subscription, batch.results[subscription.city]))
+            for subscription in subscriptions
+            if subscription.city in batch.results
+        ]
+        return await self.sender.send_many(messages)
+
+
+# Instancia global del almacén de suscripciones
+subscription_store = SubscriptionStore(weather_cache.redis_client if weather_cache.use_redis else None)
@@ -0,0 +1,149 @@
+"""
+Quórum, fuentes tardías y peticiones cubiertas, con proveedores simulados
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import aggregator
+import fetcher
+from aggregator import AsyncWeatherAggregator
+from cache import WeatherCache
+from fetcher import AsyncWeatherFetcher
+from models import CityInfo, WeatherData
+from quota import QuotaManager
+from resilience import provider_health
+
+CITY = 'Montevideo'
+CITY_INFO = CityInfo(name=CITY, country='UY', latitude=-34.9058, longitude=-56.1913, timezone='UTC-3')
+LABELS = {'openweathermap': 'OpenWeatherMap', 'metno': 'MET Norway', 'weatherapi': 'WeatherAPI'}
+
+
+@pytest.fixture
+def weather_cache(monkeypatch):
+    monkeypatch.delenv('REDIS_URL', raising=False)
+    cache = WeatherCache()
+    monkeypatch.setattr(aggregator, 'weather_cache', cache)
+    return cache
+
+
+def stub_aggregator(monkeypatch, weather_cache, delays):
+    """Agregador cuyas fuentes responden tras `delays[proveedor]` segundos y se guardan en caché"""
+    async def get_city_info(city):
+        return CITY_INFO
+    
+    def stub(provider, delay):
+        async def fetch(city, city_info=None):
+            await asyncio.sleep(delay)
+            weather_data = WeatherData(city=CITY, country='UY', timezone='UTC-3')
+            weather_data.hourly.add(datetime(2026, 10, 17, 9), 10.0 + len(provider), 0.0, 3.0, LABELS[provider])
+            weather_cache.set_weather(city, provider, weather_data, ttl_seconds=1800)
+            return weather_data
+        return fetch
+    
+    monkeypatch.setattr(aggregator.async_weather_fetcher, 'get_city_info', get_city_info)
+    weather_aggregator = AsyncWeatherAggregator()
+    weather_aggregator.concurrent = True
+    weather_aggregator.deadline = 5
+    weather_aggregator.quorum_sources = 0
+    weather_aggregator.quorum_deadline = 0
+    weather_aggregator.quorum_weight = 0.5
+    weather_aggregator.partial_ttl = 60
+    fetchers = {provider: stub(provider, delay) for provider, delay in delays.items()}
+    monkeypatch.setattr(weather_aggregator, '_get_fetchers', lambda: fetchers)
+    monkeypatch.setattr(weather_aggregator, 'enabled_providers', lambda: sorted(fetchers))
+    return weather_aggregator
+
+
+def source_count(weather_data: WeatherData) -> str:
+    return weather_data.hourly[0].source
+
+
+def test_returns_once_the_quorum_weight_is_reached(monkeypatch, weather_cache):
+    weather_aggregator = stub_aggregator(monkeypatch, weather_cache,
+                                         {'openweathermap': 0.01, 'metno': 0.01, 'weatherapi': 2})
+    
+    async def run():
+        start = time.monotonic()
+        weather_data = await weather_aggregator.get_aggregated_weather(CITY)
+        elapsed = time.monotonic() - start
+        for task in list(weather_aggregator._refresh._tasks.values()):
+            task.cancel()
+        return weather_data, elapsed
+    
+    weather_data, elapsed = asyncio.run(run())
+    
+    # OpenWeatherMap y MET Norway suman 0.5 de 0.7: más de la mitad del peso
+    assert elapsed < 1
+    assert source_count(weather_data) == 'Agregado (2 fuentes)'
+
+
+def test_late_source_updates_the_cached_aggregate(monkeypatch, weather_cache):
+    weather_aggregator = stub_aggregator(monkeypatch, weather_cache,
+                                         {'openweathermap': 0.01, 'metno': 0.01, 'weatherapi': 0.2})
+    data_type = weather_aggregator.aggregated_data_type()
+    
+    async def run():
+        first = await weather_aggregator.get_aggregated_weather(CITY)
+        partial = weather_cache.get_ttl(CITY, data_type)
+        await asyncio.gather(*weather_aggregator._refresh._tasks.values())
+        return first, partial
+    
+    first, partial_ttl = asyncio.run(run())
+    cached, stale = weather_cache.get_weather_entry(CITY, data_type)
+    
+    assert source_count(first) == 'Agregado (2 fuentes)'
+    assert source_count(cached) == 'Agregado (3 fuentes)'
+    assert not stale
+    # Con una fuente de menos el agregado vive `partial_ttl`; completo, lo que sus fuentes
+    assert 50 < partial_ttl <= 60
+    assert weather_cache.get_ttl(CITY, data_type) > 1700
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    monkeypatch.setattr(provider_health, 'hedge_delay', lambda provider: 0.05)
+    monkeypatch.setenv('QUOTA_BACKEND', 'memory')
+    
+    def quotas(per_day: int) -> QuotaManager:
+        monkeypatch.setenv('QUOTA_WEATHERAPI_PER_DAY', str(per_day))
+        manager = QuotaManager()
+        monkeypatch.setattr(fetcher, 'quota_manager', manager)
+        return manager
+    return quotas
+
+
+def slow_first_call():
+    calls = []
+    
+    async def call():
+        calls.append(time.monotonic())
+        await asyncio.sleep(1 if len(calls) == 1 else 0.01)
+        return len(calls)
+    return call, calls
+
+
+def test_hedged_duplicate_acquires_quota(hedging):
+    quotas = hedging(10)
+    hedged_before = provider_health.hedged.get('weatherapi', 0)
+    call, calls = slow_first_call()
+    
+    result = asyncio.run(AsyncWeatherFetcher()._hedged('weatherapi', call))
+    
+    assert result == 2
+    assert len(calls) == 2
+    assert quotas.status()['weatherapi']['windows']['day']['used'] == 1
+    assert provider_health.hedged['weatherapi'] == hedged_before + 1
+
+
+def test_no_hedged_duplicate_without_quota(hedging):
+    quotas = hedging(1)
+    assert quotas.acquire('weatherapi')[0]
+    call, calls = slow_first_call()
+    
+    result = asyncio.run(AsyncWeatherFetcher()._hedged('weatherapi', call))
+    
+    assert result == 1
+    assert len(calls) == 1
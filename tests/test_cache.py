@@ -0,0 +1,122 @@
+"""
+Caché en memoria acotado (LRU, TTL, barrido y contadores)
+"""
+import time
+import types
+
+import pytest
+
+import cache
+from cache import LRUMemoryCache, WeatherCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj manual para el módulo del caché"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(cache, 'time', types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_evicts_least_recently_used_by_max_entries():
+    evicted = []
+    entries = LRUMemoryCache(max_entries=2, on_evict=lambda key, label: evicted.append((key, label)))
+    entries.set('a', 1, 60)
+    entries.set('b', 2, 60, label='metno')
+    entries.get('a')
+    entries.set('c', 3, 60)
+    
+    assert evicted == [('b', 'metno')]
+    assert entries.get('a') == 1 and entries.get('c') == 3
+    assert entries.get('b') is None
+    assert entries.evictions == 1
+
+
+def test_evicts_by_max_bytes():
+    entries = LRUMemoryCache(max_entries=100, max_bytes=10)
+    entries.set('a', b'12345', 60)
+    entries.set('b', b'12345', 60)
+    entries.set('c', b'123', 60)
+    
+    assert 'a' not in entries
+    assert 'b' in entries and 'c' in entries
+    assert entries.stats()['bytes'] == 8
+    assert entries.evictions == 1
+
+
+def test_expired_entries_are_removed_on_access(clock):
+    entries = LRUMemoryCache()
+    entries.set('a', 1, 60)
+    assert entries.get_with_ttl('a') == (1, 60)
+    
+    clock[0] += 61
+    assert entries.get('a') is None
+    assert len(entries) == 0
+    assert entries.expirations == 1
+
+
+def test_clear_expired_and_sweeper(clock, monkeypatch):
+    monkeypatch.delenv('REDIS_URL', raising=False)
+    weather_cache = WeatherCache()
+    weather_cache.memory_cache.set('old', 1, 10)
+    weather_cache.memory_cache.set('new', 2, 100)
+    clock[0] += 11
+    
+    weather_cache.sweep_interval = 0.01
+    weather_cache.start_sweeper()
+    try:
+        deadline = time.monotonic() + 2
+        while len(weather_cache.memory_cache) > 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        weather_cache.stop_sweeper()
+    
+    assert len(weather_cache.memory_cache) == 1
+    assert weather_cache.memory_cache.get('new') == 2
+    assert weather_cache.memory_cache.expirations == 1
+
+
+def test_counters():
+    entries = LRUMemoryCache(max_entries=1)
+    entries.set('a', 1, 60)
+    entries.get('a')
+    entries.get('missing')
+    assert 'a' in entries
+    entries.set('b', 2, 60)
+    
+    stats = entries.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['entries']) == (1, 1, 1, 1)
+
+
+@pytest.fixture
+def weather_cache(monkeypatch):
+    monkeypatch.delenv('REDIS_URL', raising=False)
+    monkeypatch.setenv('CACHE_GRID_DEGREES', '0.1')
+    return WeatherCache()
+
+
+def test_names_of_the_same_place_share_the_grid_cell_entry(weather_cache):
+    from models import WeatherData
+    
+    # Geocodificación directa de dos grafías y el nombre que devuelve /ubicacion
+    weather_cache.set_alias('Montevideo', -34.9058916, -56.1913095, 'Montevideo', 'UY')
+    weather_cache.set_alias('montevideo, UY', -34.9058916, -56.1913095, 'Montevideo', 'UY')
+    weather_cache.set_alias('Montevideo, UY', -34.9011, -56.1645, 'Montevideo', 'UY')
+    
+    weather_cache.set_weather('Montevideo', 'metno', WeatherData(city='Montevideo', country='UY', timezone='UTC-3'))
+    
+    keys = {weather_cache._get_cache_key(name, 'metno') for name in ('Montevideo', 'montevideo, UY', 'Montevideo, UY')}
+    assert keys == {'weather:cell:0.1:-349:-562:metno'}
+    assert weather_cache.get_weather_entry('Montevideo, UY', 'metno')[0].city == 'Montevideo'
+    assert len(weather_cache.memory_cache) == 1
+
+
+def test_evictions_are_labelled_with_the_data_type(weather_cache, monkeypatch):
+    evicted = []
+    monkeypatch.setattr(cache.metrics, 'inc', lambda name, **labels: evicted.append(labels.get('data_type')))
+    weather_cache.memory_cache.max_entries = 1
+    
+    weather_cache.set('ciudad:con:dos puntos', 'aggregated:metno+openweathermap', {'a': 1})
+    weather_cache.set('otra ciudad', 'metno', {'b': 2})
+    
+    assert evicted == ['aggregated']
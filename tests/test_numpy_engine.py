@@ -0,0 +1,81 @@
+"""
+El motor de NumPy da exactamente el mismo resultado que el de Python
+"""
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from aggregator import WeatherAggregator  # noqa: E402
+from fetcher import BaseWeatherFetcher  # noqa: E402
+from models import CityInfo, WeatherData  # noqa: E402
+from numpy_engine import NumpyAggregationEngine  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'benchmarks', 'fixtures')
+
+
+@pytest.fixture
+def aggregators():
+    python, numpy = WeatherAggregator(), WeatherAggregator()
+    python._numpy_engine = None
+    numpy._numpy_engine = NumpyAggregationEngine()
+    return python, numpy
+
+
+def recorded_sources():
+    fetcher = BaseWeatherFetcher()
+    city_info = CityInfo(name='Montevideo', country='UY', latitude=-34.9058, longitude=-56.1913, timezone='UTC-3')
+    sources = []
+    for provider, spec in fetcher.providers.items():
+        with open(os.path.join(FIXTURES, f'{provider}.json')) as fixture:
+            sources.append(spec.parse(json.load(fixture), city_info))
+    return sources
+
+
+def random_sources(hours: int, labels, seed: int):
+    rng = random.Random(seed)
+    start = datetime(2026, 10, 17, tzinfo=timezone(timedelta(hours=-3)))
+    sources = []
+    for label in labels:
+        weather_data = WeatherData(city='Montevideo', country='UY', timezone='UTC-3')
+        for hour in range(hours):
+            weather_data.hourly.add(start + timedelta(hours=hour), rng.uniform(-10, 40), rng.uniform(0, 30),
+                                    rng.uniform(0, 25), label)
+        for day in range(hours // 24):
+            low = rng.uniform(-10, 25)
+            weather_data.daily.add(start + timedelta(days=day), low, low + rng.uniform(0, 15),
+                                   rng.uniform(0, 60), rng.uniform(0, 25), label)
+        sources.append(weather_data)
+    return sources
+
+
+def test_recorded_fixtures(aggregators):
+    python, numpy = aggregators
+    sources = recorded_sources()
+    
+    assert numpy._combine_sources(sources).dict(exclude={'last_updated'}) == \
+        python._combine_sources(sources).dict(exclude={'last_updated'})
+
+
+@pytest.mark.parametrize('hours', [24, 48, 168])
+def test_long_horizons(aggregators, hours):
+    python, numpy = aggregators
+    series_list = [source.hourly for source in random_sources(
+        hours, ['OpenWeatherMap', 'MET Norway', 'WeatherAPI', 'Tomorrow.io', 'Visual Crossing'], hours)]
+    
+    assert numpy._aggregate_series(series_list, True, 3600, hours) == \
+        python._aggregate_series(series_list, True, 3600, hours)
+
+
+def test_unweighted_sources_use_the_plain_mean(aggregators):
+    python, numpy = aggregators
+    sources = random_sources(48, ['Fuente A', 'Fuente B'], 7)
+    for aggregator in aggregators:
+        aggregator.source_weights = {'Fuente A': 0.0, 'Fuente B': 0.0}
+    
+    assert numpy._combine_sources(sources).dict(exclude={'last_updated'}) == \
+        python._combine_sources(sources).dict(exclude={'last_updated'})
@@ -0,0 +1,99 @@
+"""
+Cuotas y reintentos HTTP: cada intento es una llamada facturable
+"""
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from http_session import HTTPSessionManager
+from quota import QuotaManager
+
+
+@pytest.fixture
+def quotas(monkeypatch):
+    monkeypatch.setenv('QUOTA_BACKEND', 'memory')
+    monkeypatch.setenv('QUOTA_WEATHERAPI_PER_DAY', '100')
+    return QuotaManager()
+
+
+@pytest.fixture
+def sessions():
+    manager = HTTPSessionManager()
+    manager.max_retries = 2
+    manager.backoff_factor = 0
+    yield manager
+    manager.close()
+
+
+def used(quotas: QuotaManager) -> int:
+    return quotas.status()['weatherapi']['windows']['day']['used']
+
+
+def mock_client(statuses):
+    responses = iter(statuses)
+    return httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(next(responses))))
+
+
+def test_async_retries_consume_quota(quotas, sessions):
+    async def take_retry_quota():
+        return quotas.acquire('weatherapi')[0]
+    
+    async def fetch():
+        async with mock_client([503, 503, 200]) as client:
+            assert quotas.acquire('weatherapi')[0]
+            with sessions.guard_retries(take_retry_quota):
+                return await sessions.async_get(client, 'http://provider.test/forecast')
+    
+    response = asyncio.run(fetch())
+    
+    assert response.status_code == 200
+    assert used(quotas) == 3
+
+
+def test_async_retry_denied_without_quota(monkeypatch, sessions):
+    monkeypatch.setenv('QUOTA_BACKEND', 'memory')
+    monkeypatch.setenv('QUOTA_WEATHERAPI_PER_DAY', '2')
+    quotas = QuotaManager()
+    
+    async def take_retry_quota():
+        return quotas.acquire('weatherapi')[0]
+    
+    async def fetch():
+        async with mock_client([503, 503, 200]) as client:
+            assert quotas.acquire('weatherapi')[0]
+            with sessions.guard_retries(take_retry_quota):
+                return await sessions.async_get(client, 'http://provider.test/forecast')
+    
+    response = asyncio.run(fetch())
+    
+    assert response.status_code == 503
+    assert used(quotas) == 2
+
+
+def test_sync_retries_consume_quota(quotas, sessions):
+    statuses = iter([503, 503, 200])
+    
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(next(statuses))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        assert quotas.acquire('weatherapi')[0]
+        with sessions.guard_retries(lambda: quotas.acquire('weatherapi')[0]):
+            response = sessions.get_session().get(f'http://127.0.0.1:{server.server_port}/forecast', timeout=5)
+    finally:
+        server.shutdown()
+        server.server_close()
+    
+    assert response.status_code == 200
+    assert used(quotas) == 3
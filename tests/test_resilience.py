@@ -0,0 +1,123 @@
+"""
+Circuit breaker por proveedor y clasificación de errores
+"""
+import types
+
+import httpx
+import pytest
+import requests
+
+import resilience
+from fetcher import WeatherFetcher
+from resilience import CircuitBreaker, is_provider_failure, provider_health
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience, 'time', types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_closed_open_half_open_closed(clock):
+    breaker = CircuitBreaker('proveedor', failure_threshold=3, reset_seconds=30)
+    open_breaker(breaker)
+    
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+    
+    clock[0] += 30
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Una sola prueba a la vez
+    assert not breaker.allow()
+    
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker('proveedor', failure_threshold=3, reset_seconds=30)
+    open_breaker(breaker)
+    clock[0] += 30
+    assert breaker.allow()
+    
+    breaker.record_failure()
+    
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_probe_without_report_times_out(clock):
+    breaker = CircuitBreaker('proveedor', failure_threshold=1, reset_seconds=30)
+    open_breaker(breaker)
+    clock[0] += 30
+    assert breaker.allow()
+    
+    clock[0] += 29
+    assert not breaker.allow()
+    clock[0] += 1
+    assert breaker.allow()
+
+
+def test_released_probe_allows_another(clock):
+    breaker = CircuitBreaker('proveedor', failure_threshold=1, reset_seconds=30)
+    open_breaker(breaker)
+    clock[0] += 30
+    assert breaker.allow()
+    
+    breaker.release()
+    
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_fetch_skipped_by_quota_releases_the_probe(clock, monkeypatch):
+    fetcher = WeatherFetcher()
+    monkeypatch.setattr(fetcher, '_take_quota', lambda provider, cost=1: False)
+    monkeypatch.setitem(provider_health.breakers, 'weatherapi',
+                        CircuitBreaker('WeatherAPI', failure_threshold=1, reset_seconds=30))
+    breaker = provider_health.breaker('weatherapi')
+    open_breaker(breaker)
+    clock[0] += 30
+    
+    assert fetcher._fetch_upstream('weatherapi', 'Montevideo', None) is None
+    assert breaker.allow()
+
+
+def http_error(status: int) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(response=response)
+
+
+def httpx_error(status: int) -> httpx.HTTPStatusError:
+    request = httpx.Request('GET', 'http://provider.test/')
+    return httpx.HTTPStatusError('error', request=request, response=httpx.Response(status, request=request))
+
+
+@pytest.mark.parametrize('error, failure', [
+    (requests.Timeout(), True),
+    (requests.ConnectionError(), True),
+    (httpx.ReadTimeout('timeout'), True),
+    (httpx.ConnectError('refused'), True),
+    (http_error(429), True),
+    (http_error(503), True),
+    (httpx_error(500), True),
+    (http_error(400), False),
+    (http_error(401), False),
+    (http_error(404), False),
+    (httpx_error(403), False),
+    (ValueError('respuesta inesperada'), False),
+])
+def test_is_provider_failure(error, failure):
+    assert is_provider_failure(error) is failure
@@ -0,0 +1,72 @@
+"""
+Serialización binaria del caché: lo que se lee es exactamente lo que se guardó
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from models import WeatherData
+from serialization import BinarySerializer, JsonSerializer
+
+
+def sample_weather(tzinfo=None) -> WeatherData:
+    weather_data = WeatherData(city='Montevideo', country='UY', timezone='UTC-3',
+                               last_updated=datetime(2026, 10, 17, 8, 30, 15, 123456, tzinfo=tzinfo))
+    start = datetime(2026, 10, 17, 9, tzinfo=tzinfo)
+    hourly = [
+        (12.35, 0.0, 10 / 3.6, 'OpenWeatherMap'),
+        (-0.0, 0.15, 3.1, 'MET Norway'),
+        (-4.05, 400.25, 2.0, 'OpenWeatherMap'),
+        (21.7, 1.2, 5.5, 'Tomorrow.io'),
+    ]
+    for hour, (temperature, precipitation, wind_speed, source) in enumerate(hourly):
+        weather_data.hourly.add(start + timedelta(hours=hour), temperature, precipitation, wind_speed, source)
+    weather_data.daily.add(start, 8.25, 18.35, 2.5, 4.44, 'WeatherAPI')
+    weather_data.daily.add(start + timedelta(days=1), 9.1, 17.9, 0.0, 22 / 3.6, 'Visual Crossing')
+    return weather_data
+
+
+@pytest.mark.parametrize('tzinfo', [None, timezone(timedelta(hours=-3)), timezone(timedelta(hours=5, minutes=45))],
+                         ids=['naive', 'utc-3', 'utc+5:45'])
+@pytest.mark.parametrize('serializer', [BinarySerializer(), JsonSerializer()], ids=['binary', 'json'])
+def test_round_trip_is_exact(serializer, tzinfo):
+    weather_data = sample_weather(tzinfo)
+    
+    restored = serializer.loads(serializer.dumps(weather_data))
+    
+    assert restored.dict() == weather_data.dict()
+    assert restored.hourly == weather_data.hourly
+    assert restored.daily == weather_data.daily
+    assert restored.last_updated == weather_data.last_updated
+    assert restored.last_updated.tzinfo == tzinfo
+    assert [point.datetime.utcoffset() for point in restored.hourly] == [tzinfo and tzinfo.utcoffset(None)] * 4
+
+
+def test_cached_values_display_like_fresh_ones():
+    weather_data = sample_weather()
+    
+    restored = BinarySerializer().loads(BinarySerializer().dumps(weather_data))
+    
+    fresh = [f"{point.temperature:.1f} {point.wind_speed:.1f}" for point in weather_data.hourly]
+    cached = [f"{point.temperature:.1f} {point.wind_speed:.1f}" for point in restored.hourly]
+    assert cached == fresh
+    assert cached[0] == '12.3 2.8'
+    assert cached[1].startswith('-0.0')
+
+
+def test_source_table():
+    weather_data = sample_weather()
+    weather_data.daily.add(datetime(2026, 10, 19), 7.0, 15.0, 0.0, 3.0, 'OpenWeatherMap')
+    
+    raw = BinarySerializer().dumps(weather_data)
+    restored = BinarySerializer().loads(raw)
+    
+    # Cada nombre se guarda una vez aunque lo usen las dos series
+    assert raw.count(b'OpenWeatherMap') == 1
+    assert restored.hourly.source_names() == weather_data.hourly.source_names()
+    assert restored.daily.source_names() == ['WeatherAPI', 'Visual Crossing', 'OpenWeatherMap']
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        BinarySerializer().loads(b'WDB1' + b'\0' * 16)